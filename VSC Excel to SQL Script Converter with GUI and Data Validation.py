@@ -1,358 +1,304 @@
-import sys, os, re
-import pandas as pd
-from datetime import datetime
+import sys, os, time, contextlib
+_STARTUP_T0 = time.perf_counter()
+from datetime import datetime, timedelta
+from statistics import median
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QFileDialog, QMessageBox,
-    QTextEdit, QTableWidget, QTableWidgetItem, QComboBox, QLineEdit, QCheckBox, QSpinBox, QGroupBox,
-    QProgressBar, QTabWidget, QSplitter, QHeaderView, QStyledItemDelegate, QListWidget, QDialog,
-    QGridLayout, QButtonGroup, QRadioButton, QFormLayout, QMenuBar, QAction
+    QTextEdit, QPlainTextEdit, QTableView, QComboBox, QLineEdit, QCheckBox, QSpinBox, QGroupBox,
+    QProgressBar, QTabWidget, QSplitter, QHeaderView, QStyledItemDelegate, QDialog,
+    QGridLayout, QButtonGroup, QRadioButton, QFormLayout, QMenuBar, QAction, QTableWidget, QTableWidgetItem,
+    QAbstractItemView
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSettings
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSettings, QAbstractTableModel, QModelIndex, QFileSystemWatcher
+from PyQt5.QtGui import QColor, QFontDatabase, QTextCursor
 import logging
+import traceback
 from typing import List, Dict
+from excel_to_sql_core import (
+    np, pd, HEAVY_MODULES, resource_path, LOG_LEVELS, configure_logging, ProgressReporter, StageTimer,
+    export_metrics, MEGABYTE, MemoryMonitor, dataframe_memory_bytes, estimate_workbook_bytes, exceeds_memory_budget,
+    format_bytes, SheetStore, profiling_requested, profile_path_for, RunProfiler, file_sha256, RunHistory,
+    CHECKPOINT_MIN_ROWS, RunCheckpoint, ItemMasterIndex, TemplateRegistry, workbook_fingerprint, DataHandler,
+    ValidationCache, GenerationError, generate_sql_script, template_output_paths, generate_sql_scripts, ScriptIndex
+)
+
+
+# --- Startup: heavy modules are imported on first use so the window paints first ---
+class StartupTimer:
+    """Records named startup milestones in seconds since the script began importing"""
+    marks = []
+
+    @classmethod
+    def mark(cls, stage):
+        cls.marks.append((stage, time.perf_counter() - _STARTUP_T0))
+
+    @classmethod
+    def report(cls):
+        lines = ["Startup timing:"]
+        previous = 0.0
+        for stage, elapsed in cls.marks:
+            lines.append(f"  {stage:<28} {elapsed * 1000:8.1f} ms  (+{(elapsed - previous) * 1000:.1f} ms)")
+            previous = elapsed
+        return "\n".join(lines)
 
-def resource_path(relative_path):
-    """Get absolute path to resource, works for dev and for PyInstaller"""
-    if hasattr(sys, '_MEIPASS'):
-        # Running from a PyInstaller bundle
-        return os.path.join(sys._MEIPASS, relative_path)
-    # Running from normal script
-    return os.path.join(os.path.abspath("."), relative_path)
+
+StartupTimer.mark("Python and PyQt5 imports")
 
 # Path to your default template (bundled into the EXE)
 #default_excel_template = resource_path("C:\\Users\\alyousefh\\Desktop\\365DataSience\\Python\\VSC\\Excel to SQL\\Default_Excel_template_File.xlsx")
 default_excel_template = resource_path("Default_Excel_template_File.xlsx")
 
-# Add this class after the existing imports and before DataHandler class
+# --- Worker: QThread for heavy tasks (Excel loading, SQL generation) ---
+class ModuleWarmupWorker(QThread):
+    """Imports numpy/pandas/openpyxl in the background once the window is visible"""
+    finished = pyqtSignal(float)
+    def run(self):
+        started = time.perf_counter()
+        for module in HEAVY_MODULES:
+            try:
+                module.load()
+            except ImportError as e:
+                # Optional engines are reported again by load_excel_sheets if a file needs them
+                logging.warning(f"Could not pre-load {module._name}: {e}")
+        self.finished.emit(time.perf_counter() - started)
 
-class SkippedRowLogger:
-    """Handles logging of skipped rows with detailed information"""
-    
-    def __init__(self, log_file_path="excel_to_sql_skipped.txt"):
-        self.log_file_path = log_file_path
-        self.skipped_rows = []
-        
-    def log_skipped_row(self, row_number, reason, details="", value=""):
-        """Log a skipped row with details"""
-        entry = {
-            'row_number': row_number + 1,
-            'reason': reason,
-            'details': details,
-            'value': str(value)[:100],  # Truncate long values
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        self.skipped_rows.append(entry)
-        
-    def write_log_file(self, sheet_name=""):
-        """Write all skipped rows to log file"""
+class ExcelLoaderWorker(QThread):
+    finished = pyqtSignal(object, list, dict)
+    error = pyqtSignal(str)
+    profiled = pyqtSignal(str, str)
+    def __init__(self, file_path, profile_path=None, reload_from=None, active_sheet=None):
+        super().__init__()
+        self.file_path = file_path
+        self.profile_path = profile_path
+        # (sheets, workbook_fingerprint) of the loaded version: only changed sheets are parsed again
+        self.reload_from = reload_from
+        # Sheet that stays in memory; the others are spilled to disk (see SheetStore)
+        self.active_sheet = active_sheet
+    def run(self):
+        profiler = RunProfiler(self.profile_path) if self.profile_path else contextlib.nullcontext()
         try:
-            with open(self.log_file_path, 'w', encoding='utf-8') as f:
-                f.write(f"Skipped Rows Log - Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Sheet: {sheet_name}\n")
-                f.write("=" * 80 + "\n\n")
-                
-                if not self.skipped_rows:
-                    f.write("No rows were skipped during processing.\n")
-                    return
-                
-                # Group by reason
-                reasons = {}
-                for entry in self.skipped_rows:
-                    reason = entry['reason']
-                    if reason not in reasons:
-                        reasons[reason] = []
-                    reasons[reason].append(entry)
-                
-                for reason, entries in reasons.items():
-                    f.write(f"REASON: {reason}\n")
-                    f.write("-" * 40 + "\n")
-                    for entry in entries:
-                        f.write(f"Row {entry['row_number']}: {entry['details']}")
-                        if entry['value']:
-                            f.write(f" | Value: '{entry['value']}'")
-                        f.write("\n")
-                    f.write("\n")
-                    
+            timer = StageTimer()
+            with profiler, MemoryMonitor() as memory, timer.measure('file_parse') as stage:
+                if self.reload_from:
+                    sheets, fingerprint, reloaded = DataHandler.reload_changed_sheets(self.file_path, *self.reload_from)
+                else:
+                    # Fingerprint first, so an edit saved while parsing is still seen as a change
+                    fingerprint = workbook_fingerprint(self.file_path)
+                    sheets = DataHandler.load_excel_sheets(self.file_path)
+                    reloaded = list(sheets)
+                stage['rows'] = sum(len(sheets[name]) for name in reloaded if name in sheets)
+            sheet_memory = {name: dataframe_memory_bytes(sheets[name]) for name in reloaded if name in sheets}
+            if not isinstance(sheets, SheetStore):
+                sheets = SheetStore(sheets)
+            with timer.measure('sheet_spill', len(sheets)) as stage:
+                keep = self.active_sheet if self.active_sheet in sheets else next(iter(sheets), None)
+                stage['bytes'] = sheets.spill(keep, sheet_memory)
+            # stages, per-sheet DataFrame memory (of the parsed sheets) and the RSS seen while parsing
+            try:
+                file_hash = file_sha256(self.file_path)
+            except OSError as e:
+                logging.warning(f"Could not hash {self.file_path}: {e}")
+                file_hash = None
+            load_info = {
+                'file_path': self.file_path,
+                'file_hash': file_hash,
+                'stages': timer.as_dict(),
+                'sheet_memory': sheet_memory,
+                'fingerprint': fingerprint,
+                # None for a full load
+                'reloaded_sheets': reloaded if self.reload_from else None,
+                **memory.as_dict(),
+            }
+            self.finished.emit(sheets, list(sheets.keys()), load_info)
+            # After finished, which clears the log tab
+            if self.profile_path:
+                self.profiled.emit(profiler.profile_path or "", profiler.summary)
         except Exception as e:
-            logging.error(f"Failed to write skipped rows log: {e}")
+            self.error.emit(str(e))
 
+class ItemMasterLoaderWorker(QThread):
+    """Builds (or reads back from its disk cache) the ItemMasterIndex for an item-master export"""
+    finished = pyqtSignal(object, float)
+    error = pyqtSignal(str)
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    def run(self):
+        started = time.perf_counter()
+        try:
+            index = ItemMasterIndex.load(self.path)
+            self.finished.emit(index, time.perf_counter() - started)
+        except Exception as e:
+            logging.error(f"Could not load item master {self.path}: {e}")
+            self.error.emit(str(e))
 
-# --- DataHandler: All Pandas/Excel/JSON logic (no UI code) ---
-class DataHandler:
-    # Update the DataHandler.load_excel_sheets method with better error handling
-    @staticmethod
-    def load_excel_sheets(file_path):
+class ScriptIndexWorker(QThread):
+    """Maps a generated SQL script and indexes its statements for the Generated SQL tab"""
+    finished = pyqtSignal(object, float)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int)
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+    def run(self):
+        started = time.perf_counter()
         try:
-            logging.info(f"Loading Excel file: {file_path}")
-            
-            # Check if file exists and is accessible
-            if not os.path.exists(file_path):
-                raise FileNotFoundError(f"File not found: {file_path}")
-                
-            if not os.access(file_path, os.R_OK):
-                raise PermissionError(f"Cannot read file: {file_path}")
-            
-            # Try to load with different engines if one fails
-            engines = ['openpyxl', 'xlrd']
-            last_error = None
-            
-            for engine in engines:
-                try:
-                    logging.info(f"Trying to load with engine: {engine}")
-                    all_sheets = pd.read_excel(file_path, sheet_name=None, engine=engine)
-                    
-                    # Filter out empty sheets with better validation
-                    valid_sheets = {}
-                    for name, df in all_sheets.items():
-                        if df is not None and not df.empty and len(df.columns) > 0:
-                            # Check if sheet has meaningful data (not just headers)
-                            if len(df.dropna(how='all')) > 0:
-                                valid_sheets[name] = df
-                                logging.info(f"Sheet '{name}' loaded successfully with {len(df)} rows and {len(df.columns)} columns")
-                            else:
-                                logging.warning(f"Sheet '{name}' contains only empty rows, skipping")
-                        else:
-                            logging.warning(f"Sheet '{name}' is empty or invalid, skipping")
-                    
-                    if not valid_sheets:
-                        raise ValueError("No valid sheets found in the Excel file")
-                        
-                    logging.info(f"Successfully loaded {len(valid_sheets)} valid sheets")
-                    return valid_sheets
-                    
-                except Exception as e:
-                    last_error = e
-                    logging.warning(f"Failed to load with engine {engine}: {str(e)}")
-                    continue
-            
-            # If all engines failed, raise the last error
-            raise last_error if last_error else Exception("Failed to load Excel file with any available engine")
-            
+            index = ScriptIndex(self.path, on_progress=lambda snapshot: self.progress.emit(snapshot['percent']))
+            self.finished.emit(index, time.perf_counter() - started)
         except Exception as e:
-            error_msg = f"Failed to load Excel file '{file_path}': {str(e)}"
-            logging.error(error_msg)
-            raise Exception(error_msg)
+            logging.error(f"Could not index SQL script {self.path}: {e}")
+            self.error.emit(str(e))
 
-    @staticmethod
-    def get_preview(df, n_rows):
-        return df.head(n_rows)
+class SheetSpillWorker(QThread):
+    """Writes the sheets other than the selected one to disk (SheetStore.spill) off the GUI thread"""
+    finished = pyqtSignal(object, int, float)
+    error = pyqtSignal(str)
+    def __init__(self, store, keep, sizes):
+        super().__init__()
+        self.store = store
+        self.keep = keep
+        self.sizes = sizes
+    def run(self):
+        started = time.perf_counter()
+        try:
+            written = self.store.spill(self.keep, self.sizes)
+            self.finished.emit(self.store, written, time.perf_counter() - started)
+        except Exception as e:
+            logging.error(f"Could not spill inactive sheets to disk: {e}")
+            self.error.emit(str(e))
 
-    @staticmethod
-    def validate_row(row, column_mappings, skip_arabic, validate_quality, arabic_pattern, sp_params):
-        formatted_params = {}
-        skip_row = False
-        stats = {'skipped_arabic': 0, 'skipped_invalid_value': 0, 'skipped_empty': 0}
-        
-        for sp_param, excel_col in column_mappings.items():
-            value = getattr(row, excel_col)
-            
-            # Check for empty/null values - ONLY if validation is enabled
-            if validate_quality and (pd.isna(value) or (isinstance(value, str) and value.strip().lower() in ['nan', 'none', ''])):
-                stats['skipped_empty'] += 1
-                skip_row = True
-                break
-                
-            # Check for Arabic text - controlled by skip_arabic flag
-            if skip_arabic and isinstance(value, str) and arabic_pattern.search(str(value).strip()):
-                stats['skipped_arabic'] += 1
-                skip_row = True
-                break
-                
-            # Handle string parameters
-            if sp_param in ['Item', 'Status']:
-                str_value = str(value).strip().replace("'", "''")
-                formatted_params[sp_param] = str_value
-                
-            # Handle numeric parameters - validation controlled by validate_quality
-            elif sp_param in ['qty', 'Slp_Discount', 'Spv_Discount', 'Mgr_Discount', 'New_Current_Cost', 'New_Showroom']:
-                try:
-                    if isinstance(value, str):
-                        clean_value = value.replace(",", "").replace("$", "").replace("%", "").strip()
-                        
-                        # Only validate if quality validation is enabled
-                        if validate_quality and (not clean_value or clean_value.lower() in ['n/a', 'na', 'null', 'none']):
-                            stats['skipped_invalid_value'] += 1
-                            skip_row = True
-                            break
-                            
-                        numeric_value = float(clean_value)
-                    else:
-                        numeric_value = float(value)
-                        
-                    # Validate range - ONLY if validation is enabled
-                    if validate_quality and numeric_value < 0 and sp_param in ['qty', 'New_Current_Cost', 'New_Showroom']:
-                        logging.debug(f"Negative value detected for {sp_param}: {numeric_value}")
-                        stats['skipped_invalid_value'] += 1
-                        skip_row = True
-                        break
-                        
-                    formatted_params[sp_param] = numeric_value
-                    
-                except (ValueError, AttributeError, TypeError) as e:
-                    # Only skip on error if validation is enabled
-                    if validate_quality:
-                        logging.debug(f"Invalid numeric value for {sp_param}: '{value}' - {str(e)}")
-                        stats['skipped_invalid_value'] += 1
-                        skip_row = True
-                        break
-                    else:
-                        # If validation disabled, use string representation or default value
-                        formatted_params[sp_param] = str(value) if value is not None else '0'
-                        
-            else:
-                str_value = str(value).strip().replace("'", "''")
-                formatted_params[sp_param] = str_value
-                
-        return skip_row, formatted_params, stats
-    
-    # Update the DataHandler.validate_row_by_index method
-    @staticmethod
-    def validate_row_by_index(row, column_indices, skip_arabic, validate_quality, arabic_pattern, sp_params, row_number=0, logger=None):
-        """Validate row using column indices with enhanced error handling and logging"""
-        formatted_params = {}
-        skip_row = False
-        stats = {'skipped_arabic': 0, 'skipped_invalid_value': 0, 'skipped_empty': 0}
-        
+class RowClassifierWorker(QThread):
+    finished = pyqtSignal(object, dict)
+    error = pyqtSignal(str)
+    def __init__(self, key, df, column_mappings, parameter_specs, skip_arabic, validate_quality):
+        super().__init__()
+        self.key = key
+        self.df = df
+        self.column_mappings = column_mappings
+        self.parameter_specs = parameter_specs
+        self.skip_arabic = skip_arabic
+        self.validate_quality = validate_quality
+    def run(self):
         try:
-            for sp_param, col_index in column_indices.items():
-                try:
-                    # Safe access to row data with bounds checking
-                    if col_index >= len(row):
-                        if logger:
-                            logger.log_skipped_row(row_number, "COLUMN_INDEX_ERROR", 
-                                                f"Column index {col_index} out of bounds for parameter '{sp_param}'")
-                        stats['skipped_invalid_value'] += 1
-                        skip_row = True
-                        break
-                        
-                    value = row[col_index]
-                    
-                    # Check for empty/null values
-                    if validate_quality and (pd.isna(value) or (isinstance(value, str) and value.strip().lower() in ['nan', 'none', ''])):
-                        if logger:
-                            logger.log_skipped_row(row_number, "EMPTY_VALUE", 
-                                                f"Empty/null value in parameter '{sp_param}'", value)
-                        stats['skipped_empty'] += 1
-                        skip_row = True
-                        break
-                        
-                    # Check for Arabic text
-                    if skip_arabic and isinstance(value, str) and arabic_pattern.search(str(value).strip()):
-                        if logger:
-                            logger.log_skipped_row(row_number, "ARABIC_TEXT", 
-                                                f"Arabic text found in parameter '{sp_param}'", value)
-                        stats['skipped_arabic'] += 1
-                        skip_row = True
-                        break
-                        
-                    # Handle string parameters
-                    if sp_param in ['Item', 'Status']:
-                        try:
-                            str_value = str(value).strip().replace("'", "''")
-                            formatted_params[sp_param] = str_value
-                        except Exception as e:
-                            if logger:
-                                logger.log_skipped_row(row_number, "STRING_CONVERSION_ERROR", 
-                                                    f"Failed to convert '{sp_param}' to string: {str(e)}", value)
-                            if validate_quality:
-                                stats['skipped_invalid_value'] += 1
-                                skip_row = True
-                                break
-                            else:
-                                formatted_params[sp_param] = str(value) if value is not None else ''
-                                
-                    # Handle numeric parameters
-                    elif sp_param in ['qty', 'Slp_Discount', 'Spv_Discount', 'Mgr_Discount', 'New_Current_Cost', 'New_Showroom']:
-                        try:
-                            if isinstance(value, str):
-                                clean_value = value.replace(",", "").replace("$", "").replace("%", "").strip()
-                                if validate_quality and (not clean_value or clean_value.lower() in ['n/a', 'na', 'null', 'none']):
-                                    if logger:
-                                        logger.log_skipped_row(row_number, "INVALID_NUMERIC", 
-                                                            f"Invalid numeric value for '{sp_param}'", value)
-                                    stats['skipped_invalid_value'] += 1
-                                    skip_row = True
-                                    break
-                                numeric_value = float(clean_value)
-                            else:
-                                numeric_value = float(value)
-                                
-                            # Validate range
-                            if validate_quality and numeric_value < 0 and sp_param in ['qty', 'New_Current_Cost', 'New_Showroom']:
-                                if logger:
-                                    logger.log_skipped_row(row_number, "NEGATIVE_VALUE", 
-                                                        f"Negative value for '{sp_param}': {numeric_value}", value)
-                                stats['skipped_invalid_value'] += 1
-                                skip_row = True
-                                break
-                                
-                            formatted_params[sp_param] = numeric_value
-                            
-                        except (ValueError, AttributeError, TypeError) as e:
-                            if logger:
-                                logger.log_skipped_row(row_number, "NUMERIC_CONVERSION_ERROR", 
-                                                    f"Failed to convert '{sp_param}' to number: {str(e)}", value)
-                            if validate_quality:
-                                stats['skipped_invalid_value'] += 1
-                                skip_row = True
-                                break
-                            else:
-                                formatted_params[sp_param] = str(value) if value is not None else '0'
-                                
-                    else:
-                        try:
-                            str_value = str(value).strip().replace("'", "''")
-                            formatted_params[sp_param] = str_value
-                        except Exception as e:
-                            if logger:
-                                logger.log_skipped_row(row_number, "GENERAL_CONVERSION_ERROR", 
-                                                    f"Failed to process '{sp_param}': {str(e)}", value)
-                            formatted_params[sp_param] = str(value) if value is not None else ''
-                            
-                except Exception as e:
-                    if logger:
-                        logger.log_skipped_row(row_number, "PARAMETER_PROCESSING_ERROR", 
-                                            f"Error processing parameter '{sp_param}': {str(e)}", 
-                                            str(value) if 'value' in locals() else 'N/A')
-                    logging.error(f"Error processing parameter '{sp_param}' in row {row_number}: {e}")
-                    if validate_quality:
-                        stats['skipped_invalid_value'] += 1
-                        skip_row = True
-                        break
-                        
+            row_classes = DataHandler.classify_rows(
+                self.df, self.column_mappings, self.parameter_specs, self.skip_arabic, self.validate_quality
+            )
+            self.finished.emit(self.key, row_classes)
         except Exception as e:
-            if logger:
-                logger.log_skipped_row(row_number, "ROW_PROCESSING_ERROR", 
-                                    f"Critical error processing row: {str(e)}")
-            logging.error(f"Critical error processing row {row_number}: {e}")
-            stats['skipped_invalid_value'] += 1
-            skip_row = True
-            
-        return skip_row, formatted_params, stats
-    
-    
+            logging.error(f"Row classification failed: {e}")
+            self.error.emit(str(e))
 
-# --- Worker: QThread for heavy tasks (Excel loading, SQL generation) ---
-class ExcelLoaderWorker(QThread):
-    finished = pyqtSignal(dict, list)
+SPARK_BLOCKS = "▁▂▃▄▅▆▇█"
+
+def format_throughput_trend(runs, max_points=60):
+    """Sparkline of rows/s over the successful runs in `runs` (newest first, as RunHistory.query returns them)"""
+    values = [run['rows_per_second'] for run in reversed(runs) if run['status'] == 'success' and run['rows_per_second']]
+    values = values[-max_points:]
+    if len(values) < 2:
+        return "Throughput trend: needs at least two successful runs matching the filters"
+    low, high = min(values), max(values)
+    spark = "".join(SPARK_BLOCKS[int((value - low) / (high - low) * (len(SPARK_BLOCKS) - 1))] if high > low
+                    else SPARK_BLOCKS[3] for value in values)
+    typical = median(values[:-1])
+    text = (f"Throughput, last {len(values)} successful runs: {spark}  "
+            f"latest {values[-1]:,.0f} rows/s, median before it {typical:,.0f} rows/s")
+    if values[-1] < typical * 0.8:
+        text += f"  ⚠ {1 - values[-1] / typical:.0%} slower than usual"
+    return text
+
+# Statements shown per page of the Generated SQL tab
+SCRIPT_PAGE_SIZE = 200
+
+HISTORY_COLUMNS = (
+    ("Time", lambda run: run['started_at'].replace('T', ' ')),
+    ("File", lambda run: run['file_name'] or "-"),
+    ("Sheet", lambda run: run['sheet'] or "-"),
+    ("Template", lambda run: run['template'] or "-"),
+    ("Status", lambda run: run['status']),
+    ("Rows", lambda run: f"{run['total_rows']:,}" if run['total_rows'] is not None else "-"),
+    ("Statements", lambda run: f"{run['processed_rows']:,}" if run['processed_rows'] is not None else "-"),
+    ("Seconds", lambda run: f"{run['processing_time']:.2f}" if run['processing_time'] is not None else "-"),
+    ("Rows/s", lambda run: f"{run['rows_per_second']:,.0f}" if run['rows_per_second'] else "-"),
+    ("Peak RSS", lambda run: format_bytes(run['peak_rss_bytes'])),
+)
+
+def format_column_profile(profile):
+    """One tooltip line per statistic from DataHandler.profile_column"""
+    lines = [
+        f"Type: {profile['inferred_type']}",
+        f"Values: {profile['non_null']:,} of {profile['rows']:,} ({profile['null_count']:,} empty)",
+        f"Numeric: {profile['numeric_rate']:.0%}",
+        f"Distinct: {profile['distinct_count']:,}",
+    ]
+    if profile['arabic_count']:
+        lines.append(f"Arabic text: {profile['arabic_count']:,}")
+    if profile['negative_count']:
+        lines.append(f"Negative: {profile['negative_count']:,}")
+    if profile['min'] is not None:
+        lines.append(f"Range: {str(profile['min'])[:30]} .. {str(profile['max'])[:30]}")
+    return "\n".join(lines)
+
+class ColumnProfileWorker(QThread):
+    finished = pyqtSignal(object, dict)
     error = pyqtSignal(str)
-    def __init__(self, file_path):
+    def __init__(self, key, df):
         super().__init__()
-        self.file_path = file_path
+        self.key = key
+        self.df = df
+        self.profiles = None
     def run(self):
         try:
-            sheets = DataHandler.load_excel_sheets(self.file_path)
-            self.finished.emit(sheets, list(sheets.keys()))
+            self.profiles = DataHandler.profile_sheet(self.df)
+            self.finished.emit(self.key, self.profiles)
         except Exception as e:
+            logging.error(f"Column profiling failed: {e}")
             self.error.emit(str(e))
 
+def format_progress_status(row_number, snapshot, processed_count, error_count):
+    return (f"Processing row {row_number:,} of {snapshot['total']:,} (Processed: {processed_count:,}, "
+            f"Errors: {error_count}) - {ProgressReporter.describe(snapshot)}")
+
+class ValidationWorker(QThread):
+    """Validates a sheet ahead of time so Generate only has to render and write"""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(object, dict)
+    error = pyqtSignal(object, str)
+    status_update = pyqtSignal(str)
+    def __init__(self, key, df, column_mappings, parameter_specs, skip_arabic, validate_quality):
+        super().__init__()
+        self.key = key
+        self.df = df
+        self.column_mappings = column_mappings
+        self.parameter_specs = parameter_specs
+        self.skip_arabic = skip_arabic
+        self.validate_quality = validate_quality
+    def report_progress(self, row_number, processed_count, error_count, snapshot):
+        self.progress.emit(snapshot['percent'])
+        self.status_update.emit(format_progress_status(row_number, snapshot, processed_count, error_count))
+    def run(self):
+        try:
+            result = DataHandler.validate_dataframe(
+                self.df, self.column_mappings, self.parameter_specs, self.skip_arabic, self.validate_quality,
+                on_progress=self.report_progress, should_stop=self.isInterruptionRequested
+            )
+            if result is None:
+                logging.info("Background validation cancelled")
+                return
+            self.finished.emit(self.key, result)
+        except Exception as e:
+            logging.error(f"Background validation failed: {e}")
+            self.error.emit(self.key, str(e))
+
 class SQLGeneratorWorker(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal(str, list, dict)
     error = pyqtSignal(str)
     status_update = pyqtSignal(str)
-    def __init__(self, df, sheet_name, sp_details, column_mappings, output_path, skip_arabic=True, validate_quality=True):
+    validated = pyqtSignal(object, dict)
+    profiled = pyqtSignal(str, str)
+    def __init__(self, df, sheet_name, sp_details, column_mappings, output_path, skip_arabic=True, validate_quality=True,
+                 dedup_policy='last', dedup_key='item', validation_result=None, validation_key=None, stages=None,
+                 memory_budget=None, profile_path=None, item_index=None, checkpoint=None):
         super().__init__()
         self.df = df
         self.sheet_name = sheet_name
@@ -361,168 +307,257 @@ class SQLGeneratorWorker(QThread):
         self.output_path = output_path
         self.skip_arabic = skip_arabic
         self.validate_quality = validate_quality
-    # Update the SQLGeneratorWorker.run method
+        self.dedup_policy = dedup_policy
+        self.dedup_key = dedup_key
+        # Result of DataHandler.validate_dataframe computed ahead of time (see ValidationCache)
+        self.validation_result = validation_result
+        self.validation_key = validation_key
+        # file_parse/sheet_selection timings recorded by the window before this run
+        self.stages = stages
+        # Bytes; above it the script is streamed to disk instead of built in memory
+        self.memory_budget = memory_budget
+        # Set when this run should be profiled (see RunProfiler)
+        self.profile_path = profile_path
+        # ItemMasterIndex; rows with unknown items are skipped
+        self.item_index = item_index
+        # RunCheckpoint for large sheets; a saved one of the same run is resumed
+        self.checkpoint = checkpoint
+    def report_progress(self, row_number, processed_count, error_count, snapshot):
+        if snapshot is None:
+            self.progress.emit(100)
+            return
+        self.progress.emit(snapshot['percent'])
+        self.status_update.emit(format_progress_status(row_number, snapshot, processed_count, error_count))
     def run(self):
+        on_validated = None
+        if self.validation_key is not None:
+            on_validated = lambda result: self.validated.emit(self.validation_key, result)
+        profiler = RunProfiler(self.profile_path) if self.profile_path else contextlib.nullcontext()
         try:
-            start_time = datetime.now()
-            arabic_pattern = re.compile(r'[\u0600-\u06FF]')
-            sql_lines = []
-            total_rows = len(self.df)
-            
-            # Initialize skipped row logger
-            logger = SkippedRowLogger()
-            
-            stats = {
-                'total_rows': total_rows,
-                'processed_rows': 0,
-                'skipped_arabic': 0,
-                'skipped_invalid_value': 0,
-                'skipped_empty': 0,
-                'processing_time': 0
-            }
-            
-            try:
-                # Convert column names to indices with better error handling
-                column_indices = {}
-                df_columns = list(self.df.columns)
-                
-                for sp_param, excel_col in self.column_mappings.items():
-                    if excel_col in df_columns:
-                        column_indices[sp_param] = df_columns.index(excel_col)
-                    else:
-                        error_msg = f"Column '{excel_col}' not found in DataFrame. Available columns: {df_columns}"
-                        logging.error(error_msg)
-                        self.error.emit(error_msg)
-                        return
-                        
-            except Exception as e:
-                error_msg = f"Error setting up column mappings: {str(e)}"
-                logging.error(error_msg)
-                self.error.emit(error_msg)
-                return
-            
-            # Process rows with enhanced error handling
-            processed_count = 0
-            error_count = 0
-            max_errors = 100  # Stop processing if too many errors
-            
-            try:
-                # Use itertuples for performance but with error handling
-                for idx, row in enumerate(self.df.itertuples(index=False), 1):
-                    try:
-                        progress = int((idx / total_rows) * 100)
-                        self.progress.emit(progress)
-                        
-                        if idx % 100 == 0:
-                            self.status_update.emit(f"Processing row {idx} of {total_rows} (Processed: {processed_count}, Errors: {error_count})")
-                        
-                        skip_row, formatted_params, row_stats = DataHandler.validate_row_by_index(
-                            row, column_indices, self.skip_arabic, self.validate_quality, 
-                            arabic_pattern, self.sp_details['parameters'], row_number=idx, logger=logger
-                        )
-                        
-                        # Update stats
-                        stats['skipped_arabic'] += row_stats['skipped_arabic']
-                        stats['skipped_invalid_value'] += row_stats['skipped_invalid_value']
-                        stats['skipped_empty'] += row_stats['skipped_empty']
-                        
-                        if skip_row:
-                            continue
-                            
-                        try:
-                            sql = self.sp_details['sql_template'].format(**formatted_params)
-                            sql_lines.append(sql)
-                            stats['processed_rows'] += 1
-                            processed_count += 1
-                            
-                        except KeyError as e:
-                            logger.log_skipped_row(idx, "SQL_TEMPLATE_ERROR", 
-                                                f"Missing parameter for SQL formatting: {e}")
-                            error_count += 1
-                            
-                        except Exception as e:
-                            logger.log_skipped_row(idx, "SQL_FORMATTING_ERROR", 
-                                                f"Error formatting SQL: {str(e)}")
-                            error_count += 1
-                            
-                    except Exception as e:
-                        logger.log_skipped_row(idx, "ROW_PROCESSING_CRITICAL_ERROR", 
-                                            f"Critical error processing row: {str(e)}")
-                        error_count += 1
-                        logging.error(f"Critical error processing row {idx}: {e}")
-                        
-                        # Stop processing if too many errors
-                        if error_count >= max_errors:
-                            error_msg = f"Too many errors ({error_count}). Stopping processing to prevent system issues."
-                            logging.error(error_msg)
-                            self.error.emit(error_msg)
-                            return
-                            
-            except Exception as e:
-                error_msg = f"Critical error during row iteration: {str(e)}\n{traceback.format_exc()}"
-                logging.error(error_msg)
-                self.error.emit(error_msg)
-                return
-            
-            # Write the skipped rows log
-            try:
-                logger.write_log_file(self.sheet_name)
-                logging.info(f"Skipped rows log written with {len(logger.skipped_rows)} entries")
-            except Exception as e:
-                logging.error(f"Failed to write skipped rows log: {e}")
-            
-            # Write SQL output file
-            try:
-                with open(self.output_path, 'w', encoding='utf-8') as f:
-                    f.write(f"-- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    f.write(f"-- Source Excel Sheet: {self.sheet_name}\n")
-                    f.write(f"-- Stored Procedure/SQL Type: {self.sp_details.get('friendly_name', 'Unknown')}\n")
-                    f.write(f"-- Total statements: {len(sql_lines)}\n")
-                    f.write(f"-- Processing errors: {error_count}\n")
-                    f.write(f"-- See excel_to_sql_skipped.txt for skipped rows details\n\n")
-                    
-                    for line in sql_lines:
-                        f.write(line + '\nGO\n')
-                        
-            except Exception as e:
-                error_msg = f"File write error: {str(e)}"
-                logging.error(error_msg)
-                self.error.emit(error_msg)
-                return
-            
-            stats['processing_time'] = (datetime.now() - start_time).total_seconds()
-            stats['total_errors'] = error_count
-            stats['skipped_rows_logged'] = len(logger.skipped_rows)
-            
+            with profiler, MemoryMonitor() as memory:
+                sql_lines, stats = generate_sql_script(
+                    self.df, self.sheet_name, self.sp_details, self.column_mappings, self.output_path,
+                    self.skip_arabic, self.validate_quality, self.dedup_policy, self.dedup_key, self.validation_result,
+                    on_progress=self.report_progress, on_status=self.status_update.emit,
+                    on_validated=on_validated,
+                    should_stop=self.isInterruptionRequested, stages=self.stages, memory_budget=self.memory_budget,
+                    item_index=self.item_index, checkpoint=self.checkpoint
+                )
+            stats.update(memory.as_dict())
+            stats['memory_budget_bytes'] = self.memory_budget
+            if self.profile_path:
+                stats['profile_path'] = profiler.profile_path
+                self.profiled.emit(profiler.profile_path or "", profiler.summary)
             self.finished.emit(self.output_path, sql_lines, stats)
-            
+        except GenerationError as e:
+            if self.profile_path and profiler.summary:
+                self.profiled.emit(profiler.profile_path or "", profiler.summary)
+            self.error.emit(str(e))
         except Exception as e:
             error_msg = f"Unexpected error in SQL generation: {str(e)}\n{traceback.format_exc()}"
             logging.error(error_msg)
             self.error.emit(error_msg)
 
+class BatchSQLGeneratorWorker(QThread):
+    """Generates every template of a batch from one sheet with a single validation pass"""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(list)
+    error = pyqtSignal(str)
+    status_update = pyqtSignal(str)
+    validated = pyqtSignal(object, dict)
+    def __init__(self, df, sheet_name, runs, skip_arabic=True, validate_quality=True, dedup_policy='last',
+                 dedup_key='item', stages=None, memory_budget=None, item_index=None):
+        super().__init__()
+        self.df = df
+        self.sheet_name = sheet_name
+        # generate_sql_scripts runs, each with its 'validation_key' and a cached 'validation_result' if any
+        self.runs = runs
+        self.skip_arabic = skip_arabic
+        self.validate_quality = validate_quality
+        self.dedup_policy = dedup_policy
+        self.dedup_key = dedup_key
+        self.stages = stages
+        self.memory_budget = memory_budget
+        self.item_index = item_index
+    def report_progress(self, row_number, processed_count, error_count, snapshot):
+        if snapshot is None:
+            self.progress.emit(100)
+            return
+        self.progress.emit(snapshot['percent'])
+        self.status_update.emit(format_progress_status(row_number, snapshot, processed_count, error_count))
+    def run(self):
+        try:
+            with MemoryMonitor() as memory:
+                outputs = generate_sql_scripts(
+                    self.df, self.sheet_name, self.runs, self.skip_arabic, self.validate_quality, self.dedup_policy,
+                    self.dedup_key, on_progress=self.report_progress, on_status=self.status_update.emit,
+                    on_validated=lambda position, result: self.validated.emit(self.runs[position]['validation_key'], result),
+                    should_stop=self.isInterruptionRequested, stages=self.stages, memory_budget=self.memory_budget,
+                    item_index=self.item_index
+                )
+            results = []
+            for run, (_, stats) in zip(self.runs, outputs):
+                stats.update(memory.as_dict())
+                stats['memory_budget_bytes'] = self.memory_budget
+                results.append((run['output_path'], stats))
+            self.finished.emit(results)
+        except GenerationError as e:
+            self.error.emit(str(e))
+        except Exception as e:
+            error_msg = f"Unexpected error in batch SQL generation: {str(e)}\n{traceback.format_exc()}"
+            logging.error(error_msg)
+            self.error.emit(error_msg)
+
 # --- ColorDelegate: For preview table coloring ---
 class ColorDelegate(QStyledItemDelegate):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.error_rows = set()
-        self.warning_rows = set()
-        self.arabic_rows = set()
+        self.set_row_classes({})
+    def set_row_classes(self, row_classes):
+        """Use the sorted row-position arrays produced by DataHandler.classify_rows"""
+        no_rows = ()  # avoids importing numpy before a sheet is loaded
+        self.error_rows = row_classes.get('empty', no_rows)
+        self.warning_rows = row_classes.get('invalid', no_rows)
+        self.arabic_rows = row_classes.get('arabic', no_rows)
+    @staticmethod
+    def _contains(rows, row):
+        if len(rows) == 0:
+            return False
+        position = np.searchsorted(rows, row)
+        return position < len(rows) and rows[position] == row
     def paint(self, painter, option, index):
-        if index.row() in self.error_rows:
+        # Row arrays hold sheet row positions; map through the model when it is sorted/filtered
+        model = index.model()
+        row = model.source_row(index.row()) if hasattr(model, 'source_row') else index.row()
+        if self._contains(self.error_rows, row):
             option.backgroundBrush = QColor(255, 200, 200)
-        elif index.row() in self.warning_rows:
+        elif self._contains(self.warning_rows, row):
             option.backgroundBrush = QColor(255, 255, 200)
-        elif index.row() in self.arabic_rows:
+        elif self._contains(self.arabic_rows, row):
             option.backgroundBrush = QColor(200, 200, 255)
         super().paint(painter, option, index)
 
+# --- DataFrameTableModel: Lazy preview model over the whole sheet ---
+class DataFrameTableModel(QAbstractTableModel):
+    """Read-only table model over a DataFrame.
+
+    Cells are converted to text only when the view asks for them, so the preview can show
+    the whole sheet. Sorting and filtering reorder an array of row positions instead of
+    copying the DataFrame.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._df = None
+        self._columns = []
+        self._positions = range(0)
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filter_text = ""
+        self._filter_column = -1
+
+    def set_dataframe(self, df):
+        self.beginResetModel()
+        self._df = df
+        self._columns = [] if df is None else [df.iloc[:, i].array for i in range(df.shape[1])]
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self._filter_text = ""
+        self._filter_column = -1
+        self._positions = range(0) if df is None else np.arange(len(df))
+        self.endResetModel()
+
+    def total_rows(self):
+        return 0 if self._df is None else len(self._df)
+
+    def source_row(self, view_row):
+        """Sheet row position (0-based, excluding the header) shown at a view row"""
+        return int(self._positions[view_row])
+
+    def view_rows_for(self, source_rows):
+        """Ascending view rows that currently show any of the given sheet row positions"""
+        return np.flatnonzero(np.isin(self._positions, source_rows))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._positions)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.ToolTipRole):
+            return None
+        try:
+            return str(self._columns[index.column()][self._positions[index.row()]])
+        except Exception as e:
+            logging.warning(f"Error processing cell [{index.row()}, {index.column()}]: {e}")
+            return "ERROR"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or self._df is None:
+            return None
+        if orientation == Qt.Horizontal:
+            return str(self._df.columns[section])
+        # Excel row number (row 1 is the header), matching the skipped rows log
+        return str(self.source_row(section) + 2)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.beginResetModel()
+        self._sort_column = column
+        self._sort_order = order
+        self._apply_filter_and_sort()
+        self.endResetModel()
+
+    def set_filter(self, text, column=-1):
+        """Show only rows whose text contains `text` (case-insensitive); column -1 searches all columns"""
+        self.beginResetModel()
+        self._filter_text = text.strip()
+        self._filter_column = column
+        self._apply_filter_and_sort()
+        self.endResetModel()
+
+    def _apply_filter_and_sort(self):
+        if self._df is None:
+            self._positions = range(0)
+            return
+
+        positions = np.arange(len(self._df))
+        if self._filter_text:
+            columns = [self._filter_column] if self._filter_column >= 0 else range(len(self._columns))
+            mask = np.zeros(len(positions), dtype=bool)
+            for c in columns:
+                mask |= pd.Series(self._columns[c]).astype(str).str.contains(
+                    self._filter_text, case=False, regex=False).to_numpy()
+            positions = np.flatnonzero(mask)
+
+        if 0 <= self._sort_column < len(self._columns) and len(positions):
+            values = pd.Series(self._columns[self._sort_column][positions])
+            if values.dtype == object:
+                # Mixed object columns: numeric order if every value parses, otherwise compare as text
+                numeric = pd.to_numeric(values, errors='coerce')
+                values = numeric if numeric.notna().sum() == values.notna().sum() else values.astype(str)
+            order = values.sort_values(ascending=self._sort_order == Qt.AscendingOrder,
+                                       kind='stable', na_position='last').index
+            positions = positions[order.to_numpy()]
+
+        self._positions = positions
+
+# --- LogView: Log tab with a cap on retained lines ---
+class LogView(QPlainTextEdit):
+    """Read-only log pane that keeps only the newest `max_lines` lines (ring buffer)"""
+    def __init__(self, max_lines=5000, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+    def append(self, text):
+        self.appendPlainText(text)
+
 # --- SettingsDialog: For preferences ---
 class SettingsDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Settings")
-        self.setFixedSize(400, 300)
+        self.setFixedSize(400, 510)
         layout = QVBoxLayout()
         theme_group = QGroupBox("Theme")
         theme_layout = QVBoxLayout()
@@ -536,17 +571,43 @@ class SettingsDialog(QDialog):
         theme_group.setLayout(theme_layout)
         defaults_group = QGroupBox("Default Settings")
         defaults_layout = QGridLayout()
-        defaults_layout.addWidget(QLabel("Default Preview Rows:"), 0, 0)
-        self.default_preview_rows = QSpinBox()
-        self.default_preview_rows.setRange(1, 100)
-        self.default_preview_rows.setValue(10)
-        defaults_layout.addWidget(self.default_preview_rows, 0, 1)
-        defaults_layout.addWidget(QLabel("Default Stored Procedure:"), 1, 0)
+        defaults_layout.addWidget(QLabel("Default Stored Procedure:"), 0, 0)
         self.default_sp_friendly_name = QLineEdit()
-        defaults_layout.addWidget(self.default_sp_friendly_name, 1, 1)
+        defaults_layout.addWidget(self.default_sp_friendly_name, 0, 1)
         self.auto_save_settings = QCheckBox("Auto-save settings")
-        defaults_layout.addWidget(self.auto_save_settings, 2, 0, 1, 2)
+        defaults_layout.addWidget(self.auto_save_settings, 1, 0, 1, 2)
         defaults_group.setLayout(defaults_layout)
+        logging_group = QGroupBox("Logging")
+        logging_layout = QGridLayout()
+        logging_layout.addWidget(QLabel("Log level:"), 0, 0)
+        self.log_level = QComboBox()
+        self.log_level.addItems(LOG_LEVELS)
+        logging_layout.addWidget(self.log_level, 0, 1)
+        logging_layout.addWidget(QLabel("Log tab lines kept:"), 1, 0)
+        self.log_max_lines = QSpinBox()
+        self.log_max_lines.setRange(500, 200000)
+        self.log_max_lines.setSingleStep(1000)
+        logging_layout.addWidget(self.log_max_lines, 1, 1)
+        logging_group.setLayout(logging_layout)
+        memory_group = QGroupBox("Memory")
+        memory_layout = QGridLayout()
+        memory_layout.addWidget(QLabel("Memory budget:"), 0, 0)
+        self.memory_budget_mb = QSpinBox()
+        self.memory_budget_mb.setRange(0, 1024 * 1024)
+        self.memory_budget_mb.setSingleStep(512)
+        self.memory_budget_mb.setSuffix(" MB")
+        self.memory_budget_mb.setSpecialValueText("No budget")
+        self.memory_budget_mb.setToolTip("Larger workbooks ask before loading; larger scripts are streamed to disk")
+        memory_layout.addWidget(self.memory_budget_mb, 0, 1)
+        memory_group.setLayout(memory_layout)
+        developer_group = QGroupBox("Developer")
+        developer_layout = QVBoxLayout()
+        self.profile_next_run = QCheckBox("Profile the next load or generation")
+        self.profile_next_run.setToolTip(
+            "Saves a cProfile .prof file next to the output and lists the slowest functions in the Log tab.\n"
+            "Set EXCEL_TO_SQL_PROFILE=1 to profile every run.")
+        developer_layout.addWidget(self.profile_next_run)
+        developer_group.setLayout(developer_layout)
         button_layout = QHBoxLayout()
         ok_button = QPushButton("OK")
         cancel_button = QPushButton("Cancel")
@@ -556,6 +617,9 @@ class SettingsDialog(QDialog):
         button_layout.addWidget(cancel_button)
         layout.addWidget(theme_group)
         layout.addWidget(defaults_group)
+        layout.addWidget(logging_group)
+        layout.addWidget(memory_group)
+        layout.addWidget(developer_group)
         layout.addLayout(button_layout)
         self.setLayout(layout)
         self.load_settings()
@@ -566,31 +630,30 @@ class SettingsDialog(QDialog):
             self.dark_theme.setChecked(True)
         else:
             self.light_theme.setChecked(True)
-        self.default_preview_rows.setValue(int(settings.value('default_preview_rows', 10)))
         self.default_sp_friendly_name.setText(settings.value('default_sp_friendly_name', 'Update Items Dropship Quantities'))
         self.auto_save_settings.setChecked(settings.value('auto_save_settings', True, type=bool))
+        self.log_level.setCurrentText(settings.value('log_level', 'INFO'))
+        self.log_max_lines.setValue(int(settings.value('log_max_lines', 5000)))
+        self.memory_budget_mb.setValue(int(settings.value('memory_budget_mb', 4096)))
+        self.profile_next_run.setChecked(settings.value('profile_next_run', False, type=bool))
     def save_settings(self):
         settings = QSettings('ExcelToSQL', 'Settings')
         theme = 'dark' if self.dark_theme.isChecked() else 'light'
         settings.setValue('theme', theme)
-        settings.setValue('default_preview_rows', self.default_preview_rows.value())
         settings.setValue('default_sp_friendly_name', self.default_sp_friendly_name.text())
         settings.setValue('auto_save_settings', self.auto_save_settings.isChecked())
+        settings.setValue('log_level', self.log_level.currentText())
+        settings.setValue('log_max_lines', self.log_max_lines.value())
+        settings.setValue('memory_budget_mb', self.memory_budget_mb.value())
+        settings.setValue('profile_next_run', self.profile_next_run.isChecked())
 
 # --- MainWindow: All UI widgets/layouts ---
 class MainWindow(QWidget):
     def __init__(self):
         super().__init__()
         # Configure logging 
-        # This will log to both a file and the console
-        logging.basicConfig(
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s',
-            handlers=[
-                logging.FileHandler('excel_to_sql.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # This will log to both a file and the console, written from a background thread
+        configure_logging(QSettings('ExcelToSQL', 'Settings').value('log_level', 'INFO'))
         
         self.setWindowTitle("Excel to SQL Script Generator v3.0")
         self.setGeometry(200, 100, 1200, 800)
@@ -601,40 +664,64 @@ class MainWindow(QWidget):
         self.current_df_columns = []
         self.file_path = ""
         self.recent_files = []
-        self.processing_history = []
-        self.stored_procedures = {
-            "Update Items Dropship Quantities": {
-                "sql_template": "EXEC [dbo].[Hyou_UPDATE_EVS_ItemAddational_DROPSHIP_QTY_Excel] @ITEMNMBR = '{item}', @QTY = {qty:.3f}, @F1 = NULL, @F2 = NULL",
-                "parameters": ["item", "qty"],
-                "friendly_name": "Update Items Dropship Quantities"
-            },
-            "Update Markdown Discounts": {
-                "sql_template": "EXEC [dbo].[HYOU_SP_UPDATE_Makdown_Discount_All_Levels] @ITEMNMBR = '{item}', @Slp_Markdown = {Slp_Discount:.3f}, @Spv_Markdown = {Spv_Discount:.3f}, @Mgr_Markdown = {Mgr_Discount:.3f}",
-                "parameters": ["item", "Slp_Discount", "Spv_Discount", "Mgr_Discount"],
-                "friendly_name": "Update Markdown Discounts"
-            },
-            "Update Items Current Cost": {
-                "sql_template": "UPDATE IV00101 SET CURRCOST = {New_Current_Cost:.3f} WHERE ITEMNMBR = '{item}'",
-                "parameters": ["item", "New_Current_Cost"],
-                "friendly_name": "Update Items Current Cost"
-            },
-            "Update Items Status": {
-                "sql_template": "UPDATE IV00101 SET USCATVLS_6 = '{Status}', INACTIVE = 1, ITEMTYPE = 2 WHERE ITEMNMBR = '{item}'",
-                "parameters": ["item", "Status"],
-                "friendly_name": "Update Items Status"
-            },
-            "Update Items Prices": {
-                "sql_template": "EXEC [dbo].[HYOU_SP_UPDATE_Item_Price_IV00108&More] @ITEMNMBR = '{item}', @PRCLEVEL = 'SHOWROOM', @PRICE = {New_Showroom:.3f}",
-                "parameters": ["item", "New_Showroom"],
-                "friendly_name": "Update Items Prices"
-            }
-        }
+        # StageTimer entries for loading the file and selecting the current sheet
+        self.load_stages = {}
+        # Path and SHA-256 of the loaded workbook (file_path is cleared once loading finishes)
+        self.loaded_file_path = ""
+        self.loaded_file_hash = None
+        # Per-sheet hashes of the loaded workbook; saving it again reloads only the changed sheets
+        self.workbook_fingerprint = None
+        self.file_watcher = QFileSystemWatcher()
+        self.file_change_timer = QTimer()
+        self.file_change_timer.setSingleShot(True)
+        # Excel writes a temporary file and renames it; wait for the save to settle
+        self.file_change_timer.setInterval(750)
+        self.file_watcher.fileChanged.connect(lambda path: self.file_change_timer.start())
+        self.file_change_timer.timeout.connect(lambda: self.controller.reload_changed_file())
+        try:
+            self.run_history = RunHistory()
+        except Exception as e:
+            # Keep history for this session only
+            logging.error(f"Could not open run history database: {e}")
+            self.run_history = RunHistory(':memory:')
+        self.history_runs = []
+        # Templates queued with "Add to Batch" (prepare_generation settings for the current sheet)
+        self.batch_runs = []
+        # Deep DataFrame memory per loaded sheet and the RSS seen while parsing the file
+        self.sheet_memory = {}
+        self.load_memory = {}
+        self.last_run_metrics = None
+        # ItemMasterIndex for item_master_path, loaded in the background after first paint
+        self.item_index = None
+        # ScriptIndex of the script shown in the Generated SQL tab, and the path being indexed
+        self.script_index = None
+        self.script_path = None
+        self.script_page_start = 0
+        self.script_found = None
+        self.template_load_error = ""
+        try:
+            self.template_registry = TemplateRegistry.load()
+        except Exception as e:
+            self.template_load_error = f"Failed to load SQL templates: {str(e)}"
+            logging.error(self.template_load_error)
+            self.template_registry = TemplateRegistry()
+        self.stored_procedures = self.template_registry.templates
         self.color_delegate = ColorDelegate()
+        # Whole-sheet row classification, computed in the background per sheet/mapping/flags
+        self.row_classes = {}
+        self.row_classification_cache = {}
+        self.row_classifier_threads = []
+        self.row_classification_timer = QTimer()
+        self.row_classification_timer.setSingleShot(True)
+        self.row_classification_timer.setInterval(250)
+        self.row_classification_timer.timeout.connect(self.start_row_classification)
+        # Per-sheet column profiles (DataHandler.profile_sheet), computed once per loaded sheet
+        self.column_profiles = {}
+        self.column_profile_threads = []
         self.param_column_combos = {}
         self.mapping_widgets_layout = QFormLayout()
-        # Status-specific additional options
-        self.inactive_combo = None
-        self.itemtype_combo = None
+        # Template-specific run options (e.g. INACTIVE/ITEMTYPE for "Update Items Status")
+        self.flag_combos = {}
         self.load_settings()
         self.init_ui()
         self.setup_menu()
@@ -652,16 +739,19 @@ class MainWindow(QWidget):
     def load_settings(self):
         settings = QSettings('ExcelToSQL', 'Settings')
         self.theme = settings.value('theme', 'light')
-        self.default_preview_rows = int(settings.value('default_preview_rows', 10))
         self.default_sp_friendly_name = settings.value('default_sp_friendly_name', 'Update Items Dropship Quantities')
         self.auto_save_enabled = settings.value('auto_save_settings', True, type=bool)
+        self.log_level = settings.value('log_level', 'INFO')
+        self.log_max_lines = int(settings.value('log_max_lines', 5000))
+        self.memory_budget = int(settings.value('memory_budget_mb', 4096)) * MEGABYTE
+        self.profile_next_run = settings.value('profile_next_run', False, type=bool)
+        self.item_master_path = settings.value('item_master_path', '')
         self.recent_files = settings.value('recent_files', [], type=list)
         if len(self.recent_files) > 10:
             self.recent_files = self.recent_files[-10:]
     def save_settings(self):
         settings = QSettings('ExcelToSQL', 'Settings')
         settings.setValue('theme', self.theme)
-        settings.setValue('default_preview_rows', self.default_preview_rows)
         if hasattr(self, 'sp_selector') and self.sp_selector is not None:
             settings.setValue('default_sp_friendly_name', self.sp_selector.currentText())
         else:
@@ -693,6 +783,9 @@ class MainWindow(QWidget):
         preferences_action.triggered.connect(self.show_settings)
         settings_menu.addAction(preferences_action)
         help_menu = self.menubar.addMenu('Help')
+        startup_action = QAction('Startup Timing', self)
+        startup_action.triggered.connect(self.show_startup_report)
+        help_menu.addAction(startup_action)
         about_action = QAction('About', self)
         about_action.triggered.connect(self.show_about)
         help_menu.addAction(about_action)
@@ -718,10 +811,13 @@ class MainWindow(QWidget):
             dialog.save_settings()
             self.load_settings()
             self.apply_theme()
+            configure_logging(self.log_level)
+            self.text_output.setMaximumBlockCount(self.log_max_lines)
             index = self.sp_selector.findText(self.default_sp_friendly_name)
             if index != -1:
                 self.sp_selector.setCurrentIndex(index)
-            self.preview_rows_spin.setValue(self.default_preview_rows)
+    def show_startup_report(self):
+        QMessageBox.information(self, "Startup Timing", StartupTimer.report())
     def show_about(self):
         QMessageBox.about(self, "About",
             "Excel to SQL Script Generator v3.0\n\n"
@@ -737,8 +833,8 @@ class MainWindow(QWidget):
                 QPushButton:hover { background-color: #505050; }
                 QPushButton:pressed { background-color: #606060; }
                 QLineEdit, QComboBox, QSpinBox { background-color: #404040; border: 1px solid #555555; border-radius: 4px; padding: 4px; }
-                QTableWidget { background-color: #353535; alternate-background-color: #404040; gridline-color: #555555; }
-                QTextEdit { background-color: #353535; border: 1px solid #555555; }
+                QTableView { background-color: #353535; alternate-background-color: #404040; gridline-color: #555555; }
+                QTextEdit, QPlainTextEdit { background-color: #353535; border: 1px solid #555555; }
                 QProgressBar { background-color: #404040; border: 1px solid #555555; border-radius: 4px; text-align: center; }
                 QProgressBar::chunk { background-color: #4a9eff; border-radius: 3px; }
                 QTabWidget::pane { border: 2px solid #555555; border-radius: 8px; background: #353535; }
@@ -824,10 +920,33 @@ class MainWindow(QWidget):
         self.skip_arabic_check.setChecked(True)
         self.validate_data_check = QCheckBox("Validate data quality")
         self.validate_data_check.setChecked(True)
+        self.skip_arabic_check.toggled.connect(self.on_validation_inputs_changed)
+        self.validate_data_check.toggled.connect(self.on_validation_inputs_changed)
+        dedup_layout = QHBoxLayout()
+        dedup_layout.addWidget(QLabel("Duplicate items:"))
+        self.dedup_combo = QComboBox()
+        self.dedup_combo.addItem("Keep last occurrence", 'last')
+        self.dedup_combo.addItem("Keep first occurrence", 'first')
+        self.dedup_combo.addItem("Keep all rows", None)
+        dedup_layout.addWidget(self.dedup_combo)
+        item_master_layout = QHBoxLayout()
+        item_master_layout.addWidget(QLabel("Item master:"))
+        self.item_master_input = QLineEdit(self.item_master_path)
+        self.item_master_input.setReadOnly(True)
+        self.item_master_input.setPlaceholderText("None (items are not checked)")
+        self.browse_item_master_button = QPushButton("Browse")
+        self.browse_item_master_button.clicked.connect(self.browse_item_master)
+        self.clear_item_master_button = QPushButton("Clear")
+        self.clear_item_master_button.clicked.connect(lambda: self.set_item_master(""))
+        item_master_layout.addWidget(self.item_master_input)
+        item_master_layout.addWidget(self.browse_item_master_button)
+        item_master_layout.addWidget(self.clear_item_master_button)
         config_layout.addLayout(output_layout)
         config_layout.addLayout(sp_layout)
         config_layout.addWidget(self.skip_arabic_check)
         config_layout.addWidget(self.validate_data_check)
+        config_layout.addLayout(dedup_layout)
+        config_layout.addLayout(item_master_layout)
         config_group.setLayout(config_layout)
         mapping_group = QGroupBox("🔗 Column Mapping")
         mapping_group.setLayout(self.mapping_widgets_layout)
@@ -840,10 +959,30 @@ class MainWindow(QWidget):
         self.progress_bar.hide()
         self.status_label = QLabel("")
         self.status_label.hide()
+        self.validation_state_label = QLabel("")
+        self.validation_state_label.setStyleSheet("QLabel { color: #888888; }")
+        batch_layout = QHBoxLayout()
+        self.add_to_batch_button = QPushButton("Add to Batch")
+        self.add_to_batch_button.setToolTip("Queue this template and mapping; a batch validates the sheet once for all templates")
+        self.add_to_batch_button.clicked.connect(lambda: self.controller.add_to_batch())
+        self.generate_batch_button = QPushButton("Generate Batch")
+        self.generate_batch_button.clicked.connect(lambda: self.controller.generate_batch())
+        self.clear_batch_button = QPushButton("Clear Batch")
+        self.clear_batch_button.clicked.connect(self.clear_batch)
+        batch_layout.addWidget(self.add_to_batch_button)
+        batch_layout.addWidget(self.generate_batch_button)
+        batch_layout.addWidget(self.clear_batch_button)
+        self.batch_label = QLabel("")
+        self.batch_label.setWordWrap(True)
+        self.batch_label.setStyleSheet("QLabel { color: #888888; }")
+        process_layout.addWidget(self.validation_state_label)
         process_layout.addWidget(self.generate_button)
+        process_layout.addLayout(batch_layout)
+        process_layout.addWidget(self.batch_label)
         process_layout.addWidget(self.progress_bar)
         process_layout.addWidget(self.status_label)
         process_group.setLayout(process_layout)
+        self.update_batch_label()
         left_layout.addWidget(file_group)
         left_layout.addWidget(config_group)
         left_layout.addWidget(mapping_group)
@@ -854,16 +993,36 @@ class MainWindow(QWidget):
         preview_tab = QWidget()
         preview_layout = QVBoxLayout()
         preview_controls = QHBoxLayout()
-        preview_controls.addWidget(QLabel("Preview rows:"))
-        self.preview_rows_spin = QSpinBox()
-        self.preview_rows_spin.setRange(1, 100)
-        self.preview_rows_spin.setValue(self.default_preview_rows)
-        self.preview_rows_spin.valueChanged.connect(self.update_preview)
-        preview_controls.addWidget(self.preview_rows_spin)
+        preview_controls.addWidget(QLabel("Filter:"))
+        self.preview_filter_input = QLineEdit()
+        self.preview_filter_input.setPlaceholderText("Text to search, press Enter")
+        self.preview_filter_input.returnPressed.connect(self.apply_preview_filter)
+        preview_controls.addWidget(self.preview_filter_input)
+        self.preview_filter_column = QComboBox()
+        self.preview_filter_column.addItem("All columns")
+        self.preview_filter_column.currentIndexChanged.connect(self.apply_preview_filter)
+        preview_controls.addWidget(self.preview_filter_column)
+        self.preview_count_label = QLabel("")
+        preview_controls.addWidget(self.preview_count_label)
         preview_controls.addStretch()
-        self.table_output = QTableWidget()
+        self.issue_count_label = QLabel("")
+        preview_controls.addWidget(self.issue_count_label)
+        self.prev_issue_button = QPushButton("◀ Previous issue")
+        self.prev_issue_button.clicked.connect(lambda: self.jump_to_issue(-1))
+        preview_controls.addWidget(self.prev_issue_button)
+        self.next_issue_button = QPushButton("Next issue ▶")
+        self.next_issue_button.clicked.connect(lambda: self.jump_to_issue(1))
+        preview_controls.addWidget(self.next_issue_button)
+        self.preview_model = DataFrameTableModel()
+        self.table_output = QTableView()
+        self.table_output.setModel(self.preview_model)
         self.table_output.setItemDelegate(self.color_delegate)
         self.table_output.setAlternatingRowColors(True)
+        # Fixed row heights keep scrolling constant-time on very large sheets
+        self.table_output.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table_output.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table_output.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table_output.setSortingEnabled(True)
         preview_layout.addLayout(preview_controls)
         preview_layout.addWidget(self.table_output)
         preview_tab.setLayout(preview_layout)
@@ -871,21 +1030,112 @@ class MainWindow(QWidget):
         stats_layout = QVBoxLayout()
         self.stats_text = QTextEdit()
         self.stats_text.setReadOnly(True)
+        # Monospaced so the stage timing table lines up
+        self.stats_text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
         stats_layout.addWidget(self.stats_text)
+        stats_buttons = QHBoxLayout()
+        stats_buttons.addStretch()
+        self.export_metrics_button = QPushButton("Export Metrics...")
+        self.export_metrics_button.setToolTip("Save the last run's statistics and stage timings as JSON or Prometheus text")
+        self.export_metrics_button.setEnabled(False)
+        self.export_metrics_button.clicked.connect(self.export_run_metrics)
+        stats_buttons.addWidget(self.export_metrics_button)
+        stats_layout.addLayout(stats_buttons)
         stats_tab.setLayout(stats_layout)
         log_tab = QWidget()
         log_layout = QVBoxLayout()
-        self.text_output = QTextEdit()
-        self.text_output.setReadOnly(True)
+        self.text_output = LogView(self.log_max_lines)
         log_layout.addWidget(self.text_output)
         log_tab.setLayout(log_layout)
         history_tab = QWidget()
         history_layout = QVBoxLayout()
-        self.history_list = QListWidget()
-        history_layout.addWidget(self.history_list)
+        history_filters = QHBoxLayout()
+        self.history_file_filter = QComboBox()
+        self.history_template_filter = QComboBox()
+        self.history_status_filter = QComboBox()
+        for label, value in (("Any status", None), ("Succeeded", 'success'), ("Failed", 'failed')):
+            self.history_status_filter.addItem(label, value)
+        self.history_period_filter = QComboBox()
+        for label, days in (("All time", None), ("Last 24 hours", 1), ("Last 7 days", 7), ("Last 30 days", 30)):
+            self.history_period_filter.addItem(label, days)
+        for label, combo in (("File:", self.history_file_filter), ("Template:", self.history_template_filter),
+                             ("Status:", self.history_status_filter), ("Period:", self.history_period_filter)):
+            history_filters.addWidget(QLabel(label))
+            history_filters.addWidget(combo)
+            combo.currentIndexChanged.connect(self.update_history_list)
+        history_filters.addStretch()
+        history_layout.addLayout(history_filters)
+        self.history_table = QTableWidget(0, len(HISTORY_COLUMNS))
+        self.history_table.setHorizontalHeaderLabels([title for title, _ in HISTORY_COLUMNS])
+        self.history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.history_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.history_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.history_table.verticalHeader().setVisible(False)
+        self.history_table.setToolTip("Double-click a run for its mapping and stage timings")
+        self.history_table.cellDoubleClicked.connect(self.show_history_details)
+        history_layout.addWidget(self.history_table)
+        self.history_trend_label = QLabel("")
+        self.history_trend_label.setWordWrap(True)
+        history_layout.addWidget(self.history_trend_label)
         history_tab.setLayout(history_layout)
+        self.refresh_history_filters()
+        script_tab = QWidget()
+        script_layout = QVBoxLayout()
+        script_source = QHBoxLayout()
+        script_source.addWidget(QLabel("Script:"))
+        self.script_selector = QComboBox()
+        self.script_selector.setSizeAdjustPolicy(QComboBox.AdjustToContents)
+        self.script_selector.activated.connect(
+            lambda _: self.controller.load_script_index(self.script_selector.currentText()))
+        script_source.addWidget(self.script_selector)
+        self.open_script_button = QPushButton("Open Script...")
+        self.open_script_button.clicked.connect(self.open_script_dialog)
+        script_source.addWidget(self.open_script_button)
+        self.script_info_label = QLabel("Generate a script to view it here.")
+        script_source.addWidget(self.script_info_label)
+        script_source.addStretch()
+        script_layout.addLayout(script_source)
+        script_controls = QHBoxLayout()
+        self.script_prev_button = QPushButton("◀ Previous page")
+        self.script_prev_button.clicked.connect(lambda: self.show_script_page(self.script_page_start - SCRIPT_PAGE_SIZE))
+        script_controls.addWidget(self.script_prev_button)
+        self.script_next_button = QPushButton("Next page ▶")
+        self.script_next_button.clicked.connect(lambda: self.show_script_page(self.script_page_start + SCRIPT_PAGE_SIZE))
+        script_controls.addWidget(self.script_next_button)
+        script_controls.addWidget(QLabel("Go to statement:"))
+        self.script_position = QSpinBox()
+        self.script_position.setRange(1, 1)
+        self.script_position.setKeyboardTracking(False)
+        self.script_position.valueChanged.connect(lambda value: self.show_script_statement(value - 1))
+        script_controls.addWidget(self.script_position)
+        self.script_page_label = QLabel("")
+        script_controls.addWidget(self.script_page_label)
+        script_controls.addStretch()
+        script_controls.addWidget(QLabel("Find item:"))
+        self.script_find_input = QLineEdit()
+        self.script_find_input.setPlaceholderText("Item number, press Enter")
+        self.script_find_input.returnPressed.connect(lambda: self.find_in_script(1))
+        self.script_find_input.textChanged.connect(lambda _: setattr(self, 'script_found', None))
+        script_controls.addWidget(self.script_find_input)
+        self.script_find_prev_button = QPushButton("◀")
+        self.script_find_prev_button.setToolTip("Previous statement with this item")
+        self.script_find_prev_button.clicked.connect(lambda: self.find_in_script(-1))
+        script_controls.addWidget(self.script_find_prev_button)
+        self.script_find_next_button = QPushButton("▶")
+        self.script_find_next_button.setToolTip("Next statement with this item")
+        self.script_find_next_button.clicked.connect(lambda: self.find_in_script(1))
+        script_controls.addWidget(self.script_find_next_button)
+        script_layout.addLayout(script_controls)
+        self.script_text = QPlainTextEdit()
+        self.script_text.setReadOnly(True)
+        self.script_text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.script_text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        script_layout.addWidget(self.script_text)
+        script_tab.setLayout(script_layout)
+        self.update_script_controls()
         right_panel.addTab(preview_tab, "📊 Preview")
         right_panel.addTab(stats_tab, "📈 Statistics")
+        right_panel.addTab(script_tab, "🧾 Generated SQL")
         right_panel.addTab(log_tab, "📝 Log")
         right_panel.addTab(history_tab, "🕐 History")
         main_splitter.addWidget(left_panel)
@@ -893,6 +1143,8 @@ class MainWindow(QWidget):
         main_splitter.setSizes([400, 800])
         main_layout.addWidget(main_splitter)
         self.setLayout(main_layout)
+        if self.template_load_error:
+            self.text_output.append(self.template_load_error)
         self.on_sp_changed()
     # --- UI Event Handlers ---
     def open_excel_dialog(self):
@@ -905,9 +1157,61 @@ class MainWindow(QWidget):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save SQL Script", "", "SQL Files (*.sql);;All Files (*)")
         if file_path:
             self.output_path_input.setText(file_path)
+    def browse_item_master(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Item Master", os.path.dirname(self.item_master_path),
+            "Item master (*.csv *.txt *.parquet *.db *.sqlite *.sqlite3);;All Files (*)")
+        if file_path:
+            self.set_item_master(file_path)
+    def set_item_master(self, file_path):
+        """Remember the item master and (re)build its index; an empty path turns item checks off"""
+        self.item_master_path = file_path
+        self.item_master_input.setText(file_path)
+        QSettings('ExcelToSQL', 'Settings').setValue('item_master_path', file_path)
+        self.item_index = None
+        if file_path:
+            self.controller.load_item_master(file_path)
+        else:
+            self.text_output.append("Item master cleared; items are no longer checked")
     def on_sheet_changed(self):
+        # Batched mappings belong to the previous sheet
+        self.clear_batch()
         self.selected_sheet_name = self.sheet_selector.currentText()
         self.reload_sheet_data()
+    def watch_loaded_file(self):
+        if self.file_watcher.files():
+            self.file_watcher.removePaths(self.file_watcher.files())
+        if self.loaded_file_path and os.path.exists(self.loaded_file_path):
+            self.file_watcher.addPath(self.loaded_file_path)
+    def capture_sheet_state(self):
+        """Mapping, template options and preview filter/sort/scroll of the current sheet"""
+        header = self.table_output.horizontalHeader()
+        return {
+            'mappings': self.get_selected_mappings(),
+            'flags': {name: combo.currentIndex() for name, combo in self.flag_combos.items()},
+            'filter_text': self.preview_filter_input.text(),
+            'filter_column': self.preview_filter_column.currentText(),
+            'sort': (header.sortIndicatorSection(), header.sortIndicatorOrder()),
+            'scroll': self.table_output.verticalScrollBar().value(),
+        }
+    def restore_sheet_state(self, state):
+        """Re-apply capture_sheet_state after the sheet was reloaded (columns that are gone are skipped)"""
+        for param, column in state['mappings'].items():
+            combo = self.param_column_combos.get(param)
+            if combo is not None and column in self.current_df_columns:
+                combo.setCurrentText(column)
+        for name, index in state['flags'].items():
+            if name in self.flag_combos:
+                self.flag_combos[name].setCurrentIndex(index)
+        self.preview_filter_input.setText(state['filter_text'])
+        self.preview_filter_column.blockSignals(True)
+        self.preview_filter_column.setCurrentIndex(max(self.preview_filter_column.findText(state['filter_column']), 0))
+        self.preview_filter_column.blockSignals(False)
+        self.apply_preview_filter()
+        section, order = state['sort']
+        if 0 <= section < len(self.current_df_columns):
+            self.table_output.sortByColumn(section, order)
+        self.table_output.verticalScrollBar().setValue(state['scroll'])
     # Replace the on_sp_changed method in MainWindow class (around line 930)
 
     def on_sp_changed(self):
@@ -918,64 +1222,194 @@ class MainWindow(QWidget):
                 item.widget().deleteLater()
         self.param_column_combos.clear()
         
-        # Clear status-specific widgets
-        self.inactive_combo = None
-        self.itemtype_combo = None
+        # Clear template-specific option widgets
+        self.flag_combos.clear()
 
         selected_sp_friendly_name = self.sp_selector.currentText()
         sp_details = self.stored_procedures.get(selected_sp_friendly_name)
         
         if sp_details:
             parameters = sp_details['parameters']
+            profiles = self.column_profiles.get(self.current_profile_key())
+            suggestions = DataHandler.suggest_column_mappings(parameters, sp_details['parameter_specs'],
+                                                              self.current_df_columns, profiles)
+            # A mapping used successfully on this file before wins over the suggestions
+            previous = self.run_history.last_mapping(
+                selected_sp_friendly_name, self.loaded_file_hash, os.path.basename(self.loaded_file_path)
+            ) if self.current_df_columns else None
+            if previous:
+                reused = {param: col for param, col in previous.items()
+                          if param in parameters and col in self.current_df_columns}
+                if reused:
+                    suggestions.update(reused)
+                    self.text_output.append(f"Using the column mapping from the last '{selected_sp_friendly_name}' run on this file")
             for param in parameters:
-                label = QLabel(f"{param.replace('_', ' ').title()} Column:")
+                label = QLabel(f"{sp_details['parameter_specs'][param]['label']}:")
                 combo = QComboBox()
                 combo.addItems(["-- Select Column --"] + [str(col) for col in self.current_df_columns])
                 self.mapping_widgets_layout.addRow(label, combo)
                 self.param_column_combos[param] = combo
-                if self.current_df_columns:
-                    for i, col_name in enumerate(self.current_df_columns):
-                        # Convert both to strings and then compare (case-insensitive)
-                        try:
-                            if str(col_name).lower() == param.lower():
-                                combo.setCurrentIndex(i + 1)
-                                break
-                        except (AttributeError, TypeError):
-                            # If comparison fails, try exact match
-                            if str(col_name) == param:
-                                combo.setCurrentIndex(i + 1)
-                                break
+                if param in suggestions:
+                    combo.setCurrentIndex(self.current_df_columns.index(suggestions[param]) + 1)
+                combo.currentIndexChanged.connect(self.on_validation_inputs_changed)
+            self.apply_column_profile_tooltips(profiles)
             
-            # Add special options for "Update Items Status"
-            if selected_sp_friendly_name == "Update Items Status":
-                # INACTIVE dropdown
-                inactive_label = QLabel("INACTIVE Status:")
-                self.inactive_combo = QComboBox()
-                self.inactive_combo.addItems(["-- Select Value --", "0: Active", "1: Inactive"])
-                self.mapping_widgets_layout.addRow(inactive_label, self.inactive_combo)
-                
-                # ITEMTYPE dropdown
-                itemtype_label = QLabel("ITEMTYPE:")
-                self.itemtype_combo = QComboBox()
-                self.itemtype_combo.addItems(["-- Select Value --", "1: Sales Inventory", "2: Discontinued"])
-                self.mapping_widgets_layout.addRow(itemtype_label, self.itemtype_combo)
+            # Add run-level option dropdowns declared by the template (e.g. INACTIVE/ITEMTYPE)
+            for flag in sp_details.get('flags', []):
+                flag_label = QLabel(f"{flag['label']}:")
+                flag_combo = QComboBox()
+                flag_combo.addItem("-- Select Value --", None)
+                for choice_value, choice_label in flag['choices'].items():
+                    flag_combo.addItem(f"{choice_value}: {choice_label}", choice_value)
+                self.mapping_widgets_layout.addRow(flag_label, flag_combo)
+                self.flag_combos[flag['name']] = flag_combo
         else:
             self.text_output.append(f"Warning: Stored procedure '{selected_sp_friendly_name}' not found in definitions.")
         
         self.generate_button.setEnabled(bool(self.current_df_columns) and bool(sp_details))
-    def update_preview(self):
-        if self.selected_sheet_name and self.selected_sheet_name in self.df_all_sheets:
-            self.reload_sheet_data()
+        self.on_validation_inputs_changed()
+    def on_validation_inputs_changed(self):
+        """Sheet, template, mapping or validation flags changed: refresh background work"""
+        self.schedule_row_classification()
+        if hasattr(self, 'controller'):
+            self.controller.schedule_speculative_validation()
+    def get_selected_mappings(self):
+        """Parameter -> Excel column for every mapping combo that has a column selected"""
+        return {param: combo.currentText() for param, combo in self.param_column_combos.items()
+                if combo.currentText() != "-- Select Column --"}
+    # --- Row classification (whole sheet, background) ---
+    def current_classification_key(self):
+        return (self.selected_sheet_name, id(self.current_df), tuple(sorted(self.get_selected_mappings().items())),
+                self.skip_arabic_check.isChecked(), self.validate_data_check.isChecked())
+    def schedule_row_classification(self):
+        if self.current_df is None:
+            return
+        cached = self.row_classification_cache.get(self.current_classification_key())
+        if cached is not None:
+            self.row_classification_timer.stop()
+            self.apply_row_classes(cached)
+            return
+        self.issue_count_label.setText("Checking rows...")
+        self.row_classification_timer.start()
+    def start_row_classification(self):
+        if self.current_df is None:
+            return
+        key = self.current_classification_key()
+        if key in self.row_classification_cache:
+            self.apply_row_classes(self.row_classification_cache[key])
+            return
+        sp_details = self.stored_procedures.get(self.sp_selector.currentText(), {})
+        thread = RowClassifierWorker(key, self.current_df, self.get_selected_mappings(),
+                                     sp_details.get('parameter_specs', {}),
+                                     self.skip_arabic_check.isChecked(), self.validate_data_check.isChecked())
+        thread.finished.connect(self.on_row_classification_ready)
+        thread.error.connect(lambda message: self.issue_count_label.setText("Row check failed"))
+        # Keep references until threads end; results of superseded runs are dropped by key
+        self.row_classifier_threads = [t for t in self.row_classifier_threads if t.isRunning()]
+        self.row_classifier_threads.append(thread)
+        thread.start()
+    def on_row_classification_ready(self, key, row_classes):
+        self.row_classification_cache[key] = row_classes
+        while len(self.row_classification_cache) > 16:
+            self.row_classification_cache.pop(next(iter(self.row_classification_cache)))
+        if key == self.current_classification_key():
+            self.apply_row_classes(row_classes)
+    def apply_row_classes(self, row_classes):
+        self.row_classes = row_classes
+        self.color_delegate.set_row_classes(row_classes)
+        self.table_output.viewport().update()
+        issues = len(row_classes.get('issues', []))
+        self.issue_count_label.setText(
+            f"Issues: {issues:,} (Empty: {len(row_classes['empty']):,}, "
+            f"Invalid: {len(row_classes['invalid']):,}, Arabic: {len(row_classes['arabic']):,})")
+        self.prev_issue_button.setEnabled(issues > 0)
+        self.next_issue_button.setEnabled(issues > 0)
+    def jump_to_issue(self, step):
+        """Select the next (step=1) or previous (step=-1) row with an issue, wrapping around"""
+        issues = self.row_classes.get('issues')
+        if issues is None or not len(issues):
+            return
+        view_rows = self.preview_model.view_rows_for(issues)
+        if not len(view_rows):
+            self.issue_count_label.setText("No issues in the filtered rows")
+            return
+        current = self.table_output.currentIndex()
+        current_row = current.row() if current.isValid() else -1
+        if step > 0:
+            target = view_rows[np.searchsorted(view_rows, current_row, side='right') % len(view_rows)]
         else:
-            self.file_label.setText("No sheet selected or sheet not found.")
-            self.table_output.clear()
-            self.stats_text.clear()
+            target = view_rows[np.searchsorted(view_rows, current_row, side='left') - 1]
+        index = self.preview_model.index(int(target), max(current.column(), 0))
+        self.table_output.setCurrentIndex(index)
+        self.table_output.scrollTo(index, QTableView.PositionAtCenter)
+    def apply_preview_filter(self):
+        if self.current_df is None:
+            return
+        self.preview_model.set_filter(self.preview_filter_input.text(), self.preview_filter_column.currentIndex() - 1)
+        self.update_preview_count()
+    def update_preview_count(self):
+        self.preview_count_label.setText(
+            f"Showing {self.preview_model.rowCount():,} of {self.preview_model.total_rows():,} rows")
+    # --- Column profiles (whole sheet, background) ---
+    def current_profile_key(self):
+        return (self.selected_sheet_name, id(self.current_df))
+    def current_column_profiles(self):
+        """Profiles of the current sheet, computed here if the background run has not finished"""
+        key = self.current_profile_key()
+        if key not in self.column_profiles and self.current_df is not None:
+            running = [t for t in self.column_profile_threads if t.key == key and t.isRunning()]
+            if running and running[0].wait() and running[0].profiles is not None:
+                self.column_profiles[key] = running[0].profiles
+            else:
+                self.column_profiles[key] = DataHandler.profile_sheet(self.current_df)
+        return self.column_profiles.get(key, {})
+    def start_column_profiling(self):
+        key = self.current_profile_key()
+        if self.current_df is None or key in self.column_profiles:
+            return
+        if any(t.key == key and t.isRunning() for t in self.column_profile_threads):
+            return
+        thread = ColumnProfileWorker(self.current_profile_key(), self.current_df)
+        thread.finished.connect(self.on_column_profiles_ready)
+        self.column_profile_threads = [t for t in self.column_profile_threads if t.isRunning()]
+        self.column_profile_threads.append(thread)
+        thread.start()
+    def on_column_profiles_ready(self, key, profiles):
+        self.column_profiles.setdefault(key, profiles)
+        if key != self.current_profile_key():
+            return
+        self.apply_column_profile_tooltips(profiles)
+        # Fill mappings the name-only pass could not decide
+        sp_details = self.stored_procedures.get(self.sp_selector.currentText())
+        if not sp_details:
+            return
+        unmapped = [param for param, combo in self.param_column_combos.items() if combo.currentIndex() <= 0]
+        if not unmapped:
+            return
+        suggestions = DataHandler.suggest_column_mappings(
+            sp_details['parameters'], sp_details['parameter_specs'], self.current_df_columns, profiles)
+        taken = set(self.get_selected_mappings().values())
+        for param in unmapped:
+            column = suggestions.get(param)
+            if column is not None and column not in taken:
+                self.param_column_combos[param].setCurrentIndex(self.current_df_columns.index(column) + 1)
+                taken.add(column)
+    def apply_column_profile_tooltips(self, profiles):
+        if not profiles:
+            return
+        for combo in self.param_column_combos.values():
+            for i, column in enumerate(self.current_df_columns, 1):
+                if column in profiles:
+                    combo.setItemData(i, format_column_profile(profiles[column]), Qt.ToolTipRole)
     # Also update the reload_sheet_data method around line 970 to handle column names better:
 
     def reload_sheet_data(self):
         if not self.selected_sheet_name or self.selected_sheet_name not in self.df_all_sheets:
             self.text_output.append("No sheet selected or sheet data not available for preview.")
-            self.table_output.clear()
+            self.preview_model.set_dataframe(None)
+            self.preview_count_label.setText("")
+            self.issue_count_label.setText("")
+            self.color_delegate.set_row_classes({})
             self.stats_text.clear()
             self.current_df = None
             self.current_df_columns = []
@@ -984,53 +1418,37 @@ class MainWindow(QWidget):
             return
             
         try:
+            selection_started = time.perf_counter()
             self.current_df = self.df_all_sheets[self.selected_sheet_name]
+            # Only the selected sheet stays in memory; the others are written out in the background
+            self.controller.spill_inactive_sheets()
             # Ensure column names are strings for consistency
             self.current_df_columns = [str(col) for col in self.current_df.columns]
             self.on_sp_changed()
             
-            self.color_delegate.error_rows.clear()
-            self.color_delegate.warning_rows.clear()
-            self.color_delegate.arabic_rows.clear()
-            
-            preview_rows_count = self.preview_rows_spin.value()
-            df_preview = self.current_df.head(preview_rows_count)
-            self.table_output.setRowCount(df_preview.shape[0])
-            self.table_output.setColumnCount(df_preview.shape[1])
-            self.table_output.setHorizontalHeaderLabels([str(col) for col in df_preview.columns])
-            self.table_output.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-            
-            arabic_pattern = re.compile(r'[\u0600-\u06FF]')
-            for r_idx, row in enumerate(df_preview.itertuples(index=False)):
-                for c_idx, col_name in enumerate(df_preview.columns):
-                    try:
-                        value = row[c_idx]
-                        item = QTableWidgetItem(str(value))
-                        self.table_output.setItem(r_idx, c_idx, item)
-                        
-                        if self.validate_data_check.isChecked():
-                            if pd.isna(value) or str(value).strip().lower() in ['nan', 'none', '']:
-                                self.color_delegate.error_rows.add(r_idx)
-                            elif isinstance(value, str) and arabic_pattern.search(value):
-                                self.color_delegate.arabic_rows.add(r_idx)
-                    except Exception as e:
-                        # Handle any cell-level errors gracefully
-                        item = QTableWidgetItem("ERROR")
-                        self.table_output.setItem(r_idx, c_idx, item)
-                        self.color_delegate.error_rows.add(r_idx)
-                        logging.warning(f"Error processing cell [{r_idx}, {c_idx}]: {e}")
-            
+            self.start_column_profiling()
+
+            # The model formats cells lazily, so the whole sheet is previewed
+            self.preview_model.set_dataframe(self.current_df)
+            self.table_output.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+            self.preview_filter_input.clear()
+            self.preview_filter_column.blockSignals(True)
+            self.preview_filter_column.clear()
+            self.preview_filter_column.addItems(["All columns"] + self.current_df_columns)
+            self.preview_filter_column.blockSignals(False)
+            self.update_preview_count()
+
+            # Highlighting and issue counts come from the background whole-sheet classification
+            self.color_delegate.set_row_classes(self.row_classification_cache.get(self.current_classification_key(), {}))
+            self.schedule_row_classification()
             self.table_output.viewport().update()
             
             total_rows = len(self.current_df)
-            self.stats_text.setText(
-                f"--- Sheet Statistics: {self.selected_sheet_name} ---\n"
-                f"Total Rows: {total_rows}\n"
-                f"Total Columns: {len(self.current_df_columns)}\n"
-                f"Columns: {', '.join(self.current_df_columns)}\n"
-                f"\n(Note: Detailed processing statistics will be available after generating SQL script.)"
-            )
+            self.show_sheet_statistics()
             self.generate_button.setEnabled(True)
+            timer = StageTimer(self.load_stages)
+            timer.record('sheet_selection', time.perf_counter() - selection_started, total_rows)
+            self.load_stages = timer.as_dict()
             
         except Exception as e:
             error_msg = f"Error loading sheet '{self.selected_sheet_name}': {str(e)}"
@@ -1038,6 +1456,47 @@ class MainWindow(QWidget):
             self.text_output.append(error_msg)
             QMessageBox.warning(self, "Sheet Load Error", error_msg)
             self.generate_button.setEnabled(False)
+    def show_sheet_statistics(self):
+        store = self.df_all_sheets if isinstance(self.df_all_sheets, SheetStore) else None
+        self.stats_text.setText(
+            f"--- Sheet Statistics: {self.selected_sheet_name} ---\n"
+            f"Total Rows: {len(self.current_df)}\n"
+            f"Total Columns: {len(self.current_df_columns)}\n"
+            f"Columns: {', '.join(self.current_df_columns)}\n"
+            f"Memory: {format_bytes(self.sheet_memory.get(self.selected_sheet_name))} for this sheet, "
+            f"{format_bytes(sum(self.sheet_memory.values()))} for all sheets, "
+            f"{format_bytes(store.resident_bytes(self.sheet_memory) if store else sum(self.sheet_memory.values()))} resident, "
+            f"{format_bytes(store.spilled_bytes() if store else 0)} of inactive sheets on disk "
+            f"(peak RSS while loading {format_bytes(self.load_memory.get('peak_rss_bytes'))})\n"
+            f"\n(Note: Detailed processing statistics will be available after generating SQL script.)"
+        )
+    def update_batch_label(self):
+        count = len(self.batch_runs)
+        self.generate_batch_button.setText(f"Generate Batch ({count})" if count else "Generate Batch")
+        self.generate_batch_button.setEnabled(bool(count))
+        self.clear_batch_button.setEnabled(bool(count))
+        self.batch_label.setText("\n".join(f"{run['sp_details']['friendly_name']} → {os.path.basename(run['output_path'])}"
+                                           for run in self.batch_runs))
+    def clear_batch(self):
+        self.batch_runs = []
+        self.update_batch_label()
+    def export_run_metrics(self):
+        if not self.last_run_metrics:
+            return
+        file_path, selected_filter = QFileDialog.getSaveFileName(
+            self, "Export Metrics", "excel_to_sql_metrics.json",
+            "JSON (*.json);;Prometheus text (*.prom);;All Files (*)"
+        )
+        if not file_path:
+            return
+        if selected_filter.startswith("Prometheus") and not file_path.lower().endswith(('.prom', '.txt')):
+            file_path += ".prom"
+        stats, labels = self.last_run_metrics
+        try:
+            export_metrics(file_path, stats, labels)
+            self.text_output.append(f"Metrics exported to: {file_path}")
+        except OSError as e:
+            QMessageBox.warning(self, "Export Failed", f"Could not write metrics file:\n{e}")
     def controller_generate_sql(self):
         logging.debug("Generate SQL button clicked - testing logging")
         self.controller.generate_sql()
@@ -1048,90 +1507,185 @@ class MainWindow(QWidget):
         if len(self.recent_files) > 10:
             self.recent_files.pop(0)
         self.update_recent_menu()
+    def refresh_history_filters(self):
+        """Offer every file and template in the run history, keeping the current choices"""
+        for combo, column, all_label in ((self.history_file_filter, 'file_name', "All files"),
+                                         (self.history_template_filter, 'template', "All templates")):
+            current = combo.currentData()
+            combo.blockSignals(True)
+            combo.clear()
+            combo.addItem(all_label, None)
+            for value in self.run_history.distinct(column):
+                combo.addItem(value, value)
+            index = combo.findData(current)
+            combo.setCurrentIndex(max(index, 0))
+            combo.blockSignals(False)
+        self.update_history_list()
     def update_history_list(self):
-        self.history_list.clear()
-        for entry in reversed(self.processing_history):
-            item_text = (
-                f"[{entry['timestamp']}] {entry['status']} - "
-                f"File: {entry['file']}, Sheet: {entry['sheet']}, SP: {entry['sp_name']}, "
-                f"Processed: {entry['processed_rows']} rows"
-            )
-            self.history_list.addItem(item_text)
+        """Fill the History tab from the run history database using the current filters"""
+        days = self.history_period_filter.currentData()
+        since = (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds') if days else None
+        self.history_runs = self.run_history.query(
+            self.history_file_filter.currentData(), self.history_template_filter.currentData(),
+            self.history_status_filter.currentData(), since, limit=1000
+        )
+        self.history_table.setRowCount(len(self.history_runs))
+        for row, run in enumerate(self.history_runs):
+            for column, (_, format_value) in enumerate(HISTORY_COLUMNS):
+                item = QTableWidgetItem(format_value(run))
+                if run['status'] != 'success':
+                    item.setToolTip(run['error'] or "")
+                self.history_table.setItem(row, column, item)
+        self.history_trend_label.setText(format_throughput_trend(self.history_runs))
+    def show_history_details(self, row, column=0):
+        run = self.history_runs[row]
+        mapping = "\n".join(f"  {param} = {col}" for param, col in run['mapping'].items()) or "  -"
+        details = (
+            f"{run['started_at']}  {run['status']}\n"
+            f"File: {run['file_path'] or '-'}\nSHA-256: {run['file_hash'] or '-'}\n"
+            f"Sheet: {run['sheet']}\nTemplate: {run['template']}\nOutput: {run['output_path'] or '-'}\n"
+            f"Mapping:\n{mapping}\n"
+        )
+        if run['error']:
+            details += f"Error: {run['error']}\n"
+        if run['stages']:
+            details += f"\n{StageTimer.describe(run['stages'])}"
+        box = QMessageBox(QMessageBox.Information, "Run Details", details, QMessageBox.Ok, self)
+        box.setStyleSheet("QLabel { font-family: monospace; }")
+        box.exec_()
     # Add this method to MainWindow class around line 575
 
+    # --- Generated SQL viewer ---
+    def open_script_dialog(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Open SQL Script", os.path.dirname(self.output_path_input.text()),
+                                                   "SQL Files (*.sql);;All Files (*)")
+        if file_path:
+            self.set_script_paths([file_path])
+            self.controller.load_script_index(file_path)
+
+    def set_script_paths(self, paths):
+        """Scripts offered in the Generated SQL tab, e.g. every output of a batch"""
+        self.script_selector.clear()
+        self.script_selector.addItems(paths)
+
+    def set_script_index(self, index, seconds):
+        if self.script_index is not None:
+            self.script_index.close()
+        self.script_index = index
+        self.script_found = None
+        self.script_info_label.setText(f"{len(index):,} statements, {format_bytes(index.size)}, indexed in {seconds:.2f}s")
+        self.show_script_page(0)
+
+    def close_script_view(self):
+        """Unmap the viewed script, e.g. before it is written again"""
+        if self.script_index is not None:
+            self.script_index.close()
+            self.script_index = None
+        self.script_path = None
+        self.script_found = None
+        self.script_text.clear()
+        self.script_page_label.setText("")
+        self.update_script_controls()
+
+    def update_script_controls(self):
+        index = self.script_index
+        count = len(index) if index is not None else 0
+        self.script_prev_button.setEnabled(count > 0 and self.script_page_start > 0)
+        self.script_next_button.setEnabled(self.script_page_start + SCRIPT_PAGE_SIZE < count)
+        for widget in (self.script_position, self.script_find_input, self.script_find_prev_button,
+                       self.script_find_next_button):
+            widget.setEnabled(count > 0)
+
+    def show_script_statement(self, number):
+        """Show the page containing statement number (0-based) with it selected"""
+        self.show_script_page(number - number % SCRIPT_PAGE_SIZE, highlight=number)
+
+    def show_script_page(self, first, highlight=None):
+        index = self.script_index
+        if index is None:
+            return
+        first = max(0, min(first, len(index) - 1))
+        first -= first % SCRIPT_PAGE_SIZE
+        self.script_page_start = first
+        parts = [index.header] if first == 0 else []
+        position = len(parts[0]) if parts else 0
+        selection = None
+        for number, statement in enumerate(index.statements(first, SCRIPT_PAGE_SIZE), first):
+            text = f"-- Statement {number + 1:,}\n{statement}\nGO\n"
+            if number == highlight:
+                selection = (position, position + len(text) - len("GO\n"))
+            parts.append(text)
+            position += len(text)
+        self.script_text.setPlainText("".join(parts))
+        if selection:
+            cursor = self.script_text.textCursor()
+            cursor.setPosition(selection[0])
+            cursor.setPosition(selection[1], QTextCursor.KeepAnchor)
+            self.script_text.setTextCursor(cursor)
+            self.script_text.centerCursor()
+        last = min(first + SCRIPT_PAGE_SIZE, len(index))
+        self.script_page_label.setText(f"Statements {first + 1:,}-{last:,} of {len(index):,}" if len(index) else "No statements")
+        self.script_position.blockSignals(True)
+        self.script_position.setRange(1, max(len(index), 1))
+        self.script_position.setValue((highlight if highlight is not None else first) + 1)
+        self.script_position.blockSignals(False)
+        self.update_script_controls()
+
+    def find_in_script(self, direction):
+        """Select the next (direction 1) or previous (-1) statement with the item number, wrapping around"""
+        item = self.script_find_input.text().strip()
+        index = self.script_index
+        if index is None or not item:
+            return
+        current = self.script_found if self.script_found is not None else self.script_page_start - 1
+        if direction > 0:
+            number = index.find_item(item, current + 1)
+            if number is None:
+                number = index.find_item(item, 0)
+        else:
+            number = index.find_item(item, max(current, 0), backward=True)
+            if number is None:
+                number = index.find_item(item, len(index), backward=True)
+        if number is None:
+            self.script_page_label.setText(f"Item '{item}' not found")
+            return
+        self.script_found = number
+        self.show_script_statement(number)
+
     def validate_column_mappings(self, column_mappings):
-        """Validate that column mappings make sense based on data types"""
-        
-        if not self.current_df or self.current_df.empty:
+        """Check mapped columns against parameter types using the whole-column profiles"""
+        if self.current_df is None or self.current_df.empty:
             return True, ""
-        
+
         validation_errors = []
-        sample_size = min(100, len(self.current_df))  # Check first 100 rows for performance
-        df_sample = self.current_df.head(sample_size)
-        
+        sp_details = self.stored_procedures.get(self.sp_selector.currentText(), {})
+        parameter_specs = sp_details.get('parameter_specs', {})
+        profiles = self.current_column_profiles()
+
         for param, excel_col in column_mappings.items():
             if excel_col == "-- Select Column --":
                 continue
-                
-            try:
-                # Get the actual column data
-                if excel_col not in df_sample.columns:
-                    validation_errors.append(f"Column '{excel_col}' not found in Excel sheet")
-                    continue
-                    
-                column_data = df_sample[excel_col].dropna()  # Remove NaN for analysis
-                
-                if column_data.empty:
-                    validation_errors.append(f"Column '{excel_col}' mapped to '{param}' contains only empty values")
-                    continue
-                
-                # Validate based on parameter type
-                if param in ['qty', 'Slp_Discount', 'Spv_Discount', 'Mgr_Discount', 'New_Current_Cost', 'New_Showroom']:
-                    # Should be numeric
-                    numeric_count = 0
-                    non_numeric_examples = []
-                    
-                    for idx, value in column_data.head(20).items():  # Check first 20 non-null values
-                        try:
-                            if isinstance(value, str):
-                                # Try to clean and convert
-                                clean_value = value.replace(",", "").replace("$", "").replace("%", "").strip()
-                                float(clean_value)
-                            else:
-                                float(value)
-                            numeric_count += 1
-                        except (ValueError, TypeError):
-                            if len(non_numeric_examples) < 3:  # Collect up to 3 examples
-                                non_numeric_examples.append(str(value)[:20])  # Truncate long values
-                    
-                    # If less than 70% are numeric, warn user
-                    if numeric_count < len(column_data.head(20)) * 0.7:
-                        examples_str = ", ".join(f"'{ex}'" for ex in non_numeric_examples)
-                        validation_errors.append(
-                            f"Parameter '{param}' expects numeric values, but column '{excel_col}' contains "
-                            f"non-numeric data. Examples: {examples_str}"
-                        )
-                        
-                elif param in ['Item', 'Status']:
-                    # Should be text-like
-                    text_count = 0
-                    for value in column_data.head(10):
-                        if isinstance(value, (str, int, float)) and str(value).strip():
-                            text_count += 1
-                    
-                    if text_count == 0:
-                        validation_errors.append(
-                            f"Parameter '{param}' expects text values, but column '{excel_col}' appears to be empty or invalid"
-                        )
-                        
-            except Exception as e:
-                validation_errors.append(f"Error analyzing column '{excel_col}' for parameter '{param}': {str(e)}")
-        
+            profile = profiles.get(str(excel_col))
+            if profile is None:
+                validation_errors.append(f"Column '{excel_col}' not found in Excel sheet")
+                continue
+            if profile['non_null'] == 0:
+                validation_errors.append(f"Column '{excel_col}' mapped to '{param}' contains only empty values")
+                continue
+
+            # Decimal parameters need mostly numeric data; the generator skips the rest row by row
+            if parameter_specs.get(param, {}).get('type') == 'decimal' and profile['numeric_rate'] < 0.7:
+                examples_str = ", ".join(f"'{ex}'" for ex in profile['non_numeric_examples'])
+                validation_errors.append(
+                    f"Parameter '{param}' expects numeric values, but only {profile['numeric_rate']:.0%} of the "
+                    f"{profile['non_null']:,} values in column '{excel_col}' are numeric. Examples: {examples_str}"
+                )
+
         if validation_errors:
             error_message = "Column Mapping Issues Found:\n\n" + "\n".join(f"• {error}" for error in validation_errors)
-            error_message += "\n\nPlease review your column mappings and try again."
+            error_message += "\n\nPlease review your column mappings."
             return False, error_message
-        
+
         return True, ""
 
 class AppController:
@@ -1140,23 +1694,243 @@ class AppController:
         self.window.controller = self
         self.sql_generator_thread = None
         self.excel_loader_thread = None
+        # Speculative validation: started once the mapping is complete, reused by Generate
+        self.validation_thread = None
+        self.cancelled_validation_threads = []
+        self.validation_cache = ValidationCache()
+        self.pending_generation = None
+        self.validation_timer = QTimer()
+        self.validation_timer.setSingleShot(True)
+        self.validation_timer.setInterval(500)
+        self.validation_timer.timeout.connect(self.start_speculative_validation)
+        # Settings of the running (or last) generation, for the run history
+        self.current_generation = None
+        self.current_batch = []
+        self.item_master_thread = None
+        self.script_index_threads = []
+        self.sheet_spill_thread = None
+        self.sheet_spill_pending = False
 
     def load_excel_file_threaded(self, file_path):
+        if (self.window.df_all_sheets and self.window.loaded_file_path
+                and os.path.abspath(file_path) == os.path.abspath(self.window.loaded_file_path)):
+            # Same workbook dropped again: parse only the sheets that changed
+            self.reload_changed_file(quiet=False)
+            return
+        estimated_bytes = estimate_workbook_bytes(file_path)
+        if exceeds_memory_budget(estimated_bytes, self.window.memory_budget):
+            answer = QMessageBox.question(
+                self.window, "Large Workbook",
+                f"Loading this workbook needs about {format_bytes(estimated_bytes)}, which is over the "
+                f"{format_bytes(self.window.memory_budget)} memory budget set in Settings.\n\nLoad it anyway?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                self.window.text_output.append(f"Loading cancelled: {file_path} is over the memory budget")
+                return
         self.window.text_output.append(f"Loading Excel file: {file_path}")
-        self.excel_loader_thread = ExcelLoaderWorker(file_path)
+        profile_path = None
+        if self.take_profile_request():
+            output_path = self.window.output_path_input.text()
+            output_dir = os.path.dirname(os.path.abspath(output_path)) if output_path else os.path.dirname(file_path)
+            stem = os.path.splitext(os.path.basename(file_path))[0]
+            profile_path = profile_path_for(os.path.join(output_dir, stem), 'load_profile')
+        self.excel_loader_thread = ExcelLoaderWorker(file_path, profile_path, active_sheet=self.window.selected_sheet_name)
+        self.excel_loader_thread.profiled.connect(self.on_run_profiled)
         self.excel_loader_thread.finished.connect(self.on_excel_loaded)
         self.excel_loader_thread.error.connect(self.on_excel_load_error)
         self.excel_loader_thread.start()
 
-    def on_excel_loaded(self, sheets: Dict[str, object], sheet_names: List[str]) -> None:
+    def load_item_master(self, path):
+        self.window.text_output.append(f"Loading item master: {path}")
+        self.window.browse_item_master_button.setEnabled(False)
+        self.item_master_thread = ItemMasterLoaderWorker(path)
+        self.item_master_thread.finished.connect(self.on_item_master_loaded)
+        self.item_master_thread.error.connect(self.on_item_master_error)
+        self.item_master_thread.start()
+
+    def on_item_master_loaded(self, index, seconds):
+        self.window.browse_item_master_button.setEnabled(True)
+        # Ignore a load that finished after the item master was changed or cleared
+        if index.source_path != self.window.item_master_path:
+            return
+        self.window.item_index = index
+        self.window.text_output.append(f"Item master ready: {len(index):,} items in {seconds:.2f}s")
+
+    def on_item_master_error(self, message):
+        self.window.browse_item_master_button.setEnabled(True)
+        self.window.text_output.append(f"Could not load item master: {message}")
+        QMessageBox.warning(self.window, "Item Master", f"Could not load the item master:\n{message}\n\n"
+                                                         f"Items will not be checked until another one is selected.")
+
+    def load_script_index(self, path):
+        """Index a script for the Generated SQL tab in the background"""
+        if not path or not os.path.exists(path):
+            return
+        self.window.close_script_view()
+        self.window.script_path = path
+        name = os.path.basename(path)
+        self.window.script_info_label.setText(f"Indexing {name}...")
+
+        def show_progress(percent):
+            if self.window.script_path == path:
+                self.window.script_info_label.setText(f"Indexing {name}... {percent}%")
+
+        worker = ScriptIndexWorker(path)
+        worker.progress.connect(show_progress)
+        worker.finished.connect(self.on_script_indexed)
+        worker.error.connect(self.on_script_index_error)
+        worker.finished.connect(lambda *_: self.script_index_threads.remove(worker))
+        worker.error.connect(lambda _: self.script_index_threads.remove(worker))
+        self.script_index_threads.append(worker)
+        worker.start()
+
+    def on_script_indexed(self, index, seconds):
+        if index.path != self.window.script_path:
+            # Another script was asked for, or generation started, while this one was indexed
+            index.close()
+            return
+        logging.info(f"Indexed {len(index):,} statements of {index.path} in {seconds:.2f}s")
+        self.window.set_script_index(index, seconds)
+
+    def on_script_index_error(self, message):
+        self.window.script_info_label.setText(f"Could not open the script: {message}")
+
+    def spill_inactive_sheets(self):
+        """Write every sheet but the selected one to disk in the background, one spill at a time"""
+        store = self.window.df_all_sheets
+        if not isinstance(store, SheetStore):
+            return
+        if self.sheet_spill_thread and self.sheet_spill_thread.isRunning():
+            # Spill again for the newest selection once this one is done
+            self.sheet_spill_pending = True
+            return
+        self.sheet_spill_pending = False
+        self.sheet_spill_thread = SheetSpillWorker(store, self.window.selected_sheet_name, dict(self.window.sheet_memory))
+        self.sheet_spill_thread.finished.connect(self.on_sheets_spilled)
+        self.sheet_spill_thread.error.connect(self.on_sheet_spill_error)
+        self.sheet_spill_thread.start()
+
+    def on_sheets_spilled(self, store, written, seconds):
+        if written:
+            logging.info(f"Spilled {format_bytes(written)} of inactive sheets to disk in {seconds:.2f}s")
+        if self.sheet_spill_pending:
+            self.spill_inactive_sheets()
+        elif store is self.window.df_all_sheets and self.window.current_df is not None:
+            self.window.show_sheet_statistics()
+
+    def on_sheet_spill_error(self, message):
+        # The sheets simply stay in memory
+        self.window.text_output.append(f"Could not move inactive sheets to disk: {message}")
+        if self.sheet_spill_pending:
+            self.spill_inactive_sheets()
+
+    def reload_changed_file(self, quiet=True):
+        """Re-parse the sheets of the loaded workbook that changed on disk, keeping the current view"""
+        file_path = self.window.loaded_file_path
+        if not file_path or not os.path.exists(file_path):
+            return
+        if self.excel_loader_thread and self.excel_loader_thread.isRunning():
+            self.window.file_change_timer.start()
+            return
+        # A save that replaced the file drops it from the watcher
+        self.window.watch_loaded_file()
+        self.window.text_output.append(f"Checking {os.path.basename(file_path)} for changed sheets...")
+        self.excel_loader_thread = ExcelLoaderWorker(
+            file_path, reload_from=(self.window.df_all_sheets, self.window.workbook_fingerprint),
+            active_sheet=self.window.selected_sheet_name)
+        self.excel_loader_thread.finished.connect(self.on_excel_loaded)
+        if quiet:
+            # The file may still be being written; the next change event retries
+            self.excel_loader_thread.error.connect(
+                lambda message: self.window.text_output.append(f"Could not reload {os.path.basename(file_path)}: {message}"))
+        else:
+            self.excel_loader_thread.error.connect(self.on_excel_load_error)
+        self.excel_loader_thread.start()
+
+    def apply_partial_reload(self, sheets, load_info):
+        """Swap in the re-parsed sheets; the selected sheet keeps its mapping and preview state"""
+        window = self.window
+        reloaded = load_info['reloaded_sheets']
+        window.workbook_fingerprint = load_info.get('fingerprint')
+        window.loaded_file_hash = load_info.get('file_hash')
+        file_name = os.path.basename(window.loaded_file_path)
+        removed = set(window.df_all_sheets) - set(sheets)
+        if not reloaded and not removed:
+            window.text_output.append(f"No sheet changes found in {file_name}")
+            return
+        seconds = load_info.get('stages', {}).get('file_parse', {}).get('seconds', 0.0)
+        window.text_output.append(f"Reloaded {len(reloaded)} changed sheet(s) of {file_name} in {seconds:.2f}s: "
+                                  f"{', '.join(reloaded) or 'none'}" + (f"; removed {', '.join(removed)}" if removed else ""))
+        state = window.capture_sheet_state()
+        window.df_all_sheets = sheets
+        window.load_stages = dict(load_info.get('stages', {}))
+        window.sheet_memory = {name: window.sheet_memory.get(name) for name in sheets}
+        window.sheet_memory.update(load_info.get('sheet_memory', {}))
+        # Cached results computed from the replaced DataFrames
+        stale = set(reloaded) | removed
+        for cache in (window.row_classification_cache, window.column_profiles):
+            for key in [key for key in cache if key[0] in stale]:
+                del cache[key]
+        self.validation_cache.discard_sheets(stale)
+
+        names = list(sheets)
+        if [window.sheet_selector.itemText(i) for i in range(window.sheet_selector.count())] != names:
+            window.sheet_selector.blockSignals(True)
+            window.sheet_selector.clear()
+            window.sheet_selector.addItems(names)
+            window.sheet_selector.setCurrentText(window.selected_sheet_name)
+            window.sheet_selector.blockSignals(False)
+        if window.selected_sheet_name not in sheets:
+            window.clear_batch()
+            window.selected_sheet_name = window.sheet_selector.currentText()
+            window.reload_sheet_data()
+        elif window.selected_sheet_name in reloaded:
+            for run in window.batch_runs:
+                run['df'] = sheets[window.selected_sheet_name]
+            window.reload_sheet_data()
+            window.restore_sheet_state(state)
+
+    def take_profile_request(self):
+        """Whether the run about to start should be profiled; the Settings toggle covers one run"""
+        if profiling_requested():
+            return True
+        if not self.window.profile_next_run:
+            return False
+        self.window.profile_next_run = False
+        QSettings('ExcelToSQL', 'Settings').setValue('profile_next_run', False)
+        return True
+
+    def on_run_profiled(self, profile_path, summary):
+        if profile_path:
+            self.window.text_output.append(f"Profile saved to: {profile_path}")
+        self.window.text_output.append(summary)
+
+    def on_excel_loaded(self, sheets: Dict[str, object], sheet_names: List[str], load_info: Dict[str, object] = None) -> None:
         """
         Handles UI updates after Excel sheets are successfully loaded.
 
         Args:
             sheets: A dictionary mapping sheet names to their DataFrames.
             sheet_names: A list of non-empty sheet names.
+            load_info: Load timings ('stages'), per-sheet memory ('sheet_memory') and RSS readings.
         """
+        load_info = load_info or {}
+        if load_info.get('reloaded_sheets') is not None:
+            self.apply_partial_reload(sheets, load_info)
+            return
+        self.window.clear_batch()
         self.window.df_all_sheets = sheets
+        self.window.load_stages = dict(load_info.get('stages', {}))
+        self.window.sheet_memory = load_info.get('sheet_memory') or {
+            name: dataframe_memory_bytes(df) for name, df in sheets.items()}
+        self.window.load_memory = {key: load_info.get(key) for key in ('rss_start_bytes', 'peak_rss_bytes')}
+        self.window.loaded_file_path = load_info.get('file_path') or self.window.file_path
+        self.window.loaded_file_hash = load_info.get('file_hash')
+        self.window.workbook_fingerprint = load_info.get('fingerprint')
+        self.window.watch_loaded_file()
+        self.window.row_classification_cache.clear()
+        self.window.column_profiles.clear()
+        self.validation_cache.clear()
         self.window.add_to_recent_files(self.window.file_path)
 
         # Handle case: no non-empty sheets found
@@ -1227,44 +2001,31 @@ class AppController:
         if dev_mode:
             print(f"[DEBUG] Excel load error: {message}")
     
-    def generate_sql(self):
+    def is_generating(self):
         if self.sql_generator_thread and self.sql_generator_thread.isRunning():
             QMessageBox.warning(self.window, "Processing in Progress", "A script generation is already in progress. Please wait.")
-            return
+            return True
+        return False
+
+    def prepare_generation(self):
+        """Check the current template, mapping and output; returns the generation settings or None"""
         if self.window.current_df is None or self.window.current_df.empty:
             QMessageBox.warning(self.window, "No Data", "Please load an Excel file and select a sheet with data first.")
-            return
+            return None
         output_path = self.window.output_path_input.text()
         if not output_path:
             QMessageBox.warning(self.window, "Output File Missing", "Please specify an output SQL file path.")
-            return
+            return None
         selected_sp_friendly_name = self.window.sp_selector.currentText()
         sp_details = self.window.stored_procedures.get(selected_sp_friendly_name)
         if not sp_details:
             QMessageBox.critical(self.window, "Invalid Stored Procedure", "Selected Stored Procedure definition not found.")
-            return
+            return None
 
-        # --- Special handling for Update Items Status ---
-        if selected_sp_friendly_name == "Update Items Status":
-            inactive_selected = self.window.inactive_combo.currentText() if self.window.inactive_combo else "-- Select Value --"
-            itemtype_selected = self.window.itemtype_combo.currentText() if self.window.itemtype_combo else "-- Select Value --"
-            sp_details = sp_details.copy()  # Don't modify original
-
-            # Only add fields if user selected a value
-            sql_parts = ["UPDATE IV00101 SET USCATVLS_6 = '{Status}'"]
-            if inactive_selected != "-- Select Value --":
-                inactive_value = inactive_selected.split(":")[0].strip()
-                sql_parts.append(f"INACTIVE = {inactive_value}")
-            if itemtype_selected != "-- Select Value --":
-                itemtype_value = itemtype_selected.split(":")[0].strip()
-                sql_parts.append(f"ITEMTYPE = {itemtype_value}")
-            sql_parts.append("WHERE ITEMNMBR = '{item}'")
-
-            # If only default, keep original template, else build dynamic
-            if len(sql_parts) > 2:
-                sp_details['sql_template'] = ", ".join(sql_parts[:-1]) + " " + sql_parts[-1]
-            else:
-                sp_details['sql_template'] = "UPDATE IV00101 SET USCATVLS_6 = '{Status}' WHERE ITEMNMBR = '{item}'"
+        # Bake the template's run-level options (e.g. INACTIVE/ITEMTYPE) into the SQL template
+        flag_values = {name: combo.currentData() for name, combo in self.window.flag_combos.items()
+                       if combo.currentData() is not None}
+        sp_details = TemplateRegistry.resolve_flags(sp_details, flag_values)
 
         column_mappings = {}
         all_mappings_selected = True
@@ -1276,41 +2037,310 @@ class AppController:
                 break
             column_mappings[param] = selected_excel_col
         if not all_mappings_selected:
-            return
+            return None
         required_params = set(sp_details['parameters'])
         mapped_params = set(column_mappings.keys())
         if not required_params.issubset(mapped_params):
             missing_params = required_params - mapped_params
             QMessageBox.critical(self.window, "Missing Mappings",
                                  f"Not all required parameters for '{selected_sp_friendly_name}' are mapped. Missing: {', '.join(missing_params)}")
+            return None
+        if self.window.item_master_path and self.window.item_index is None:
+            if self.item_master_thread and self.item_master_thread.isRunning():
+                QMessageBox.information(self.window, "Item Master Loading",
+                                        "The item master is still loading. Please try again in a moment.")
+                return None
+            answer = QMessageBox.question(self.window, "Item Master Unavailable",
+                                          "The item master could not be loaded, so items will not be checked.\n\n"
+                                          "Generate the script anyway?", QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return None
+        mappings_ok, mapping_message = self.window.validate_column_mappings(column_mappings)
+        if not mappings_ok:
+            answer = QMessageBox.question(self.window, "Column Mapping Issues",
+                                          mapping_message + "\n\nGenerate the script anyway?",
+                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if answer != QMessageBox.Yes:
+                return None
+        return {
+            'df': self.window.current_df,
+            'sheet_name': self.window.selected_sheet_name,
+            'sp_details': sp_details,
+            'column_mappings': column_mappings,
+            'output_path': output_path,
+        }
+
+    def generate_sql(self):
+        if self.is_generating():
+            return
+        generation = self.prepare_generation()
+        if generation is None:
             return
+        selected_sp_friendly_name = generation['sp_details']['friendly_name']
+        column_mappings = generation['column_mappings']
+        generation.update({
+            'skip_arabic': self.window.skip_arabic_check.isChecked(),
+            'validate_quality': self.window.validate_data_check.isChecked(),
+            'dedup_policy': self.window.dedup_combo.currentData(),
+            'stages': self.window.load_stages,
+            'memory_budget': self.window.memory_budget,
+            'item_index': self.window.item_index,
+        })
+        generation['checkpoint'] = self.prepare_checkpoint(generation)
+        generation['profile_path'] = profile_path_for(generation['output_path']) if self.take_profile_request() else None
         self.window.text_output.append(f"Starting SQL generation for '{selected_sp_friendly_name}'...")
         self.window.progress_bar.setValue(0)
         self.window.progress_bar.show()
         self.window.status_label.setText("Initializing processing...")
         self.window.status_label.show()
         self.window.generate_button.setEnabled(False)
-        self.sql_generator_thread = SQLGeneratorWorker(
-            df=self.window.current_df,
-            sheet_name=self.window.selected_sheet_name,
-            sp_details=sp_details,
-            column_mappings=column_mappings,
-            output_path=output_path,
-            skip_arabic=self.window.skip_arabic_check.isChecked(),
-            validate_quality=self.window.validate_data_check.isChecked()
+
+        # Reuse a cached validation when it matches, or wait for the background job if it is still running
+        key = self.validation_key(selected_sp_friendly_name, column_mappings)
+        generation['validation_key'] = key
+        cached = self.validation_cache.get(key)
+        if cached is not None:
+            self.start_generation(generation, cached)
+            return
+        if self.validation_thread and self.validation_thread.isRunning() and self.validation_thread.key == key:
+            self.pending_generation = generation
+            self.window.status_label.setText("Waiting for background validation to finish...")
+            return
+        self.cancel_speculative_validation()
+        self.start_generation(generation)
+
+    def prepare_checkpoint(self, generation):
+        """RunCheckpoint for a large sheet of a hashed file; offers to resume a saved one"""
+        if len(generation['df']) < CHECKPOINT_MIN_ROWS or not self.window.loaded_file_hash:
+            return None
+        checkpoint = RunCheckpoint.for_run(
+            generation['output_path'], self.window.loaded_file_hash, generation['df'], generation['sheet_name'],
+            generation['sp_details'], generation['column_mappings'], generation['skip_arabic'],
+            generation['validate_quality'], generation['dedup_policy'], item_index=generation['item_index'])
+        saved = checkpoint.peek()
+        if saved:
+            answer = QMessageBox.question(
+                self.window, "Resume Interrupted Run",
+                f"An earlier run of this file, sheet and mapping was interrupted ({RunCheckpoint.describe(saved)}, "
+                f"saved {saved['saved_at'].replace('T', ' ')}).\n\nResume it? Choose No to start over.",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+            if answer != QMessageBox.Yes:
+                checkpoint.clear()
+            else:
+                self.window.text_output.append(f"Resuming the interrupted run ({RunCheckpoint.describe(saved)})")
+        return checkpoint
+
+    def add_to_batch(self):
+        generation = self.prepare_generation()
+        if generation is None:
+            return
+        friendly_name = generation['sp_details']['friendly_name']
+        generation['output_path'], generation['skipped_log_path'] = template_output_paths(
+            generation['output_path'], friendly_name)
+        # Adding a template again replaces its earlier mapping
+        self.window.batch_runs = [run for run in self.window.batch_runs
+                                  if run['sp_details']['friendly_name'] != friendly_name] + [generation]
+        self.window.update_batch_label()
+        self.window.text_output.append(f"Added '{friendly_name}' to the batch ({generation['output_path']})")
+
+    def generate_batch(self):
+        if self.is_generating() or not self.window.batch_runs:
+            return
+        self.cancel_speculative_validation()
+        runs = []
+        for generation in self.window.batch_runs:
+            key = self.validation_key(generation['sp_details']['friendly_name'], generation['column_mappings'])
+            runs.append({**generation, 'validation_key': key, 'validation_result': self.validation_cache.get(key)})
+        names = ", ".join(run['sp_details']['friendly_name'] for run in runs)
+        self.window.text_output.append(f"Starting batch SQL generation for {names}...")
+        self.window.progress_bar.setValue(0)
+        self.window.progress_bar.show()
+        self.window.status_label.setText("Initializing processing...")
+        self.window.status_label.show()
+        self.window.generate_button.setEnabled(False)
+        self.window.generate_batch_button.setEnabled(False)
+        self.current_batch = runs
+        self.window.close_script_view()
+        self.sql_generator_thread = BatchSQLGeneratorWorker(
+            self.window.current_df, self.window.selected_sheet_name, runs,
+            self.window.skip_arabic_check.isChecked(), self.window.validate_data_check.isChecked(),
+            self.window.dedup_combo.currentData(), stages=self.window.load_stages,
+            memory_budget=self.window.memory_budget, item_index=self.window.item_index
         )
         self.sql_generator_thread.progress.connect(self.window.progress_bar.setValue)
         self.sql_generator_thread.status_update.connect(self.window.status_label.setText)
+        self.sql_generator_thread.finished.connect(self.on_batch_finished)
+        self.sql_generator_thread.error.connect(self.on_batch_error)
+        self.sql_generator_thread.validated.connect(self.validation_cache.put)
+        self.sql_generator_thread.start()
+
+    def on_batch_finished(self, results):
+        self.window.progress_bar.hide()
+        self.window.status_label.hide()
+        self.window.generate_button.setEnabled(True)
+        self.window.update_batch_label()
+        lines = ["--- Batch Statistics ---",
+                 f"Source Sheet: {self.window.selected_sheet_name}"]
+        validation = results[0][1]['stages'].get('validation', {}) if results else {}
+        if validation.get('shared_by'):
+            lines.append(f"Validation: one pass for {validation['shared_by']} templates in {validation['seconds']:.2f} seconds")
+        for run, (output_path, stats) in zip(self.current_batch, results):
+            friendly_name = run['sp_details']['friendly_name']
+            skipped = stats['total_rows'] - stats['processed_rows']
+            lines.append(f"{friendly_name}: {stats['processed_rows']:,} statements, {skipped:,} rows skipped, "
+                         f"{stats.get('bytes_written', 0):,} bytes -> {output_path}")
+            self.window.text_output.append(f"SQL script generated successfully to: {output_path}")
+            self.current_generation = run
+            self.record_run('success', stats, output_path)
+        if results:
+            lines.append(f"Peak RSS: {format_bytes(results[0][1].get('peak_rss_bytes'))}")
+        stats_text = "\n".join(lines)
+        self.window.stats_text.setText(stats_text)
+        self.window.text_output.append("\n" + stats_text)
+        if results:
+            self.window.set_script_paths([output_path for output_path, _ in results])
+            self.load_script_index(results[0][0])
+        QMessageBox.information(self.window, "Success", f"Generated {len(results)} SQL scripts:\n" +
+                                "\n".join(output_path for output_path, _ in results))
+        self.sql_generator_thread = None
+
+    def on_batch_error(self, message):
+        self.window.progress_bar.hide()
+        self.window.status_label.hide()
+        self.window.generate_button.setEnabled(True)
+        self.window.update_batch_label()
+        self.window.text_output.append(f"Error during batch processing: {message}")
+        QMessageBox.critical(self.window, "Error", f"An error occurred during batch SQL generation:\n{message}")
+        for run in self.current_batch:
+            self.current_generation = run
+            self.record_run('failed', error=message)
+        self.sql_generator_thread = None
+
+    def start_generation(self, generation, validation_result=None):
+        self.current_generation = generation
+        # The viewer's mapping would keep the old script from being replaced on Windows
+        self.window.close_script_view()
+        self.sql_generator_thread = SQLGeneratorWorker(validation_result=validation_result, **generation)
+        self.sql_generator_thread.progress.connect(self.window.progress_bar.setValue)
+        self.sql_generator_thread.status_update.connect(self.window.status_label.setText)
         self.sql_generator_thread.finished.connect(self.on_processing_finished)
         self.sql_generator_thread.error.connect(self.on_processing_error)
+        self.sql_generator_thread.validated.connect(self.validation_cache.put)
+        self.sql_generator_thread.profiled.connect(self.on_run_profiled)
         self.sql_generator_thread.start()
         
+    # --- Speculative validation ---
+    def validation_key(self, sp_friendly_name, column_mappings):
+        sp_details = self.window.stored_procedures.get(sp_friendly_name, {})
+        return ValidationCache.make_key(
+            self.window.selected_sheet_name, self.window.current_df, column_mappings,
+            sp_details.get('parameter_specs', {}),
+            self.window.skip_arabic_check.isChecked(), self.window.validate_data_check.isChecked()
+        )
+
+    def current_validation_request(self):
+        """(key, column_mappings, parameter_specs) for the current inputs, or None if the mapping is incomplete"""
+        if self.window.current_df is None or self.window.current_df.empty:
+            return None
+        sp_friendly_name = self.window.sp_selector.currentText()
+        sp_details = self.window.stored_procedures.get(sp_friendly_name)
+        if not sp_details:
+            return None
+        column_mappings = self.window.get_selected_mappings()
+        if set(column_mappings) != set(sp_details['parameters']):
+            return None
+        return self.validation_key(sp_friendly_name, column_mappings), column_mappings, sp_details['parameter_specs']
+
+    def schedule_speculative_validation(self):
+        request = self.current_validation_request()
+        if request is None or self.validation_cache.get(request[0]) is None:
+            self.window.validation_state_label.setText("")
+        self.validation_timer.start()
+
+    def start_speculative_validation(self):
+        request = self.current_validation_request()
+        if request is None:
+            self.cancel_speculative_validation()
+            self.window.validation_state_label.setText("")
+            return
+        key, column_mappings, parameter_specs = request
+        cached = self.validation_cache.get(key)
+        if cached is not None:
+            self.window.validation_state_label.setText(self.describe_validation_result(cached))
+            return
+        if self.validation_thread and self.validation_thread.isRunning() and self.validation_thread.key == key:
+            return
+        self.cancel_speculative_validation()
+        self.validation_thread = ValidationWorker(
+            key, self.window.current_df, column_mappings, parameter_specs,
+            self.window.skip_arabic_check.isChecked(), self.window.validate_data_check.isChecked()
+        )
+        # Signals already queued by a cancelled job are ignored by key
+        self.validation_thread.progress.connect(lambda value, k=key: self.on_speculative_validation_progress(k, value))
+        self.validation_thread.status_update.connect(lambda message, k=key: self.on_speculative_validation_status(k, message))
+        self.validation_thread.finished.connect(self.on_speculative_validation_ready)
+        self.validation_thread.error.connect(self.on_speculative_validation_error)
+        self.window.validation_state_label.setText("Validating in background...")
+        self.validation_thread.start()
+
+    def cancel_speculative_validation(self):
+        thread = self.validation_thread
+        if thread and thread.isRunning():
+            thread.requestInterruption()
+            # Keep a reference until the thread notices the request and exits
+            self.cancelled_validation_threads = [t for t in self.cancelled_validation_threads if t.isRunning()]
+            self.cancelled_validation_threads.append(thread)
+        self.validation_thread = None
+        if self.pending_generation:
+            # Generate was waiting for this job: validate as part of the generation instead
+            generation, self.pending_generation = self.pending_generation, None
+            self.start_generation(generation)
+
+    def describe_validation_result(self, result):
+        return f"Validation ready: {len(result['row_numbers']):,} valid rows"
+
+    def is_current_validation(self, key):
+        return self.validation_thread is not None and self.validation_thread.key == key
+
+    def on_speculative_validation_progress(self, key, value):
+        if not self.is_current_validation(key):
+            return
+        self.window.validation_state_label.setText(f"Validating in background... {value}%")
+        if self.pending_generation:
+            self.window.progress_bar.setValue(value)
+
+    def on_speculative_validation_status(self, key, message):
+        if self.is_current_validation(key) and self.pending_generation:
+            self.window.status_label.setText(message)
+
+    def on_speculative_validation_ready(self, key, result):
+        if not self.is_current_validation(key):
+            return
+        self.validation_cache.put(key, result)
+        self.window.validation_state_label.setText(self.describe_validation_result(result))
+        if self.pending_generation:
+            generation, self.pending_generation = self.pending_generation, None
+            self.start_generation(generation, result)
+
+    def on_speculative_validation_error(self, key, message):
+        if not self.is_current_validation(key):
+            return
+        self.window.validation_state_label.setText("Background validation failed")
+        if self.pending_generation:
+            self.current_generation, self.pending_generation = self.pending_generation, None
+            self.on_processing_error(message)
+
     def on_processing_finished(self, output_path, sql_lines, stats):
         self.window.progress_bar.hide()
         self.window.status_label.hide()
         self.window.generate_button.setEnabled(True)
         self.window.text_output.append(f"SQL script generated successfully to: {output_path}")
-        self.window.text_output.append(f"Total SQL statements generated: {len(sql_lines)}")
+        self.window.text_output.append(f"Total SQL statements generated: {stats['processed_rows']}")
+        stats['sheet_memory_bytes'] = self.window.sheet_memory.get(self.window.selected_sheet_name)
+        budget = stats.get('memory_budget_bytes')
+        memory_note = ""
+        if stats.get('streamed_output'):
+            memory_note = "Script streamed to disk to stay within the memory budget\n"
         stats_text = (
             f"--- Processing Statistics ---\n"
             f"Source Sheet: {self.window.selected_sheet_name}\n"
@@ -1321,45 +2351,80 @@ class AppController:
             f"  - Empty/NaN: {stats['skipped_empty']}\n"
             f"  - Invalid Quantity/Value: {stats['skipped_invalid_value']}\n"
             f"Skipped Rows (Arabic Text): {stats['skipped_arabic']}\n"
+            f"Skipped Rows (Duplicate Items): {stats.get('skipped_duplicate', 0)}\n"
+            f"Skipped Rows (Not in Item Master): {stats.get('skipped_unknown_item', 0)}\n"
             f"Processing Time: {stats['processing_time']:.2f} seconds\n"
+            f"Throughput: {stats.get('rows_per_second', 0):,.0f} rows/s "
+            f"(validation {stats.get('validation_rows_per_second', 0):,.0f} rows/s)\n"
+            f"Bytes Written: {stats.get('bytes_written', 0):,}\n"
+            f"Memory: sheet {format_bytes(stats.get('sheet_memory_bytes'))}, "
+            f"peak RSS {format_bytes(stats.get('peak_rss_bytes'))} "
+            f"(budget {format_bytes(budget) if budget else 'none'})\n"
+            f"{memory_note}"
+            f"\n--- Stage Timings ---\n"
+            f"{StageTimer.describe(stats.get('stages', {}))}\n"
             )
         self.window.stats_text.setText(stats_text)
         self.window.text_output.append("\n" + stats_text)
+        self.window.last_run_metrics = (stats, {'sheet': self.window.selected_sheet_name,
+                                                'template': self.window.sp_selector.currentText()})
+        self.window.export_metrics_button.setEnabled(True)
+        self.window.set_script_paths([output_path])
+        self.load_script_index(output_path)
         QMessageBox.information(self.window, "Success", f"SQL script generated successfully to:\n{output_path}")
-        history_entry = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'file': os.path.basename(self.window.file_path),
-            'sheet': self.window.selected_sheet_name,
-            'sp_name': self.window.sp_selector.currentText(),
-            'processed_rows': stats['processed_rows'],
-            'output_path': output_path,                'status': 'Success'
-            }
-        self.window.processing_history.append(history_entry)
-        self.window.update_history_list()
+        self.record_run('success', stats, output_path)
         self.sql_generator_thread = None
+    def record_run(self, status, stats=None, output_path=None, error=None):
+        """Save the finished generation to the run history and refresh the History tab"""
+        generation = self.current_generation or {}
+        sp_details = generation.get('sp_details', {})
+        try:
+            self.window.run_history.record(
+                self.window.loaded_file_path, generation.get('sheet_name', self.window.selected_sheet_name),
+                sp_details.get('friendly_name', self.window.sp_selector.currentText()), status, stats,
+                generation.get('column_mappings'), sp_details.get('flag_values'), self.window.loaded_file_hash,
+                output_path, error
+            )
+        except Exception as e:
+            logging.error(f"Could not save the run to the history database: {e}")
+        self.window.refresh_history_filters()
     def on_processing_error(self, message):
         self.window.progress_bar.hide()
         self.window.status_label.hide()
         self.window.generate_button.setEnabled(True)
         self.window.text_output.append(f"Error during processing: {message}")
+        checkpoint = (self.current_generation or {}).get('checkpoint')
+        if checkpoint and checkpoint.peek():
+            self.window.text_output.append("Progress was checkpointed; generating again with the same settings resumes it.")
         QMessageBox.critical(self.window, "Error", f"An error occurred during SQL generation:\n{message}")
-        history_entry = {
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'file': os.path.basename(self.window.file_path) if self.window.file_path else 'N/A',
-            'sheet': self.window.selected_sheet_name if self.window.selected_sheet_name else 'N/A',
-            'sp_name': self.window.sp_selector.currentText() if self.window.sp_selector.currentText() else 'N/A',
-            'processed_rows': 0,
-            'output_path': 'N/A',
-            'status': f'Failed: {message}'
-            }
-        self.window.processing_history.append(history_entry)
-        self.window.update_history_list()
+        self.record_run('failed', error=message)
         self.sql_generator_thread = None
 
 # --- Main Entry Point ---
+def on_first_paint(main_window):
+    """Runs from the event loop once the window has been shown; starts warming heavy modules"""
+    StartupTimer.mark("First paint")
+    if main_window.item_master_path:
+        main_window.controller.load_item_master(main_window.item_master_path)
+    warmup = ModuleWarmupWorker(main_window)
+    main_window.module_warmup_thread = warmup
+    def on_warm(seconds):
+        StartupTimer.mark("pandas/openpyxl ready")
+        logging.info(StartupTimer.report())
+        if '--startup-report' in sys.argv:
+            print(StartupTimer.report())
+            warmup.wait()
+            QApplication.quit()
+    warmup.finished.connect(on_warm)
+    warmup.start(QThread.LowPriority)
+
+
 if __name__ == '__main__':
     app = QApplication(sys.argv)
+    StartupTimer.mark("QApplication created")
     main_window = MainWindow()
     controller = AppController(main_window)
+    StartupTimer.mark("Main window built")
     main_window.show()
+    QTimer.singleShot(0, lambda: on_first_paint(main_window))
     sys.exit(app.exec_())
@@ -5,8 +5,8 @@ a = Analysis(
     ['C:\\Users\\alyousefh\\Desktop\\365DataSience\\Python\\VSC\\Excel to SQL\\VSC Excel to SQL Script Converter with GUI and Data Validation.py'],
     pathex=[],
     binaries=[],
-    datas=[('Default_Excel_template_File.xlsx', '.')],
-    hiddenimports=['pandas', 'PyQt5'],
+    datas=[('Default_Excel_template_File.xlsx', '.'), ('sql_templates.json', '.')],
+    hiddenimports=['numpy', 'pandas', 'openpyxl', 'PyQt5'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
@@ -0,0 +1,302 @@
+"""Benchmark the conversion stages on synthetic workbooks.
+
+    python excel_to_sql_bench.py --sizes 10k,100k --output bench_results.json
+    python excel_to_sql_bench.py --sizes 10k,100k --output new.json --compare bench_results.json
+
+Workbooks are generated once per size and settings into --data-dir and reused by later
+runs. Every sheet has the columns the bundled templates need (ITEM, QTY, New_Current_Cost,
+New_Showroom, Slp/Spv/Mgr_Discount, Status) plus filler columns up to --columns. A share of
+the rows is made dirty (empty, non-numeric or negative values), carries Arabic text or
+repeats an earlier item, as set by --dirty-ratio, --arabic-ratio and --duplicate-ratio.
+
+For each workbook the load is timed once; then every template is run through validation,
+de-duplication, rendering and writing (SQL script and skipped rows report), each timed
+separately and the best of --repeat runs kept. Results are written as JSON. With --compare,
+stages more than --tolerance slower than in an earlier results file are reported and the
+exit code is 1.
+"""
+import sys, os, json, time, argparse, platform, tempfile, subprocess
+from datetime import datetime
+from excel_to_sql_core import (
+    np, pd, LOG_LEVELS, configure_logging, SkippedRowLogger, TemplateRegistry, DataHandler, write_sql_script
+)
+
+STAGES = ('validate', 'dedup', 'render', 'write')
+TEMPLATE_COLUMNS = ['ITEM', 'QTY', 'New_Current_Cost', 'New_Showroom', 'Slp_Discount', 'Spv_Discount',
+                    'Mgr_Discount', 'Status']
+DECIMAL_COLUMNS = TEMPLATE_COLUMNS[1:7]
+STATUSES = ['DROPSHIP', 'ACTIVE', 'DISCONTINUED', 'CLEARANCE']
+DIRTY_VALUES = [None, 'N/A', '-5', '12,5x', ' ']
+ARABIC_TEXT = 'صنف تجريبي'
+# Regressions smaller than this are timer noise
+MIN_REGRESSION_SECONDS = 0.05
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    text = text.strip().lower()
+    multiplier = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    try:
+        return int(float(text.rstrip('km')) * multiplier)
+    except ValueError:
+        raise ValueError(f"Invalid size '{text}'")
+
+
+def make_sheet(rows, columns=10, dirty_ratio=0.02, arabic_ratio=0.01, duplicate_ratio=0.05, seed=0):
+    """Synthetic item sheet as a DataFrame (object columns, like a sheet read from Excel)"""
+    rng = np.random.default_rng(seed)
+    items = np.array([f"IT{n:08d}" for n in range(rows)], dtype=object)
+    # Duplicates repeat an item from anywhere in the sheet
+    duplicates = np.flatnonzero(rng.random(rows) < duplicate_ratio)
+    items[duplicates] = items[rng.integers(0, rows, len(duplicates))]
+
+    data = {'ITEM': items}
+    for name in DECIMAL_COLUMNS:
+        scale = 100.0 if name.endswith('Discount') else 1000.0
+        data[name] = np.round(rng.random(rows) * scale, 3).astype(object)
+    data['Status'] = np.array(STATUSES, dtype=object)[rng.integers(0, len(STATUSES), rows)]
+    for number in range(max(columns - len(TEMPLATE_COLUMNS), 0)):
+        data[f"Extra_{number + 1}"] = rng.integers(0, 100000, rows).astype(object)
+
+    # Dirty rows get one bad value in a random template column
+    dirty = np.flatnonzero(rng.random(rows) < dirty_ratio)
+    targets = rng.integers(0, len(TEMPLATE_COLUMNS), len(dirty))
+    values = rng.integers(0, len(DIRTY_VALUES), len(dirty))
+    for row, target, value in zip(dirty, targets, values):
+        data[TEMPLATE_COLUMNS[target]][row] = DIRTY_VALUES[value]
+
+    arabic = np.flatnonzero(rng.random(rows) < arabic_ratio)
+    for row, in_item in zip(arabic, rng.random(len(arabic)) < 0.5):
+        if in_item:
+            data['ITEM'][row] = f"{ARABIC_TEXT} {data['ITEM'][row]}"
+        else:
+            data['Status'][row] = ARABIC_TEXT
+    return pd.DataFrame(data)
+
+
+def write_workbook(df, path):
+    """Write a sheet with openpyxl's write-only mode, which streams rows instead of building cells"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Items')
+    sheet.append([str(col) for col in df.columns])
+    for row in df.itertuples(index=False):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def ensure_workbook(data_dir, rows, columns, dirty_ratio, arabic_ratio, duplicate_ratio, seed, regenerate=False):
+    """Path of the benchmark workbook for these settings, generating it if needed"""
+    name = f"bench_{rows}r_{columns}c_d{dirty_ratio:g}_a{arabic_ratio:g}_u{duplicate_ratio:g}_s{seed}.xlsx"
+    path = os.path.join(data_dir, name)
+    if regenerate or not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {name}...", file=sys.stderr)
+        started = time.perf_counter()
+        df = make_sheet(rows, columns, dirty_ratio, arabic_ratio, duplicate_ratio, seed)
+        # Write to a temporary name so an interrupted run does not leave a truncated workbook
+        write_workbook(df, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        print(f"Generated {name} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return path
+
+
+def template_mapping(sp_details, df):
+    """Parameters map to the same-named column, the rest the way the GUI suggests them"""
+    columns = [str(col) for col in df.columns]
+    mapping = {}
+    for param in sp_details['parameters']:
+        column = 'ITEM' if param == 'item' else 'QTY' if param == 'qty' else param
+        if column in columns:
+            mapping[param] = column
+    unmapped = [param for param in sp_details['parameters'] if param not in mapping]
+    if unmapped:
+        mapping.update(DataHandler.suggest_column_mappings(
+            unmapped, sp_details['parameter_specs'], [col for col in columns if col not in mapping.values()],
+            DataHandler.profile_sheet(df)
+        ))
+    return mapping
+
+
+def time_template(df, sp_details, mapping, work_dir):
+    """Run one template through the generation stages; returns (stage seconds, counters)"""
+    timings = {}
+    started = time.perf_counter()
+    result = DataHandler.validate_dataframe(df, mapping, sp_details['parameter_specs'], True, True)
+    timings['validate'] = time.perf_counter() - started
+
+    logger = SkippedRowLogger(os.path.join(work_dir, 'skipped.txt'))
+    logger.skipped_rows = list(result['skipped_rows'])
+    started = time.perf_counter()
+    positions, skipped_duplicate = DataHandler.deduplicate_rows(
+        result['row_numbers'], result['columns'].get('item'), 'last', logger
+    )
+    timings['dedup'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    render_sql = TemplateRegistry.get_renderer(sp_details)
+    sql_lines, render_errors = DataHandler.render_statements(
+        result, positions, render_sql, sp_details['parameters'], logger
+    )
+    timings['render'] = time.perf_counter() - started
+
+    output_path = os.path.join(work_dir, 'output.sql')
+    started = time.perf_counter()
+    logger.write_log_file('Items')
+    write_sql_script(output_path, sql_lines, 'Items', sp_details, result['error_count'] + render_errors,
+                     logger.log_file_path)
+    timings['write'] = time.perf_counter() - started
+
+    counters = {
+        'processed_rows': len(sql_lines),
+        'skipped_arabic': result['skipped_arabic'],
+        'skipped_invalid_value': result['skipped_invalid_value'],
+        'skipped_empty': result['skipped_empty'],
+        'skipped_duplicate': skipped_duplicate,
+        'skipped_rows_logged': len(logger.skipped_rows),
+        'bytes_written': os.path.getsize(output_path) + os.path.getsize(logger.log_file_path),
+    }
+    return timings, counters
+
+
+def run_benchmark(args):
+    registry = TemplateRegistry.load(args.templates)
+    names = args.template or registry.names()
+    unknown = [name for name in names if registry.get(name) is None]
+    if unknown:
+        raise SystemExit(f"Unknown template(s): {', '.join(unknown)}")
+
+    report = {'environment': environment(), 'settings': {
+        'columns': args.columns, 'dirty_ratio': args.dirty_ratio, 'arabic_ratio': args.arabic_ratio,
+        'duplicate_ratio': args.duplicate_ratio, 'seed': args.seed, 'repeat': args.repeat,
+    }, 'workbooks': [], 'results': []}
+
+    for rows in args.sizes:
+        path = ensure_workbook(args.data_dir, rows, args.columns, args.dirty_ratio, args.arabic_ratio,
+                               args.duplicate_ratio, args.seed, args.regenerate)
+        if args.generate_only:
+            continue
+        load_seconds = None
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            df = DataHandler.load_excel_sheets(path)['Items']
+            elapsed = time.perf_counter() - started
+            load_seconds = elapsed if load_seconds is None else min(load_seconds, elapsed)
+        report['workbooks'].append({
+            'rows': rows, 'columns': len(df.columns), 'file': os.path.basename(path),
+            'file_bytes': os.path.getsize(path), 'load_seconds': round(load_seconds, 4),
+            'load_rows_per_second': round(rows / load_seconds) if load_seconds else None,
+        })
+        print(f"{rows:>9,} rows  load {load_seconds:8.3f}s", file=sys.stderr)
+
+        for name in names:
+            sp_details = TemplateRegistry.resolve_flags(registry.get(name))
+            mapping = template_mapping(sp_details, df)
+            best = None
+            for _ in range(args.repeat):
+                with tempfile.TemporaryDirectory(prefix='excel_to_sql_bench_') as work_dir:
+                    timings, counters = time_template(df, sp_details, mapping, work_dir)
+                best = timings if best is None else {stage: min(best[stage], timings[stage]) for stage in STAGES}
+            total = sum(best.values())
+            report['results'].append({
+                'rows': rows,
+                'template': name,
+                'mapping': mapping,
+                **{f"{stage}_seconds": round(best[stage], 4) for stage in STAGES},
+                'total_seconds': round(total, 4),
+                'rows_per_second': round(rows / total) if total else None,
+                **counters,
+            })
+            print(f"{rows:>9,} rows  {name:<35} " + "  ".join(f"{stage} {best[stage]:7.3f}s" for stage in STAGES),
+                  file=sys.stderr)
+    return report
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Stages slower than in the baseline by more than tolerance (a fraction); returns messages"""
+    regressions = []
+    before = {(entry['rows'], entry['template']): entry for entry in baseline.get('results', [])}
+    before_loads = {entry['rows']: entry for entry in baseline.get('workbooks', [])}
+    checks = [(f"{entry['rows']:,} rows load", before_loads.get(entry['rows']), entry, 'load_seconds')
+              for entry in report['workbooks']]
+    checks += [(f"{entry['rows']:,} rows {entry['template']} {stage}", before.get((entry['rows'], entry['template'])),
+                entry, f"{stage}_seconds") for entry in report['results'] for stage in STAGES]
+    for label, old, new, key in checks:
+        if old is None or not old.get(key):
+            continue
+        if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] > MIN_REGRESSION_SECONDS:
+            regressions.append(f"{label}: {old[key]:.3f}s -> {new[key]:.3f}s ({new[key] / old[key] - 1:+.0%})")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark Excel to SQL conversion on synthetic workbooks.")
+    parser.add_argument('--sizes', default='10k,100k,1M', help="Comma-separated row counts, e.g. 10k,100k,1M")
+    parser.add_argument('--columns', type=int, default=12, help="Columns per sheet, including filler columns")
+    parser.add_argument('--dirty-ratio', type=float, default=0.02, help="Share of rows with a bad value")
+    parser.add_argument('--arabic-ratio', type=float, default=0.01, help="Share of rows with Arabic text")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.05, help="Share of rows repeating an item")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--template', action='append', help="Template to run (default: every template)")
+    parser.add_argument('--templates', help="Template registry file")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per stage; the fastest is kept")
+    parser.add_argument('--data-dir', default='bench_data', help="Where generated workbooks are kept")
+    parser.add_argument('--regenerate', action='store_true', help="Generate the workbooks again")
+    parser.add_argument('--generate-only', action='store_true', help="Only generate the workbooks")
+    parser.add_argument('--output', default='bench_results.json', help="Results file to write")
+    parser.add_argument('--compare', metavar='RESULTS', help="Earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed slowdown against --compare")
+    parser.add_argument('--log-level', default='WARNING', choices=LOG_LEVELS)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.sizes = [parse_size(size) for size in args.sizes.split(',') if size.strip()]
+    except ValueError as e:
+        parser.error(str(e))
+    args.repeat = max(args.repeat, 1)
+    configure_logging(args.log_level, None)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    report = run_benchmark(args)
+    if args.generate_only:
+        return 0
+    if baseline is not None:
+        report['compared_with'] = {'file': args.compare, **baseline.get('environment', {})}
+        report['regressions'] = compare(report, baseline, args.tolerance)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    for message in report.get('regressions', []):
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if report.get('regressions') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
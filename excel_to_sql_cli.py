@@ -0,0 +1,354 @@
+"""Headless Excel to SQL conversion for schedulers, servers and job runners.
+
+Examples:
+    python excel_to_sql_cli.py items.xlsx --template "Update Items Dropship Quantities" \
+        --map item=ITEM --map qty=QTY --output dropship.sql
+    python excel_to_sql_cli.py --job nightly_prices.json
+
+A job file is a JSON object with the same settings as the command line: "file", "sheet",
+"template", "mapping" (parameter -> column), "flags" (flag -> value), "output",
+"skipped_report", "metrics", "templates", "skip_arabic", "validate_quality", "dedup",
+"memory_budget_mb", "profile", "history", "item_master", "item_master_column",
+"item_master_table" and "checkpoint". Command-line
+arguments override the job file. Parameters without a mapping are matched to columns the
+same way the GUI suggests them.
+
+Statistics, including wall time, rows and bytes per stage, are printed to stdout as JSON;
+--metrics also writes them to a file (Prometheus text for .prom, JSON otherwise). Log
+messages go to stderr. --profile (or EXCEL_TO_SQL_PROFILE=1) runs the conversion under
+cProfile, saves <output>_profile.prof and logs the slowest functions. --history adds the
+run to the same SQLite run history the GUI's History tab shows. --item-master skips rows
+whose item is not in an item-master export (CSV, Parquet or a SQLite table); its index is
+cached under ~/.excel_to_sql/item_index between runs. Sheets of 200,000 rows or more are
+checkpointed to <output>.checkpoint while converting; running the same job again after an
+interruption resumes it (--no-checkpoint turns this off). Exit codes:
+0 success, 1 conversion failed, 2 invalid arguments, job file, template, sheet or mapping.
+"""
+import sys, os, json, sqlite3, argparse, contextlib
+import logging
+from excel_to_sql_core import (
+    pd, LOG_LEVELS, configure_logging, StageTimer, export_metrics, MEGABYTE, MemoryMonitor, dataframe_memory_bytes,
+    estimate_workbook_bytes, exceeds_memory_budget, format_bytes, profiling_requested, profile_path_for, RunProfiler,
+    file_sha256, RunHistory, CHECKPOINT_MIN_ROWS, RunCheckpoint, ItemMasterIndex, TemplateRegistry, DataHandler,
+    GenerationError, generate_sql_script
+)
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+DEFAULTS = {
+    'sheet': None,
+    'mapping': {},
+    'flags': {},
+    'output': 'output_script.sql',
+    'skipped_report': 'excel_to_sql_skipped.txt',
+    'metrics': None,
+    'templates': None,
+    'skip_arabic': True,
+    'validate_quality': True,
+    'dedup': 'last',
+    'memory_budget_mb': None,
+    'profile': False,
+    'history': False,
+    'item_master': None,
+    'item_master_column': None,
+    'item_master_table': None,
+    'checkpoint': True,
+}
+
+
+class UsageError(Exception):
+    """Bad arguments or job settings; reported with exit code 2"""
+
+
+def parse_pairs(pairs, option):
+    """['a=b', ...] -> {'a': 'b', ...}"""
+    parsed = {}
+    for pair in pairs or []:
+        name, sep, value = pair.partition('=')
+        if not sep or not name.strip():
+            raise UsageError(f"{option} expects NAME=VALUE, got '{pair}'")
+        parsed[name.strip()] = value.strip()
+    return parsed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert an Excel sheet into a SQL script without the GUI.")
+    parser.add_argument('file', nargs='?', help="Excel workbook to convert")
+    parser.add_argument('--job', help="JSON job file with the conversion settings")
+    parser.add_argument('--sheet', help="Sheet to convert (default: first non-empty sheet)")
+    parser.add_argument('--template', help="Template name from the SQL template registry")
+    parser.add_argument('--templates', help="Template registry file (default: EXCEL_TO_SQL_TEMPLATES or sql_templates.json)")
+    parser.add_argument('--map', action='append', metavar='PARAM=COLUMN', help="Map a template parameter to a column")
+    parser.add_argument('--flag', action='append', metavar='FLAG=VALUE', help="Set a template option, e.g. INACTIVE=1")
+    parser.add_argument('--output', help="SQL script to write (default: output_script.sql)")
+    parser.add_argument('--skipped-report', help="Skipped rows report to write (default: excel_to_sql_skipped.txt)")
+    parser.add_argument('--metrics', help="Write run metrics to this file (.prom for Prometheus text, else JSON)")
+    parser.add_argument('--keep-arabic', action='store_true', default=None, help="Do not skip rows with Arabic text")
+    parser.add_argument('--no-validate', action='store_true', default=None, help="Do not skip empty or invalid values")
+    parser.add_argument('--dedup', choices=['last', 'first', 'none'], help="Duplicate item policy (default: last)")
+    parser.add_argument('--memory-budget', type=int, metavar='MB',
+                        help="Stream the script to disk when a run would use more memory than this")
+    parser.add_argument('--profile', action='store_true', default=None,
+                        help="Profile the run and save <output>_profile.prof next to the output")
+    parser.add_argument('--history', action='store_true', default=None,
+                        help="Record the run in the run history database (EXCEL_TO_SQL_HISTORY or ~/.excel_to_sql)")
+    parser.add_argument('--item-master', help="Skip items missing from this item master (CSV, Parquet or SQLite)")
+    parser.add_argument('--item-master-column', help="Item number column in the item master (default: ITEMNMBR)")
+    parser.add_argument('--item-master-table', help="Table in a SQLite item master (default: IV00101)")
+    parser.add_argument('--no-checkpoint', action='store_true', default=None,
+                        help="Do not checkpoint or resume large runs")
+    parser.add_argument('--log-level', default='WARNING', choices=LOG_LEVELS)
+    parser.add_argument('--log-file', help="Also write log messages to this file")
+    return parser
+
+
+def read_job_settings(settings, base_dir, source="job file", extra_keys=()):
+    """Validate a job settings dict and resolve its relative paths against base_dir"""
+    if not isinstance(settings, dict):
+        raise UsageError(f"{source} must contain a JSON object")
+    unknown = set(settings) - set(DEFAULTS) - {'file', 'template'} - set(extra_keys)
+    if unknown:
+        raise UsageError(f"Unknown settings in {source}: {', '.join(sorted(unknown))}")
+    resolved = dict(settings)
+    for key in ('file', 'output', 'skipped_report', 'metrics', 'templates', 'item_master'):
+        if resolved.get(key) and not os.path.isabs(resolved[key]):
+            resolved[key] = os.path.join(base_dir, resolved[key])
+    return resolved
+
+
+def finish_job(job):
+    """Fill in defaults and check the required settings"""
+    job = {**DEFAULTS, **job}
+    job['flags'] = {name: str(value) for name, value in job['flags'].items()}
+    for key in ('file', 'template'):
+        if not job.get(key):
+            raise UsageError(f"Missing '{key}': pass it as an argument or in the job file")
+    return job
+
+
+def load_job(args):
+    """Merge defaults, the job file and command-line arguments into one settings dict"""
+    job = {}
+    if args.job:
+        try:
+            with open(args.job, 'r', encoding='utf-8') as f:
+                loaded = json.load(f)
+        except (OSError, ValueError) as e:
+            raise UsageError(f"Cannot read job file '{args.job}': {e}")
+        # Relative paths in a job file are relative to the job file
+        job = read_job_settings(loaded, os.path.dirname(os.path.abspath(args.job)), f"job file '{args.job}'")
+
+    overrides = {
+        'file': args.file, 'sheet': args.sheet, 'template': args.template, 'templates': args.templates,
+        'output': args.output, 'skipped_report': args.skipped_report, 'metrics': args.metrics, 'dedup': args.dedup,
+        'skip_arabic': False if args.keep_arabic else None,
+        'validate_quality': False if args.no_validate else None,
+        'memory_budget_mb': args.memory_budget,
+        'profile': args.profile,
+        'history': args.history,
+        'item_master': args.item_master,
+        'item_master_column': args.item_master_column,
+        'item_master_table': args.item_master_table,
+        'checkpoint': False if args.no_checkpoint else None,
+    }
+    job.update({key: value for key, value in overrides.items() if value is not None})
+    job['mapping'] = {**job.get('mapping', {}), **parse_pairs(args.map, '--map')}
+    job['flags'] = {**job.get('flags', {}), **parse_pairs(args.flag, '--flag')}
+    return finish_job(job)
+
+
+def resolve_template(job):
+    try:
+        registry = TemplateRegistry.load(job['templates'])
+    except Exception as e:
+        raise UsageError(f"Failed to load SQL templates: {e}")
+    sp_details = registry.get(job['template'])
+    if sp_details is None:
+        raise UsageError(f"Unknown template '{job['template']}'. Available: {', '.join(registry.names())}")
+    flag_choices = {flag['name']: flag['choices'] for flag in sp_details.get('flags', [])}
+    for name, value in job['flags'].items():
+        if name not in flag_choices:
+            raise UsageError(f"Template '{job['template']}' has no option '{name}'")
+        if value not in flag_choices[name]:
+            raise UsageError(f"Option '{name}' must be one of: {', '.join(flag_choices[name])}")
+    return TemplateRegistry.resolve_flags(sp_details, job['flags'])
+
+
+def resolve_mapping(job, sp_details, df):
+    columns = [str(col) for col in df.columns]
+    mapping = dict(job['mapping'])
+    unknown = set(mapping) - set(sp_details['parameters'])
+    if unknown:
+        raise UsageError(f"Template '{job['template']}' has no parameter(s): {', '.join(sorted(unknown))}")
+    missing_columns = [col for col in mapping.values() if col not in columns]
+    if missing_columns:
+        raise UsageError(f"Column(s) not found: {', '.join(missing_columns)}. Available: {', '.join(columns)}")
+
+    unmapped = [param for param in sp_details['parameters'] if param not in mapping]
+    if unmapped:
+        suggestions = DataHandler.suggest_column_mappings(
+            unmapped, sp_details['parameter_specs'], [col for col in columns if col not in mapping.values()],
+            DataHandler.profile_sheet(df)
+        )
+        for param, column in suggestions.items():
+            logging.info(f"Mapped '{param}' to column '{column}' automatically")
+        mapping.update(suggestions)
+    still_unmapped = [param for param in sp_details['parameters'] if param not in mapping]
+    if still_unmapped:
+        raise UsageError(f"No column mapped for: {', '.join(still_unmapped)}")
+    return mapping
+
+
+def load_sheets(job):
+    """Load the job's sheet (or every sheet when none is named)"""
+    if job['sheet']:
+        try:
+            with pd.ExcelFile(job['file']) as workbook:
+                sheet_names = workbook.sheet_names
+        except Exception as e:
+            raise GenerationError(f"Failed to open Excel file '{job['file']}': {e}")
+        if job['sheet'] not in sheet_names:
+            raise UsageError(f"Sheet '{job['sheet']}' not found. Available: {', '.join(sheet_names)}")
+    try:
+        return DataHandler.load_excel_sheets(job['file'], [job['sheet']] if job['sheet'] else None)
+    except Exception as e:
+        raise GenerationError(str(e))
+
+
+def run(job, sheets=None, on_progress=None):
+    """Convert one job; returns the stats dict printed by main.
+
+    sheets (sheet name -> DataFrame) skips loading the workbook, e.g. when it is cached.
+    on_progress is passed to generate_sql_script.
+    """
+    sp_details = resolve_template(job)
+    memory_budget = (job['memory_budget_mb'] or 0) * MEGABYTE
+    profiler = None
+    if job['profile'] or profiling_requested():
+        profiler = RunProfiler(profile_path_for(job['output']))
+    try:
+        with profiler or contextlib.nullcontext(), MemoryMonitor() as memory:
+            stats = convert(job, sp_details, memory_budget, sheets, on_progress)
+    except (UsageError, GenerationError) as e:
+        if job['history']:
+            record_history(job, 'failed', {'sheet': job['sheet']}, error=str(e))
+        raise
+    stats.update(memory.as_dict())
+    if profiler:
+        stats['profile_path'] = profiler.profile_path
+        logging.warning(f"Profile saved to {profiler.profile_path}\n{profiler.summary}")
+    stats['memory_budget_bytes'] = memory_budget or None
+    if job['metrics']:
+        try:
+            export_metrics(job['metrics'], stats, {'sheet': stats['sheet'], 'template': job['template']})
+        except OSError as e:
+            raise GenerationError(f"Cannot write metrics file '{job['metrics']}': {e}")
+    if job['history']:
+        record_history(job, 'success', stats)
+    return stats
+
+
+def record_history(job, status, stats, error=None):
+    try:
+        file_hash = file_sha256(job['file'])
+    except OSError:
+        file_hash = None
+    try:
+        history = RunHistory()
+        try:
+            history.record(job['file'], stats.get('sheet'), job['template'], status, stats,
+                           stats.get('mapping', job['mapping']), job['flags'], file_hash,
+                           job['output'] if status == 'success' else None, error)
+        finally:
+            history.close()
+    except Exception as e:
+        logging.error(f"Could not save the run to the history database: {e}")
+
+
+def load_item_master(job):
+    try:
+        return ItemMasterIndex.load(job['item_master'], job['item_master_column'], job['item_master_table'])
+    except (OSError, ValueError, KeyError, ImportError, sqlite3.Error) as e:
+        raise UsageError(f"Cannot load item master '{job['item_master']}': {e}")
+
+
+def run_checkpoint(job, df, sheet_name, sp_details, mapping, item_index):
+    """RunCheckpoint for a large sheet, keyed by the workbook hash; None when disabled or small"""
+    if not job['checkpoint'] or len(df) < CHECKPOINT_MIN_ROWS:
+        return None
+    try:
+        file_hash = file_sha256(job['file'])
+    except OSError as e:
+        logging.warning(f"Not checkpointing: cannot hash {job['file']}: {e}")
+        return None
+    return RunCheckpoint.for_run(job['output'], file_hash, df, sheet_name, sp_details, mapping, job['skip_arabic'],
+                                 job['validate_quality'], None if job['dedup'] == 'none' else job['dedup'],
+                                 item_index=item_index)
+
+
+def convert(job, sp_details, memory_budget, sheets=None, on_progress=None):
+    """Load (unless sheets is given), pick the sheet and mapping, and generate the script"""
+    timer = StageTimer()
+    if sheets is None:
+        estimated_bytes = estimate_workbook_bytes(job['file'])
+        if exceeds_memory_budget(estimated_bytes, memory_budget):
+            # Nothing smaller to fall back to for parsing; the script itself is streamed below
+            logging.warning(f"Loading {job['file']} needs about {format_bytes(estimated_bytes)}, "
+                            f"over the {format_bytes(memory_budget)} memory budget")
+        with timer.measure('file_parse') as stage:
+            sheets = load_sheets(job)
+            stage['rows'] = sum(len(df) for df in sheets.values())
+    with timer.measure('sheet_selection') as stage:
+        sheet_name = job['sheet'] or next(iter(sheets))
+        if sheet_name not in sheets:
+            raise UsageError(f"Sheet '{sheet_name}' not found or empty. Available: {', '.join(map(str, sheets))}")
+        df = sheets[sheet_name]
+        mapping = resolve_mapping(job, sp_details, df)
+        stage['rows'] = len(df)
+    item_index = None
+    if job['item_master']:
+        with timer.measure('item_master_load') as stage:
+            item_index = load_item_master(job)
+            stage['rows'] = len(item_index)
+
+    _, stats = generate_sql_script(
+        df, sheet_name, sp_details, mapping, job['output'], job['skip_arabic'], job['validate_quality'],
+        None if job['dedup'] == 'none' else job['dedup'], skipped_log_path=job['skipped_report'],
+        on_progress=on_progress, stages=timer.as_dict(), memory_budget=memory_budget, item_index=item_index,
+        checkpoint=run_checkpoint(job, df, sheet_name, sp_details, mapping, item_index)
+    )
+    stats['sheet_memory_bytes'] = dataframe_memory_bytes(df)
+    return {
+        'file': job['file'],
+        'sheet': sheet_name,
+        'template': job['template'],
+        'mapping': mapping,
+        'output': job['output'],
+        'skipped_report': job['skipped_report'],
+        **stats,
+    }
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_file)
+    try:
+        result = run(load_job(args))
+    except UsageError as e:
+        print(json.dumps({'error': str(e)}), file=sys.stdout)
+        return EXIT_USAGE
+    except GenerationError as e:
+        print(json.dumps({'error': str(e)}), file=sys.stdout)
+        return EXIT_FAILED
+    except Exception as e:
+        logging.exception("Unexpected error in SQL generation")
+        print(json.dumps({'error': f"Unexpected error in SQL generation: {e}"}), file=sys.stdout)
+        return EXIT_FAILED
+    print(json.dumps(result, indent=2, default=str))
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2754 @@
+"""Conversion core shared by the GUI and the command-line entry point.
+
+Everything here is free of PyQt5 so it can run on servers and from schedulers: template
+registry, Excel loading, validation, de-duplication, rendering and script writing.
+"""
+import sys, os, io, re, json, time, queue, pickle, shutil, atexit, pstats, sqlite3, hashlib, weakref, keyword, cProfile, zipfile, mmap, tempfile, importlib, threading
+from datetime import datetime, timedelta
+from functools import lru_cache
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from string import Formatter
+from xml.etree import ElementTree
+import logging
+import logging.handlers
+import traceback
+
+
+# --- Heavy modules are imported on first use (see the GUI startup timing) ---
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    logging.debug(f"Imported {self._name} in {time.perf_counter() - started:.2f}s")
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+
+np = LazyModule('numpy')
+pd = LazyModule('pandas')
+# Imported by pandas.read_excel on demand; warmed up here so the first file open does not pay for it
+HEAVY_MODULES = (np, pd, LazyModule('openpyxl'))
+
+def resource_path(relative_path):
+    """Get absolute path to resource, works for dev and for PyInstaller"""
+    if hasattr(sys, '_MEIPASS'):
+        # Running from a PyInstaller bundle
+        return os.path.join(sys._MEIPASS, relative_path)
+    # Running from normal script
+    return os.path.join(os.path.abspath("."), relative_path)
+
+# --- Logging: file/console output is written by a background queue listener ---
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(funcName)s:%(lineno)d - %(message)s'
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR']
+_log_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `burst` records per call site every `interval` seconds.
+
+    Per-row messages from a dirty sheet would otherwise produce thousands of records;
+    the first record of the next window reports how many were suppressed.
+    """
+
+    def __init__(self, burst=20, interval=1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}  # (pathname, lineno) -> [window_start, passed, suppressed]
+
+    def filter(self, record):
+        now = time.monotonic()
+        site = (record.pathname, record.lineno)
+        window = self._windows.get(site)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window else 0
+            self._windows[site] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()} ({suppressed} similar messages suppressed)"
+                record.args = None
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+def configure_logging(level='INFO', log_file='excel_to_sql.log'):
+    """Route root logging through a queue so callers never block on file writes.
+
+    Records go to stderr and, unless log_file is None, to log_file.
+    """
+    global _log_listener
+    root = logging.getLogger()
+    if _log_listener is None:
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = [logging.StreamHandler()]
+        if log_file:
+            handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+        log_queue = queue.Queue(-1)
+        _log_listener = logging.handlers.QueueListener(log_queue, *handlers)
+        _log_listener.start()
+        atexit.register(shutdown_logging)
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter())
+        root.handlers = [queue_handler]
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+
+
+def shutdown_logging():
+    """Flush queued records and stop the background listener"""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+class SkippedRowLogger:
+    """Handles logging of skipped rows with detailed information"""
+    
+    def __init__(self, log_file_path="excel_to_sql_skipped.txt"):
+        self.log_file_path = log_file_path
+        self.skipped_rows = []
+        
+    def log_skipped_row(self, row_number, reason, details="", value=""):
+        """Log a skipped row with details"""
+        entry = {
+            'row_number': row_number + 1,
+            'reason': reason,
+            'details': details,
+            'value': str(value)[:100],  # Truncate long values
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        self.skipped_rows.append(entry)
+        
+    def write_log_file(self, sheet_name=""):
+        """Write all skipped rows to log file"""
+        try:
+            with open(self.log_file_path, 'w', encoding='utf-8') as f:
+                f.write(f"Skipped Rows Log - Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"Sheet: {sheet_name}\n")
+                f.write("=" * 80 + "\n\n")
+                
+                if not self.skipped_rows:
+                    f.write("No rows were skipped during processing.\n")
+                    return
+                
+                # Group by reason
+                reasons = {}
+                for entry in self.skipped_rows:
+                    reason = entry['reason']
+                    if reason not in reasons:
+                        reasons[reason] = []
+                    reasons[reason].append(entry)
+                
+                for reason, entries in reasons.items():
+                    f.write(f"REASON: {reason}\n")
+                    f.write("-" * 40 + "\n")
+                    for entry in entries:
+                        f.write(f"Row {entry['row_number']}: {entry['details']}")
+                        if entry['value']:
+                            f.write(f" | Value: '{entry['value']}'")
+                        f.write("\n")
+                    f.write("\n")
+                    
+        except Exception as e:
+            logging.error(f"Failed to write skipped rows log: {e}")
+
+
+class ProgressReporter:
+    """Coalesces per-row progress into a few updates per second with throughput and ETA"""
+
+    def __init__(self, total, interval=0.25):
+        self.total = total
+        self.interval = interval
+        self.start_time = time.monotonic()
+        self._next_report = self.start_time
+
+    def update(self, done):
+        """Return a progress snapshot when an update is due, otherwise None"""
+        now = time.monotonic()
+        if now < self._next_report and done < self.total:
+            return None
+        self._next_report = now + self.interval
+        return self.snapshot(done, now)
+
+    def snapshot(self, done, now=None):
+        elapsed = (now or time.monotonic()) - self.start_time
+        rows_per_second = done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - done, 0)
+        return {
+            'done': done,
+            'total': self.total,
+            'percent': int(done * 100 / self.total) if self.total else 100,
+            'elapsed': elapsed,
+            'rows_per_second': rows_per_second,
+            'eta': remaining / rows_per_second if rows_per_second > 0 else None,
+        }
+
+    @staticmethod
+    def describe(snapshot):
+        eta = snapshot['eta']
+        eta_text = str(timedelta(seconds=int(eta))) if eta is not None else "--:--"
+        return (f"{snapshot['rows_per_second']:,.0f} rows/s, "
+                f"elapsed {timedelta(seconds=int(snapshot['elapsed']))}, ETA {eta_text}")
+
+
+class StageTimer:
+    """Wall time, row count and bytes written per named stage of a run, in the order the stages ran.
+
+    Stage names used by the converters: file_parse, sheet_spill, sheet_selection,
+    item_master_load, validation, item_lookup, dedup, rendering, skipped_log_write and
+    sql_write.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = {name: dict(entry) for name, entry in (stages or {}).items()}
+
+    @contextmanager
+    def measure(self, name, rows=None):
+        """Time the with-block; it may set entry['rows'] and entry['bytes'] on the yielded dict"""
+        entry = {'rows': rows, 'bytes': None}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            self.record(name, time.perf_counter() - started, entry['rows'], entry['bytes'])
+
+    def record(self, name, seconds, rows=None, bytes_written=None, **extra):
+        self.stages[name] = {
+            'seconds': round(seconds, 6),
+            'rows': rows,
+            'rows_per_second': round(rows / seconds, 1) if rows and seconds > 0 else None,
+            'bytes': bytes_written,
+            **extra,
+        }
+
+    def as_dict(self):
+        return {name: dict(entry) for name, entry in self.stages.items()}
+
+    @staticmethod
+    def describe(stages):
+        """Aligned text table of a stages dict"""
+        lines = [f"{'Stage':<18} {'Seconds':>9} {'Rows':>11} {'Rows/s':>11} {'Bytes':>13}"]
+        for name, entry in stages.items():
+            rows = f"{entry['rows']:,}" if entry.get('rows') is not None else "-"
+            rate = f"{entry['rows_per_second']:,.0f}" if entry.get('rows_per_second') else "-"
+            size = f"{entry['bytes']:,}" if entry.get('bytes') is not None else "-"
+            seconds = "cached" if entry.get('cached') else f"{entry['seconds']:.3f}"
+            lines.append(f"{name:<18} {seconds:>9} {rows:>11} {rate:>11} {size:>13}")
+        return "\n".join(lines)
+
+
+# --- Memory accounting: process RSS, DataFrame sizes and the memory budget ---
+MEGABYTE = 1024 * 1024
+
+
+def current_rss():
+    """Resident set size of this process in bytes, or None when the platform does not report it"""
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current on macOS/BSD, where ru_maxrss is in bytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class MemoryMonitor:
+    """Samples the process RSS on a background thread to find the peak while a block runs.
+
+        with MemoryMonitor() as memory:
+            load_or_generate()
+        stats.update(memory.as_dict())
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.start_bytes = None
+        self.peak_bytes = None
+        self.end_bytes = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak_bytes is None or rss > self.peak_bytes):
+            self.peak_bytes = rss
+        return rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.start_bytes = self.sample()
+        if self.start_bytes is not None:
+            self._thread = threading.Thread(target=self._run, name="MemoryMonitor", daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.end_bytes = self.sample()
+        return False
+
+    def as_dict(self):
+        return {'rss_start_bytes': self.start_bytes, 'peak_rss_bytes': self.peak_bytes, 'rss_end_bytes': self.end_bytes}
+
+
+def dataframe_memory_bytes(df):
+    """Memory held by a DataFrame including its Python string objects"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def estimate_workbook_bytes(file_path):
+    """Rough memory needed to parse a workbook: twice its uncompressed sheet XML.
+
+    Returns None for formats other than xlsx/xlsm or unreadable files.
+    """
+    try:
+        with zipfile.ZipFile(file_path) as workbook:
+            xml_bytes = sum(info.file_size for info in workbook.infolist()
+                            if info.filename.startswith('xl/worksheets/') or info.filename == 'xl/sharedStrings.xml')
+    except (OSError, zipfile.BadZipFile):
+        return None
+    return 2 * xml_bytes
+
+
+def estimate_generation_bytes(row_count, sp_details):
+    """Rough memory for the validated columns and rendered statements of a run"""
+    per_row = len(sp_details.get('sql_template', '')) + 100 + 70 * len(sp_details.get('parameters', []))
+    return row_count * per_row
+
+
+def exceeds_memory_budget(estimated_bytes, memory_budget):
+    """True when the current RSS plus estimated_bytes would go over memory_budget (bytes; 0/None = no budget)"""
+    if not memory_budget or estimated_bytes is None:
+        return False
+    return (current_rss() or 0) + estimated_bytes > memory_budget
+
+
+def format_bytes(value):
+    if value is None:
+        return "-"
+    if value < MEGABYTE:
+        return f"{value / 1024:,.1f} KB"
+    return f"{value / MEGABYTE:,.1f} MB"
+
+
+# --- SheetStore: inactive sheets spilled to memory-mapped column files (no UI code) ---
+SPILL_MIN_BYTES = 16 * MEGABYTE
+
+
+class SpilledSheet:
+    """A DataFrame written column by column to a temporary directory.
+
+    Numeric, boolean and datetime columns are .npy files that load() maps copy-on-write,
+    so they are not copied onto the heap and only the pages that are read become resident.
+    Text columns are stored as one UTF-8 byte .npy plus an offsets .npy; those files are
+    mapped too, but load() has to decode them back into Python strings, so a text column
+    is fully resident again once its sheet is mapped back in (mapped_bytes excludes it).
+    Columns mixing strings with other values are pickled and read back in full.
+    The directory is removed once nothing references this object.
+    """
+
+    MAPPED_KINDS = 'biufcmM'
+    # Object-column missing markers, by the code stored in .na.npy (not np.nan: that would import numpy)
+    MISSING = (None, float('nan'))
+    _base_dir = None
+
+    def __init__(self, path, columns, kinds, dtypes, index, nbytes, mapped_bytes):
+        self.path = path
+        self.columns = columns
+        self.kinds = kinds
+        self.dtypes = dtypes
+        self.index = index
+        self.nbytes = nbytes
+        self.mapped_bytes = mapped_bytes
+        weakref.finalize(self, shutil.rmtree, path, True)
+
+    @classmethod
+    def base_dir(cls):
+        """Per-process directory under the system temp directory, removed at exit"""
+        if cls._base_dir is None:
+            cls._base_dir = tempfile.mkdtemp(prefix='excel_to_sql_sheets_')
+            atexit.register(shutil.rmtree, cls._base_dir, True)
+        return cls._base_dir
+
+    @classmethod
+    def write(cls, df):
+        path = tempfile.mkdtemp(prefix='sheet_', dir=cls.base_dir())
+        kinds, dtypes, mapped_bytes = [], [], 0
+        try:
+            for position in range(df.shape[1]):
+                column = df.iloc[:, position]
+                file_path = os.path.join(path, f"col_{position:04d}")
+                if isinstance(column.dtype, np.dtype) and column.dtype.kind in cls.MAPPED_KINDS:
+                    values = column.to_numpy()
+                    np.save(file_path + '.npy', values, allow_pickle=False)
+                    kinds.append('npy')
+                    mapped_bytes += values.nbytes
+                elif cls._write_strings(file_path, column):
+                    kinds.append('str')
+                else:
+                    with open(file_path + '.pkl', 'wb') as f:
+                        pickle.dump(column.array, f, protocol=pickle.HIGHEST_PROTOCOL)
+                    kinds.append('pkl')
+                dtypes.append(column.dtype)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+        nbytes = sum(entry.stat().st_size for entry in os.scandir(path))
+        return cls(path, df.columns, kinds, dtypes, df.index, nbytes, mapped_bytes)
+
+    @classmethod
+    def _write_strings(cls, file_path, column):
+        """Save an object or python-string column as UTF-8 bytes and offsets; False if it holds non-strings"""
+        if not (column.dtype == object or (isinstance(column.dtype, pd.StringDtype) and column.dtype.storage == 'python')):
+            return False
+        values = np.asarray(column.array, dtype=object)
+        missing = np.zeros(len(values), dtype=np.int8)
+        encoded = []
+        for position, value in enumerate(values):
+            if type(value) is str:
+                encoded.append(value.encode('utf-8', 'surrogatepass'))
+            elif value is None:
+                missing[position] = 1
+                encoded.append(b'')
+            elif isinstance(value, float) and value != value:
+                missing[position] = 2
+                encoded.append(b'')
+            else:
+                return False
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        np.save(file_path + '.str.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8), allow_pickle=False)
+        np.save(file_path + '.off.npy', offsets, allow_pickle=False)
+        if missing.any():
+            np.save(file_path + '.na.npy', missing, allow_pickle=False)
+        return True
+
+    def _read_strings(self, file_path):
+        data = np.lib.format.open_memmap(file_path + '.str.npy', mode='r')
+        offsets = np.lib.format.open_memmap(file_path + '.off.npy', mode='r')
+        text = str(memoryview(data), 'utf-8', 'surrogatepass') if len(data) else ''
+        if len(text) != len(data):
+            # Decode once and slice: a character starts at every byte that is not a UTF-8 continuation byte
+            offsets = offsets - np.searchsorted(np.flatnonzero((data & 0xC0) == 0x80), offsets)
+        offsets = offsets.tolist()
+        values = np.array([text[start:end] for start, end in zip(offsets, offsets[1:])], dtype=object)
+        if os.path.exists(file_path + '.na.npy'):
+            missing = np.lib.format.open_memmap(file_path + '.na.npy', mode='r')
+            for code in (1, 2):
+                values[missing == code] = self.MISSING[code - 1]
+        return values
+
+    def load(self):
+        columns = {}
+        for position, kind in enumerate(self.kinds):
+            file_path = os.path.join(self.path, f"col_{position:04d}")
+            if kind == 'npy':
+                values = np.lib.format.open_memmap(file_path + '.npy', mode='c')
+            elif kind == 'str':
+                values = self._read_strings(file_path)
+            else:
+                with open(file_path + '.pkl', 'rb') as f:
+                    values = pickle.load(f)
+            # The dtype keeps pandas from re-inferring object text columns as str
+            columns[position] = pd.Series(values, index=self.index, dtype=self.dtypes[position], copy=False)
+        df = pd.DataFrame(columns, index=self.index, copy=False)
+        df.columns = self.columns
+        return df
+
+
+class SheetStore(MutableMapping):
+    """Sheet name -> DataFrame mapping that keeps inactive sheets on disk as SpilledSheets.
+
+    spill(keep) writes every other sheet of at least min_bytes once and drops it from
+    memory; reading a spilled sheet maps it back in until the next spill(), which then only
+    drops it again. Membership, iteration and len() never load a sheet.
+    """
+
+    def __init__(self, sheets=None, min_bytes=SPILL_MIN_BYTES):
+        self.min_bytes = min_bytes
+        self._entries = {}  # name -> DataFrame or SpilledSheet
+        self._files = {}    # name -> SpilledSheet of a sheet that is also in memory
+        self._mapped = set()  # in-memory sheets that were read back from their SpilledSheet
+        self._lock = threading.Lock()
+        self.update(sheets or {})
+
+    def __getitem__(self, name):
+        with self._lock:
+            entry = self._entries[name]
+            if isinstance(entry, SpilledSheet):
+                started = time.perf_counter()
+                self._files[name] = entry
+                entry = self._entries[name] = entry.load()
+                self._mapped.add(name)
+                logging.info(f"Mapped sheet '{name}' back in from disk in {time.perf_counter() - started:.3f}s")
+            return entry
+
+    def __setitem__(self, name, df):
+        with self._lock:
+            self._entries[name] = df
+            self._files.pop(name, None)
+            self._mapped.discard(name)
+
+    def __delitem__(self, name):
+        with self._lock:
+            del self._entries[name]
+            self._files.pop(name, None)
+            self._mapped.discard(name)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    def __iter__(self):
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_spilled(self, name):
+        return isinstance(self._entries.get(name), SpilledSheet)
+
+    def copy_from(self, other, name):
+        """Take over another store's sheet as it is, without loading it"""
+        with other._lock:
+            entry, files, mapped = other._entries[name], other._files.get(name), name in other._mapped
+        with self._lock:
+            self._entries[name] = entry
+            if files is not None:
+                self._files[name] = files
+            if mapped:
+                self._mapped.add(name)
+
+    def spill(self, keep=None, sizes=None):
+        """Move every sheet but keep to disk; returns the bytes written.
+
+        keep is written too, so switching away from it later is immediate. sizes (name ->
+        dataframe_memory_bytes) saves measuring sheets again.
+        """
+        written = 0
+        for name in list(self._entries):
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None or isinstance(entry, SpilledSheet):
+                    continue
+                spilled = self._files.get(name)
+            if spilled is None:
+                size = (sizes or {}).get(name)
+                if (size if size is not None else dataframe_memory_bytes(entry)) < self.min_bytes:
+                    continue
+                spilled = SpilledSheet.write(entry)
+                written += spilled.nbytes
+                logging.info(f"Spilled sheet '{name}' to {format_bytes(spilled.nbytes)} of column files")
+            with self._lock:
+                if self._entries.get(name) is not entry:
+                    continue
+                if name == keep:
+                    self._files[name] = spilled
+                else:
+                    self._entries[name] = spilled
+                    self._files.pop(name, None)
+                    self._mapped.discard(name)
+        return written
+
+    def spilled_bytes(self):
+        """Disk size of the sheets that are currently not in memory"""
+        return sum(entry.nbytes for entry in self._entries.values() if isinstance(entry, SpilledSheet))
+
+    def resident_bytes(self, sizes=None):
+        """Heap memory of the sheets in memory; memory-mapped numeric columns are not counted.
+
+        Text columns of a sheet read back from disk are decoded onto the heap and count in full.
+        """
+        total = 0
+        with self._lock:
+            entries = [(name, entry, self._files.get(name) if name in self._mapped else None)
+                       for name, entry in self._entries.items() if not isinstance(entry, SpilledSheet)]
+        for name, entry, spilled in entries:
+            size = (sizes or {}).get(name)
+            size = size if size is not None else dataframe_memory_bytes(entry)
+            total += max(size - (spilled.mapped_bytes if spilled is not None else 0), 0)
+        return total
+
+
+# --- Profiling: cProfile a load or generation run and summarize the hot functions ---
+PROFILE_ENV = 'EXCEL_TO_SQL_PROFILE'
+
+
+def profiling_requested():
+    """True when EXCEL_TO_SQL_PROFILE is set to anything but 0/false/no"""
+    return os.environ.get(PROFILE_ENV, '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def profile_path_for(output_path, suffix='profile'):
+    """output.sql -> output_profile.prof, next to the output"""
+    return f"{os.path.splitext(output_path)[0]}_{suffix}.prof"
+
+
+class RunProfiler:
+    """Profiles the with-block with cProfile, saves the stats and keeps a text summary.
+
+    cProfile only sees the thread that enters the block, so use it inside the worker's run().
+    The saved file opens with pstats, snakeviz or gprof2dot.
+    """
+
+    def __init__(self, profile_path, top=15):
+        self.profile_path = profile_path
+        self.top = top
+        self.summary = ""
+        self._profile = cProfile.Profile()
+
+    def __enter__(self):
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.disable()
+        try:
+            self._profile.dump_stats(self.profile_path)
+        except OSError as e:
+            logging.error(f"Could not save profile to {self.profile_path}: {e}")
+            self.profile_path = None
+        self.summary = self.summarize()
+        return False
+
+    def summarize(self):
+        """The top functions by own time and by cumulative time, as pstats prints them"""
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream).strip_dirs()
+        for order, title in (('tottime', "own time"), ('cumulative', "cumulative time")):
+            stream.write(f"Top {self.top} functions by {title}:\n")
+            stats.sort_stats(order).print_stats(self.top)
+        # Drop the blank lines and repeated totals pstats prints around each table
+        lines = [line for line in stream.getvalue().splitlines() if line.strip() and not line.lstrip().startswith(('Ordered by', 'List reduced'))]
+        return "\n".join(lines)
+
+
+METRIC_PREFIX = "excel_to_sql"
+RUN_METRICS = (
+    ('total_rows', 'Rows in the converted sheet'),
+    ('processed_rows', 'SQL statements written'),
+    ('skipped_arabic', 'Rows skipped for Arabic text'),
+    ('skipped_invalid_value', 'Rows skipped for invalid values'),
+    ('skipped_empty', 'Rows skipped for empty values'),
+    ('skipped_duplicate', 'Rows skipped as duplicate keys'),
+    ('skipped_unknown_item', 'Rows skipped for items not in the item master'),
+    ('total_errors', 'Row processing errors'),
+    ('processing_time', 'Generation wall time in seconds'),
+    ('rows_per_second', 'Generation throughput in rows per second'),
+    ('bytes_written', 'Bytes written to the SQL script and skipped rows report'),
+    ('sheet_memory_bytes', 'Memory held by the converted sheet'),
+    ('peak_rss_bytes', 'Peak resident memory of the process during the run'),
+)
+
+
+def format_prometheus_metrics(stats, labels=None):
+    """Run stats (with their 'stages') in the Prometheus text exposition format"""
+    def label_text(extra=None):
+        pairs = {**(labels or {}), **(extra or {})}
+        if not pairs:
+            return ""
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                   for value in pairs.values())
+        return "{" + ",".join(f'{name}="{value}"' for name, value in zip(pairs, escaped)) + "}"
+
+    lines = []
+    for key, help_text in RUN_METRICS:
+        if stats.get(key) is None:
+            continue
+        lines += [f"# HELP {METRIC_PREFIX}_{key} {help_text}", f"# TYPE {METRIC_PREFIX}_{key} gauge",
+                  f"{METRIC_PREFIX}_{key}{label_text()} {stats[key]}"]
+    stages = stats.get('stages', {})
+    for key, help_text in (('seconds', 'Wall time per stage in seconds'), ('rows', 'Rows handled per stage'),
+                           ('bytes', 'Bytes written per stage')):
+        samples = [(name, entry[key]) for name, entry in stages.items() if entry.get(key) is not None]
+        if not samples:
+            continue
+        lines += [f"# HELP {METRIC_PREFIX}_stage_{key} {help_text}", f"# TYPE {METRIC_PREFIX}_stage_{key} gauge"]
+        lines += [f"{METRIC_PREFIX}_stage_{key}{label_text({'stage': name})} {value}" for name, value in samples]
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(path, stats, labels=None):
+    """Write run metrics to path: Prometheus text for .prom/.txt, JSON otherwise"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.lower().endswith(('.prom', '.txt')):
+            f.write(format_prometheus_metrics(stats, labels))
+        else:
+            json.dump({'labels': labels or {}, **stats}, f, indent=2, default=str)
+
+
+# --- TemplateRegistry: SQL templates loaded from sql_templates.json (no UI code) ---
+PARAMETER_TYPES = ('string', 'decimal')
+
+
+def is_valid_parameter_name(name):
+    """True if name can be used as a render-function argument (identifier, not a keyword, no leading '_')"""
+    return isinstance(name, str) and name.isidentifier() and not keyword.iskeyword(name) and not name.startswith('_')
+
+
+@lru_cache(maxsize=64)
+def compile_sql_template(sql_template, decimal_formats=(), arg_names=()):
+    """Compile a str.format-style SQL template into a specialized render function.
+
+    The template is parsed once; the returned function takes one positional argument per
+    name in arg_names (the template parameters, in order) and concatenates the pre-split
+    literal parts with the converted values. decimal_formats is a tuple of
+    (parameter, format_spec) pairs applied to fields that do not carry their own format
+    spec. Results are cached per template.
+    """
+    for name in arg_names:
+        if not is_valid_parameter_name(name):
+            raise ValueError(f"Invalid SQL template parameter name: {name!r}")
+    default_formats = dict(decimal_formats)
+    namespace = {'_format': format, '_str': str}
+    pieces = []
+    for literal, field_name, format_spec, conversion in Formatter().parse(sql_template):
+        if literal:
+            pieces.append(repr(literal))
+        if field_name is None:
+            continue
+        if not field_name.isidentifier():
+            raise ValueError(f"Unsupported placeholder '{{{field_name}}}' in SQL template")
+        if conversion:
+            raise ValueError(f"Conversions are not supported in SQL template placeholder '{field_name}'")
+        if field_name not in arg_names:
+            raise ValueError(f"Missing parameter for SQL formatting: '{field_name}'")
+        format_spec = format_spec or default_formats.get(field_name, '')
+        if format_spec:
+            pieces.append(f"_format({field_name}, {format_spec!r})")
+        else:
+            pieces.append(f"_str({field_name})")
+
+    body = f"''.join(({', '.join(pieces)},))" if pieces else "''"
+    return eval(compile(f"lambda {', '.join(arg_names)}: {body}", '<sql template>', 'eval'), namespace)
+
+class TemplateRegistry:
+    """Loads SQL templates and their typed parameters from a JSON or YAML registry file"""
+
+    FILE_NAME = "sql_templates.json"
+
+    def __init__(self, templates=None, source_path=""):
+        self.templates = templates or {}
+        self.source_path = source_path
+
+    @classmethod
+    def default_path(cls):
+        """EXCEL_TO_SQL_TEMPLATES, then the working directory, then the bundled copy next to the script"""
+        env_path = os.environ.get('EXCEL_TO_SQL_TEMPLATES')
+        if env_path:
+            return env_path
+        for candidate in (os.path.join(os.path.abspath("."), cls.FILE_NAME), resource_path(cls.FILE_NAME)):
+            if os.path.exists(candidate):
+                return candidate
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), cls.FILE_NAME)
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or cls.default_path()
+        logging.info(f"Loading SQL template registry: {path}")
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.lower().endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError("PyYAML is required to read YAML template registries (pip install pyyaml)")
+                raw = yaml.safe_load(f)
+            else:
+                raw = json.load(f)
+
+        templates = {}
+        for entry in raw.get('templates', []):
+            details = cls._parse_template(entry)
+            templates[details['friendly_name']] = details
+        if not templates:
+            raise ValueError(f"No templates defined in {path}")
+        logging.info(f"Loaded {len(templates)} SQL templates from {path}")
+        return cls(templates, path)
+
+    @staticmethod
+    def _parse_template(entry):
+        name = entry.get('name')
+        sql = entry.get('sql')
+        if not name or not sql:
+            raise ValueError(f"Template entry is missing 'name' or 'sql': {entry}")
+
+        parameter_specs = {}
+        for param in entry.get('parameters', []):
+            if not is_valid_parameter_name(param.get('name')):
+                raise ValueError(f"Template '{name}': invalid parameter name {param.get('name')!r}; "
+                                 "use a Python identifier that is not a keyword and does not start with '_'")
+            param_type = param.get('type', 'string')
+            if param_type not in PARAMETER_TYPES:
+                raise ValueError(f"Template '{name}': unknown type '{param_type}' for parameter '{param.get('name')}'")
+            parameter_specs[param['name']] = {
+                'type': param_type,
+                'precision': int(param.get('precision', 3)),
+                'non_negative': bool(param.get('non_negative', False)),
+                'label': param.get('label', f"{param['name'].replace('_', ' ').title()} Column"),
+            }
+
+        flags = []
+        for flag in entry.get('flags', []):
+            flags.append({
+                'name': flag['name'],
+                'label': flag.get('label', flag['name']),
+                'sql': flag.get('sql', ", " + flag['name'] + " = {value}"),
+                'choices': {str(k): str(v) for k, v in flag.get('choices', {}).items()},
+            })
+
+        return {
+            'sql_template': sql,
+            'parameters': list(parameter_specs),
+            'parameter_specs': parameter_specs,
+            'flags': flags,
+            'friendly_name': name,
+        }
+
+    def names(self):
+        return list(self.templates)
+
+    def get(self, name):
+        return self.templates.get(name)
+
+    @staticmethod
+    def resolve_flags(sp_details, flag_values=None):
+        """Return a copy of sp_details with the run-level flag choices baked into the SQL template.
+
+        flag_values maps flag name to the selected choice key; unselected flags render as nothing.
+        """
+        flag_values = flag_values or {}
+        sql_template = sp_details['sql_template']
+        for flag in sp_details.get('flags', []):
+            value = flag_values.get(flag['name'])
+            fragment = flag['sql'].replace('{value}', value) if value is not None else ''
+            # Escape braces so the fragment survives the later str.format-style compile
+            sql_template = sql_template.replace('{' + flag['name'] + '}', fragment.replace('{', '{{').replace('}', '}}'))
+        resolved = dict(sp_details)
+        resolved['sql_template'] = sql_template
+        resolved['flag_values'] = dict(flag_values)
+        return resolved
+
+    @staticmethod
+    def get_renderer(sp_details):
+        """Compiled (and cached) render function for a resolved template.
+
+        The function takes the parameter values positionally, in sp_details['parameters'] order.
+        """
+        decimal_formats = tuple(
+            (param, f".{spec['precision']}f")
+            for param, spec in sp_details.get('parameter_specs', {}).items()
+            if spec['type'] == 'decimal'
+        )
+        return compile_sql_template(sp_details['sql_template'], decimal_formats, tuple(sp_details['parameters']))
+
+
+# --- DataHandler: All Pandas/Excel/JSON logic (no UI code) ---
+class DataHandler:
+    # Update the DataHandler.load_excel_sheets method with better error handling
+    @staticmethod
+    def load_excel_sheets(file_path, sheet_names=None):
+        """Load the non-empty sheets of a workbook; sheet_names limits loading to those sheets"""
+        try:
+            logging.info(f"Loading Excel file: {file_path}")
+            
+            # Check if file exists and is accessible
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"File not found: {file_path}")
+                
+            if not os.access(file_path, os.R_OK):
+                raise PermissionError(f"Cannot read file: {file_path}")
+            
+            # Try to load with different engines if one fails
+            engines = ['openpyxl', 'xlrd']
+            last_error = None
+            
+            for engine in engines:
+                try:
+                    logging.info(f"Trying to load with engine: {engine}")
+                    all_sheets = pd.read_excel(file_path, sheet_name=sheet_names and list(sheet_names), engine=engine)
+                    
+                    # Filter out empty sheets with better validation
+                    valid_sheets = {}
+                    for name, df in all_sheets.items():
+                        if df is not None and not df.empty and len(df.columns) > 0:
+                            # Check if sheet has meaningful data (not just headers)
+                            if len(df.dropna(how='all')) > 0:
+                                valid_sheets[name] = df
+                                logging.info(f"Sheet '{name}' loaded successfully with {len(df)} rows and {len(df.columns)} columns")
+                            else:
+                                logging.warning(f"Sheet '{name}' contains only empty rows, skipping")
+                        else:
+                            logging.warning(f"Sheet '{name}' is empty or invalid, skipping")
+                    
+                    if not valid_sheets:
+                        raise ValueError("No valid sheets found in the Excel file")
+                        
+                    logging.info(f"Successfully loaded {len(valid_sheets)} valid sheets")
+                    return valid_sheets
+                    
+                except Exception as e:
+                    last_error = e
+                    logging.warning(f"Failed to load with engine {engine}: {str(e)}")
+                    continue
+            
+            # If all engines failed, raise the last error
+            raise last_error if last_error else Exception("Failed to load Excel file with any available engine")
+            
+        except Exception as e:
+            error_msg = f"Failed to load Excel file '{file_path}': {str(e)}"
+            logging.error(error_msg)
+            raise Exception(error_msg)
+
+    @staticmethod
+    def reload_changed_sheets(file_path, sheets, fingerprint):
+        """Re-parse only the sheets of file_path that changed since it was loaded.
+
+        sheets and fingerprint are the loaded sheets and their workbook_fingerprint. Returns
+        (sheets, fingerprint, reloaded names): unchanged sheets are the same DataFrame
+        objects, and every sheet is reloaded when the change cannot be narrowed down. A
+        SheetStore gives a SheetStore, with its spilled sheets carried over unloaded.
+        """
+        current = workbook_fingerprint(file_path, fingerprint)
+        changed = changed_sheets(fingerprint, current)
+        if changed is None:
+            logging.info(f"Cannot tell which sheets of {file_path} changed; reloading all of them")
+            loaded = DataHandler.load_excel_sheets(file_path)
+            return loaded, current, list(loaded)
+        reloaded = {}
+        if changed:
+            try:
+                reloaded = DataHandler.load_excel_sheets(file_path, changed)
+            except Exception as e:
+                # Also raised when every changed sheet is now empty; a full load tells the two apart
+                logging.warning(f"Reloading sheets {changed} failed ({e}); reloading the whole workbook")
+                loaded = DataHandler.load_excel_sheets(file_path)
+                return loaded, current, list(loaded)
+        merged = SheetStore(min_bytes=sheets.min_bytes) if isinstance(sheets, SheetStore) else {}
+        for name in current['sheets']:
+            if name in changed:
+                if name in reloaded:
+                    merged[name] = reloaded[name]
+            elif name in sheets:
+                if isinstance(sheets, SheetStore):
+                    merged.copy_from(sheets, name)
+                else:
+                    merged[name] = sheets[name]
+        logging.info(f"Reloaded {len(changed)} changed sheet(s) of {file_path}: {', '.join(changed) or 'none'}")
+        return merged, current, changed
+
+    @staticmethod
+    def get_preview(df, n_rows):
+        return df.head(n_rows)
+
+    @staticmethod
+    def validate_row(row, column_mappings, skip_arabic, validate_quality, arabic_pattern, sp_params):
+        formatted_params = {}
+        skip_row = False
+        stats = {'skipped_arabic': 0, 'skipped_invalid_value': 0, 'skipped_empty': 0}
+        
+        for sp_param, excel_col in column_mappings.items():
+            value = getattr(row, excel_col)
+            
+            # Check for empty/null values - ONLY if validation is enabled
+            if validate_quality and (pd.isna(value) or (isinstance(value, str) and value.strip().lower() in ['nan', 'none', ''])):
+                stats['skipped_empty'] += 1
+                skip_row = True
+                break
+                
+            # Check for Arabic text - controlled by skip_arabic flag
+            if skip_arabic and isinstance(value, str) and arabic_pattern.search(str(value).strip()):
+                stats['skipped_arabic'] += 1
+                skip_row = True
+                break
+                
+            param_spec = sp_params.get(sp_param, {}) if isinstance(sp_params, dict) else {}
+
+            # Handle numeric parameters - validation controlled by validate_quality
+            if param_spec.get('type') == 'decimal':
+                try:
+                    if isinstance(value, str):
+                        clean_value = value.replace(",", "").replace("$", "").replace("%", "").strip()
+                        
+                        # Only validate if quality validation is enabled
+                        if validate_quality and (not clean_value or clean_value.lower() in ['n/a', 'na', 'null', 'none']):
+                            stats['skipped_invalid_value'] += 1
+                            skip_row = True
+                            break
+                            
+                        numeric_value = float(clean_value)
+                    else:
+                        numeric_value = float(value)
+                        
+                    # Validate range - ONLY if validation is enabled
+                    if validate_quality and numeric_value < 0 and param_spec.get('non_negative'):
+                        logging.debug(f"Negative value detected for {sp_param}: {numeric_value}")
+                        stats['skipped_invalid_value'] += 1
+                        skip_row = True
+                        break
+                        
+                    formatted_params[sp_param] = numeric_value
+                    
+                except (ValueError, AttributeError, TypeError) as e:
+                    # Only skip on error if validation is enabled
+                    if validate_quality:
+                        logging.debug(f"Invalid numeric value for {sp_param}: '{value}' - {str(e)}")
+                        stats['skipped_invalid_value'] += 1
+                        skip_row = True
+                        break
+                    else:
+                        # If validation disabled, use string representation or default value
+                        formatted_params[sp_param] = str(value) if value is not None else '0'
+                        
+            # Handle string parameters
+            else:
+                str_value = str(value).strip().replace("'", "''")
+                formatted_params[sp_param] = str_value
+                
+        return skip_row, formatted_params, stats
+    
+    @staticmethod
+    def validate_cell(value, sp_param, param_spec, skip_arabic, validate_quality, arabic_pattern):
+        """Check and format one mapped value.
+
+        Returns (formatted_value, log_entry, counter): log_entry is None or the (reason,
+        details, value) to log as a skipped row, and counter names the skip counter when the
+        row must be skipped (None keeps it, possibly with a logged conversion warning).
+        """
+        # Check for empty/null values
+        if validate_quality and (pd.isna(value) or (isinstance(value, str) and value.strip().lower() in ['nan', 'none', ''])):
+            return None, ("EMPTY_VALUE", f"Empty/null value in parameter '{sp_param}'", value), 'skipped_empty'
+
+        # Check for Arabic text
+        if skip_arabic and isinstance(value, str) and arabic_pattern.search(str(value).strip()):
+            return None, ("ARABIC_TEXT", f"Arabic text found in parameter '{sp_param}'", value), 'skipped_arabic'
+
+        # Handle numeric parameters
+        if param_spec.get('type') == 'decimal':
+            try:
+                if isinstance(value, str):
+                    clean_value = value.replace(",", "").replace("$", "").replace("%", "").strip()
+                    if validate_quality and (not clean_value or clean_value.lower() in ['n/a', 'na', 'null', 'none']):
+                        return None, ("INVALID_NUMERIC", f"Invalid numeric value for '{sp_param}'", value), 'skipped_invalid_value'
+                    numeric_value = float(clean_value)
+                else:
+                    numeric_value = float(value)
+
+                # Validate range
+                if validate_quality and numeric_value < 0 and param_spec.get('non_negative'):
+                    return None, ("NEGATIVE_VALUE", f"Negative value for '{sp_param}': {numeric_value}", value), 'skipped_invalid_value'
+
+                return numeric_value, None, None
+
+            except (ValueError, AttributeError, TypeError) as e:
+                entry = ("NUMERIC_CONVERSION_ERROR", f"Failed to convert '{sp_param}' to number: {str(e)}", value)
+                if validate_quality:
+                    return None, entry, 'skipped_invalid_value'
+                return str(value) if value is not None else '0', entry, None
+
+        # Handle string parameters
+        try:
+            return str(value).strip().replace("'", "''"), None, None
+        except Exception as e:
+            entry = ("STRING_CONVERSION_ERROR", f"Failed to convert '{sp_param}' to string: {str(e)}", value)
+            if validate_quality:
+                return None, entry, 'skipped_invalid_value'
+            return str(value) if value is not None else '', entry, None
+
+    @staticmethod
+    def validate_row_by_index(row, column_indices, skip_arabic, validate_quality, arabic_pattern, sp_params, row_number=0,
+                              logger=None, memo=None):
+        """Validate row using column indices with enhanced error handling and logging.
+
+        memo (a dict, fresh for each row) shares validate_cell results between several
+        templates validating the same row: a parameter mapped to the same column with the
+        same rules is checked once.
+        """
+        formatted_params = {}
+        skip_row = False
+        stats = {'skipped_arabic': 0, 'skipped_invalid_value': 0, 'skipped_empty': 0}
+        
+        try:
+            for sp_param, col_index in column_indices.items():
+                try:
+                    # Safe access to row data with bounds checking
+                    if col_index >= len(row):
+                        if logger:
+                            logger.log_skipped_row(row_number, "COLUMN_INDEX_ERROR", 
+                                                f"Column index {col_index} out of bounds for parameter '{sp_param}'")
+                        stats['skipped_invalid_value'] += 1
+                        skip_row = True
+                        break
+                        
+                    value = row[col_index]
+                    # Parameter types come from the template registry
+                    param_spec = sp_params.get(sp_param, {}) if isinstance(sp_params, dict) else {}
+
+                    if memo is None:
+                        outcome = DataHandler.validate_cell(value, sp_param, param_spec, skip_arabic, validate_quality, arabic_pattern)
+                    else:
+                        memo_key = (sp_param, col_index, param_spec.get('type'), bool(param_spec.get('non_negative')))
+                        outcome = memo.get(memo_key)
+                        if outcome is None:
+                            outcome = memo[memo_key] = DataHandler.validate_cell(
+                                value, sp_param, param_spec, skip_arabic, validate_quality, arabic_pattern)
+                    formatted_value, entry, counter = outcome
+                    if entry and logger:
+                        logger.log_skipped_row(row_number, *entry)
+                    if counter:
+                        stats[counter] += 1
+                        skip_row = True
+                        break
+                    formatted_params[sp_param] = formatted_value
+                            
+                except Exception as e:
+                    if logger:
+                        logger.log_skipped_row(row_number, "PARAMETER_PROCESSING_ERROR", 
+                                            f"Error processing parameter '{sp_param}': {str(e)}", 
+                                            str(value) if 'value' in locals() else 'N/A')
+                    logging.error(f"Error processing parameter '{sp_param}' in row {row_number}: {e}")
+                    if validate_quality:
+                        stats['skipped_invalid_value'] += 1
+                        skip_row = True
+                        break
+                        
+        except Exception as e:
+            if logger:
+                logger.log_skipped_row(row_number, "ROW_PROCESSING_ERROR", 
+                                    f"Critical error processing row: {str(e)}")
+            logging.error(f"Critical error processing row {row_number}: {e}")
+            stats['skipped_invalid_value'] += 1
+            skip_row = True
+            
+        return skip_row, formatted_params, stats
+
+    @staticmethod
+    def validate_dataframe(df, column_mappings, parameter_specs, skip_arabic, validate_quality,
+                           on_progress=None, should_stop=None, max_errors=100, resume=None, on_checkpoint=None):
+        """Run validate_row_by_index over every row of a sheet.
+
+        Returns a dict with the valid rows stored column-wise: 'row_numbers' (int64 array),
+        'columns' (parameter -> float64 array for decimals, list otherwise) and 'skip_mask'
+        (bool array over all sheet rows), plus the skip counters, 'error_count',
+        'skipped_rows' (SkippedRowLogger entries) and 'rows_per_second'. Returns None if
+        should_stop() requested cancellation. on_progress(row_number, processed_count,
+        error_count, snapshot) is called a few times per second. Raises ValueError for
+        unknown columns or too many row errors.
+
+        resume (see RunCheckpoint.load) continues an interrupted pass at its 'next_row' with
+        the rows validated before it; on_checkpoint(next_row, progress) receives the same
+        shape of progress alongside on_progress, for saving it.
+        """
+        results = DataHandler.validate_dataframe_many(
+            df, [(column_mappings, parameter_specs)], skip_arabic, validate_quality, on_progress, should_stop, max_errors,
+            resume=None if resume is None else [resume],
+            on_checkpoint=None if on_checkpoint is None else lambda next_row, progress: on_checkpoint(next_row, progress[0])
+        )
+        return None if results is None else results[0]
+
+    @staticmethod
+    def validate_dataframe_many(df, requests, skip_arabic, validate_quality, on_progress=None, should_stop=None,
+                                max_errors=100, resume=None, on_checkpoint=None):
+        """validate_dataframe for several (column_mappings, parameter_specs) requests in one pass.
+
+        The sheet is iterated once and cells shared between requests are validated once per
+        row (see validate_row_by_index). Returns one validate_dataframe result per request, in
+        order, or None if cancelled; on_progress counts are summed over the requests. resume
+        and on_checkpoint progress are lists with one entry per request.
+        """
+        arabic_pattern = re.compile(r'[\u0600-\u06FF]')
+        total_rows = len(df)
+        df_columns = list(df.columns)
+        start_row = resume[0]['next_row'] if resume else 1
+        states = []
+        for position, (column_mappings, parameter_specs) in enumerate(requests):
+            # Convert column names to indices
+            column_indices = {}
+            for sp_param, excel_col in column_mappings.items():
+                if excel_col not in df_columns:
+                    raise ValueError(f"Column '{excel_col}' not found in DataFrame. Available columns: {df_columns}")
+                column_indices[sp_param] = df_columns.index(excel_col)
+            state = {
+                'column_indices': column_indices,
+                'parameter_specs': parameter_specs,
+                'logger': SkippedRowLogger(),
+                'counters': {'skipped_arabic': 0, 'skipped_invalid_value': 0, 'skipped_empty': 0},
+                'row_numbers': [],
+                'columns': {sp_param: [] for sp_param in column_indices},
+                'skip_mask': np.zeros(total_rows, dtype=bool),
+                'error_count': 0,
+            }
+            if resume:
+                seed = resume[position]
+                state['logger'].skipped_rows = list(seed['skipped_rows'])
+                state['counters'].update(seed['counters'])
+                state['row_numbers'] = list(seed['row_numbers'])
+                state['columns'] = {sp_param: list(seed['columns'].get(sp_param, [])) for sp_param in column_indices}
+                state['error_count'] = seed['error_count']
+                # Rows before start_row that were not kept were skipped
+                state['skip_mask'][:start_row - 1] = True
+                state['skip_mask'][np.array(state['row_numbers'], dtype=np.int64) - 1] = False
+            states.append(state)
+        shared = len(states) > 1
+        reporter = ProgressReporter(total_rows)
+
+        def progress():
+            return [{'row_numbers': state['row_numbers'], 'columns': state['columns'],
+                     'skipped_rows': state['logger'].skipped_rows, 'counters': state['counters'],
+                     'error_count': state['error_count']} for state in states]
+
+        # Use itertuples for performance but with error handling
+        rows = df.iloc[start_row - 1:] if start_row > 1 else df
+        for idx, row in enumerate(rows.itertuples(index=False), start_row):
+            # Progress is coalesced by time so callers are not flooded with updates
+            snapshot = reporter.update(idx)
+            if snapshot:
+                if should_stop and should_stop():
+                    return None
+                if on_progress:
+                    on_progress(idx, sum(len(state['row_numbers']) for state in states),
+                                sum(state['error_count'] for state in states), snapshot)
+                if on_checkpoint:
+                    # Rows before idx are complete
+                    on_checkpoint(idx, progress())
+            memo = {} if shared else None
+            for state in states:
+                try:
+                    skip_row, formatted_params, row_stats = DataHandler.validate_row_by_index(
+                        row, state['column_indices'], skip_arabic, validate_quality,
+                        arabic_pattern, state['parameter_specs'], row_number=idx, logger=state['logger'], memo=memo
+                    )
+
+                    counters = state['counters']
+                    counters['skipped_arabic'] += row_stats['skipped_arabic']
+                    counters['skipped_invalid_value'] += row_stats['skipped_invalid_value']
+                    counters['skipped_empty'] += row_stats['skipped_empty']
+
+                    if skip_row:
+                        state['skip_mask'][idx - 1] = True
+                        continue
+                    for sp_param, values in state['columns'].items():
+                        values.append(formatted_params[sp_param])
+                    state['row_numbers'].append(idx)
+
+                except Exception as e:
+                    state['skip_mask'][idx - 1] = True
+                    state['logger'].log_skipped_row(idx, "ROW_PROCESSING_CRITICAL_ERROR",
+                                                    f"Critical error processing row: {str(e)}")
+                    state['error_count'] += 1
+                    logging.error(f"Critical error processing row {idx}: {e}")
+
+                    # Stop processing if too many errors
+                    if state['error_count'] >= max_errors:
+                        raise ValueError(f"Too many errors ({state['error_count']}). Stopping processing to prevent system issues.")
+
+        rows_per_second = reporter.snapshot(total_rows)['rows_per_second']
+        results = []
+        for state in states:
+            columns = state['columns']
+            # Store all-float decimal columns as float64 arrays; they are 8 bytes per value
+            for sp_param, values in columns.items():
+                if state['parameter_specs'].get(sp_param, {}).get('type') == 'decimal' and all(type(v) is float for v in values):
+                    columns[sp_param] = np.array(values, dtype=np.float64)
+            results.append({
+                **state['counters'],
+                'row_numbers': np.array(state['row_numbers'], dtype=np.int64),
+                'columns': columns,
+                'skip_mask': state['skip_mask'],
+                'error_count': state['error_count'],
+                'skipped_rows': state['logger'].skipped_rows,
+                'rows_per_second': rows_per_second,
+            })
+        return results
+
+    @staticmethod
+    def deduplicate_rows(row_numbers, keys, policy, logger=None, key_param='item'):
+        """Find validated rows that share the same key value (e.g. the item number).
+
+        row_numbers and keys are parallel sequences in sheet order. policy is 'first' (keep
+        the first occurrence) or 'last' (keep the last occurrence); any other value keeps
+        every row. Keys are matched through a pandas hash table, case-insensitively like the
+        SQL Server collation. Returns (positions_to_keep, dropped_count); positions are in
+        sheet order.
+        """
+        if policy not in ('first', 'last') or keys is None or not len(keys):
+            return np.arange(len(row_numbers)), 0
+
+        normalized = pd.Series(keys, dtype=object).astype(str).str.strip().str.upper()
+        duplicated = normalized.duplicated(keep=policy).to_numpy()
+        dropped_positions = np.flatnonzero(duplicated)
+
+        if logger and len(dropped_positions):
+            # Position of the surviving row for every key
+            winners = pd.Series(np.arange(len(normalized))).groupby(normalized.to_numpy(), sort=False).transform(policy)
+            winners = winners.to_numpy()
+            for position in dropped_positions:
+                kept_row = int(row_numbers[winners[position]])
+                logger.log_skipped_row(int(row_numbers[position]), "DUPLICATE_KEY",
+                                       f"Duplicate '{key_param}', kept row {kept_row + 1} ({policy} wins)",
+                                       keys[position])
+
+        return np.flatnonzero(~duplicated), len(dropped_positions)
+
+    @staticmethod
+    def render_statements(result, positions, render_sql, parameters, logger=None):
+        """Render the validated rows at `positions` with a compiled template.
+
+        Returns (sql_lines, error_count); rows that fail to format are logged as
+        SQL_FORMATTING_ERROR and left out.
+        """
+        sql_lines = []
+        error_count = 0
+        for _, sql in DataHandler.iter_statements(result, positions, render_sql, parameters, logger):
+            if sql is None:
+                error_count += 1
+            else:
+                sql_lines.append(sql)
+        return sql_lines, error_count
+
+    @staticmethod
+    def iter_statements(result, positions, render_sql, parameters, logger=None, chunk_rows=50000):
+        """Lazily render validated rows, yielding (row_number, sql) in `positions` order.
+
+        Values are passed column-wise to render_sql (see TemplateRegistry.get_renderer), a
+        chunk of rows at a time, so no per-row dict or full statement list is built. Rows
+        that fail to format are logged as SQL_FORMATTING_ERROR and yielded with sql None.
+        """
+        columns = result['columns']
+        row_numbers = result['row_numbers']
+        for start in range(0, len(positions), chunk_rows):
+            chunk = positions[start:start + chunk_rows]
+            args = []
+            for param in parameters:
+                values = columns[param]
+                if isinstance(values, np.ndarray):
+                    values = values[chunk].tolist()
+                else:
+                    values = [values[i] for i in chunk]
+                args.append(values)
+            chunk_rows_numbers = row_numbers[chunk].tolist()
+
+            try:
+                rendered = list(map(render_sql, *args))
+            except Exception:
+                rendered = None
+            if rendered is not None:
+                yield from zip(chunk_rows_numbers, rendered)
+                continue
+
+            # Some values cannot be formatted (e.g. text in a decimal column with validation off)
+            for row_number, values in zip(chunk_rows_numbers, zip(*args)):
+                try:
+                    yield row_number, render_sql(*values)
+                except Exception as e:
+                    if logger:
+                        logger.log_skipped_row(row_number, "SQL_FORMATTING_ERROR", f"Error formatting SQL: {str(e)}")
+                    yield row_number, None
+
+    @staticmethod
+    def filter_unknown_items(result, item_index, key_param='item', logger=None):
+        """Drop validated rows whose key is not in an ItemMasterIndex.
+
+        Returns a new validation result (the given one may be cached and is not modified)
+        with the rows removed from 'row_numbers' and 'columns', set in 'skip_mask', and
+        counted in 'skipped_unknown_item'. Dropped rows are logged as UNKNOWN_ITEM.
+        """
+        keys = result['columns'].get(key_param)
+        filtered = dict(result, skipped_unknown_item=0)
+        if item_index is None or keys is None or not len(keys):
+            return filtered
+        # Validated string values are SQL-escaped (' doubled); look up the value as it is in the sheet
+        raw_keys = [key.replace("''", "'") if isinstance(key, str) else key for key in keys]
+        known = item_index.contains(raw_keys)
+        unknown_positions = np.flatnonzero(~known)
+        if not len(unknown_positions):
+            return filtered
+
+        if logger:
+            for position in unknown_positions:
+                logger.log_skipped_row(int(result['row_numbers'][position]), "UNKNOWN_ITEM",
+                                       f"'{key_param}' is not in the item master", raw_keys[position])
+        kept = np.flatnonzero(known)
+        filtered['row_numbers'] = result['row_numbers'][kept]
+        filtered['columns'] = {
+            param: values[kept] if isinstance(values, np.ndarray) else [values[i] for i in kept]
+            for param, values in result['columns'].items()
+        }
+        skip_mask = result['skip_mask'].copy()
+        skip_mask[result['row_numbers'][unknown_positions] - 1] = True
+        filtered['skip_mask'] = skip_mask
+        filtered['skipped_unknown_item'] = len(unknown_positions)
+        return filtered
+
+    @staticmethod
+    def classify_rows(df, column_mappings=None, parameter_specs=None, skip_arabic=True, validate_quality=True):
+        """Vectorized whole-sheet check of the rows the generator would skip.
+
+        Returns sorted int32 arrays of row positions: 'empty' (missing values), 'arabic'
+        (Arabic text), 'invalid' (unparseable or negative numbers) and 'issues' (all of them).
+        Each row is counted under its first category in that order. Without column mappings
+        every column is checked as text.
+        """
+        parameter_specs = parameter_specs or {}
+        if column_mappings:
+            checks = [(df[col], parameter_specs.get(param, {}))
+                      for param, col in column_mappings.items() if col in df.columns]
+        else:
+            checks = [(df.iloc[:, i], {}) for i in range(df.shape[1])]
+
+        row_count = len(df)
+        empty = np.zeros(row_count, dtype=bool)
+        arabic = np.zeros(row_count, dtype=bool)
+        invalid = np.zeros(row_count, dtype=bool)
+
+        for column, spec in checks:
+            is_text = column.dtype == object or pd.api.types.is_string_dtype(column.dtype)
+            text = column.astype(str).str.strip() if is_text else None
+            missing = column.isna().to_numpy(copy=True)
+            if is_text:
+                missing |= text.str.lower().isin(['nan', 'none', '']).to_numpy()
+
+            if validate_quality:
+                empty |= missing
+            if skip_arabic and is_text:
+                arabic |= text.str.contains(r'[\u0600-\u06FF]', regex=True).to_numpy(dtype=bool)
+            if validate_quality and spec.get('type') == 'decimal':
+                if is_text:
+                    numeric = pd.to_numeric(text.str.replace(r'[,$%]', '', regex=True).str.strip(), errors='coerce')
+                else:
+                    numeric = pd.to_numeric(column, errors='coerce')
+                bad = numeric.isna().to_numpy() & ~missing
+                if spec.get('non_negative'):
+                    bad |= (numeric < 0).to_numpy()
+                invalid |= bad
+
+        arabic &= ~empty
+        invalid &= ~(empty | arabic)
+        return {
+            'empty': np.flatnonzero(empty).astype(np.int32),
+            'arabic': np.flatnonzero(arabic).astype(np.int32),
+            'invalid': np.flatnonzero(invalid).astype(np.int32),
+            'issues': np.flatnonzero(empty | arabic | invalid).astype(np.int32),
+        }
+
+    @staticmethod
+    def profile_column(column):
+        """Whole-column statistics used for mapping checks and auto-mapping.
+
+        Returns a dict with 'rows', 'null_count', 'non_null', 'inferred_type' ('empty',
+        'numeric', 'datetime', 'text' or 'mixed'), 'numeric_count', 'numeric_rate' (share of
+        non-null values that parse as numbers, using the generator's cleaning rules),
+        'negative_count', 'arabic_count', 'distinct_count', 'min', 'max' and up to three
+        'non_numeric_examples'.
+        """
+        missing = column.isna().to_numpy(copy=True)
+        is_datetime = pd.api.types.is_datetime64_any_dtype(column.dtype)
+        if column.dtype == object or pd.api.types.is_string_dtype(column.dtype):
+            # Only real strings need text handling; numbers stored in object columns parse directly
+            is_string = column.map(type).eq(str).to_numpy()
+            strings = column[is_string].str.strip()
+            missing[is_string] |= strings.str.lower().isin(['nan', 'none', '']).to_numpy()
+            strings = strings[~missing[is_string]]
+            numeric = pd.Series(np.nan, index=column.index)
+            others = ~is_string & ~missing
+            if others.any():
+                numeric[others] = pd.to_numeric(column[others], errors='coerce')
+            candidates = strings[strings.str.fullmatch(r'[\d\s.,$%+\-eE]+').to_numpy(dtype=bool)]
+            if len(candidates):
+                cleaned = candidates.str.replace(r'[,$%]', '', regex=True).str.strip()
+                numeric[candidates.index] = pd.to_numeric(cleaned, errors='coerce')
+            numeric = numeric[~missing]
+            arabic_count = int(strings.str.contains(r'[\u0600-\u06FF]', regex=True).sum())
+        else:
+            strings = column.iloc[:0]
+            numeric = column.iloc[:0] if is_datetime else pd.to_numeric(column[~missing], errors='coerce')
+            arabic_count = 0
+        present = column[~missing]
+
+        non_null = len(present)
+        numeric_count = int(numeric.notna().sum())
+        if non_null == 0:
+            inferred_type = 'empty'
+        elif is_datetime:
+            inferred_type = 'datetime'
+        elif numeric_count == non_null:
+            inferred_type = 'numeric'
+        elif numeric_count == 0:
+            inferred_type = 'text'
+        else:
+            inferred_type = 'mixed'
+
+        if numeric_count:
+            low, high = numeric.min(), numeric.max()
+        elif len(strings):
+            low, high = strings.min(), strings.max()
+        elif non_null:
+            low, high = present.min(), present.max()
+        else:
+            low = high = None
+        non_numeric = present[numeric.isna().to_numpy()] if inferred_type in ('text', 'mixed') else present.iloc[:0]
+        return {
+            'rows': len(column),
+            'null_count': int(len(column) - non_null),
+            'non_null': non_null,
+            'inferred_type': inferred_type,
+            'numeric_count': numeric_count,
+            'numeric_rate': numeric_count / non_null if non_null else 0.0,
+            'negative_count': int((numeric < 0).sum()) if numeric_count else 0,
+            'arabic_count': arabic_count,
+            'distinct_count': int(present.nunique()),
+            'min': None if low is None else (low.item() if hasattr(low, 'item') else low),
+            'max': None if high is None else (high.item() if hasattr(high, 'item') else high),
+            'non_numeric_examples': [str(value)[:20] for value in non_numeric.head(3)],
+        }
+
+    @staticmethod
+    def profile_sheet(df):
+        """profile_column for every column, keyed by the column name as shown in the UI"""
+        return {str(df.columns[i]): DataHandler.profile_column(df.iloc[:, i]) for i in range(df.shape[1])}
+
+    @staticmethod
+    def suggest_column_mappings(parameters, parameter_specs, columns, profiles=None):
+        """Guess a column for each template parameter from column names and profiles.
+
+        A column is a candidate when its name matches the parameter (exactly, ignoring case
+        and punctuation, or one containing the other). Among candidates, columns whose
+        profile fits the parameter type win; a decimal parameter is never matched by
+        partial name to a mostly non-numeric column. Each column is suggested at most once.
+        """
+        def normalize(name):
+            return re.sub(r'[^0-9a-z]', '', str(name).lower())
+
+        profiles = profiles or {}
+        suggestions = {}
+        for param in parameters:
+            wanted = normalize(param)
+            is_decimal = parameter_specs.get(param, {}).get('type') == 'decimal'
+            best = None
+            for position, column in enumerate(columns):
+                if column in suggestions.values():
+                    continue
+                name = normalize(column)
+                if str(column).lower() == param.lower():
+                    score = 3
+                elif name and name == wanted:
+                    score = 2
+                elif len(name) > 1 and len(wanted) > 1 and (name in wanted or wanted in name):
+                    score = 1
+                else:
+                    continue
+                profile = profiles.get(str(column))
+                if profile is None:
+                    fit = 0.5
+                elif is_decimal:
+                    fit = profile['numeric_rate']
+                else:
+                    fit = 0.0 if profile['inferred_type'] == 'empty' else 1.0
+                if score == 1 and profile is not None and fit < 0.7:
+                    continue
+                candidate = (score, fit, -position, column)
+                if best is None or candidate > best:
+                    best = candidate
+            if best is not None:
+                suggestions[param] = best[3]
+        return suggestions
+
+
+# --- Workbook fingerprints: per-sheet hashes for reloading only the changed sheets (no UI code) ---
+WORKBOOK_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/officeDocument/2006/relationships',
+    'pkg': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+
+
+def _member_sha256(workbook, name, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with workbook.open(name) as member:
+        for chunk in iter(lambda: member.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def workbook_fingerprint(file_path, previous=None):
+    """Hashes of the xlsx/xlsm parts that the parsed sheets depend on.
+
+    Returns {'sheets': sheet name -> SHA-256 of its worksheet XML (workbook order),
+    'styles': (1904 date system, SHA-256 of styles.xml), 'strings': (byte length, SHA-256)
+    of the shared string items}, or None for other formats and unreadable files. With the
+    fingerprint of an earlier version as previous, 'strings_appended' tells whether its
+    shared strings are still there unchanged (Excel appends new strings at the end).
+    """
+    try:
+        with zipfile.ZipFile(file_path) as workbook:
+            members = set(workbook.namelist())
+            book = ElementTree.fromstring(workbook.read('xl/workbook.xml'))
+            relationships = ElementTree.fromstring(workbook.read('xl/_rels/workbook.xml.rels'))
+            targets = {rel.get('Id'): rel.get('Target', '')
+                       for rel in relationships.iterfind('pkg:Relationship', WORKBOOK_NS)}
+            sheets = {}
+            for sheet in book.iterfind('main:sheets/main:sheet', WORKBOOK_NS):
+                target = targets.get(sheet.get(f"{{{WORKBOOK_NS['rel']}}}id"), '')
+                member = target.lstrip('/') if target.startswith('/') else 'xl/' + target
+                sheets[sheet.get('name')] = _member_sha256(workbook, member) if member in members else None
+            # Parsed dates depend on the date system and the cells' number formats
+            properties = book.find('main:workbookPr', WORKBOOK_NS)
+            date1904 = properties is not None and properties.get('date1904') in ('1', 'true')
+            styles = _member_sha256(workbook, 'xl/styles.xml') if 'xl/styles.xml' in members else None
+            items = b''
+            if 'xl/sharedStrings.xml' in members:
+                data = workbook.read('xl/sharedStrings.xml')
+                start = data.find(b'<si')
+                if start != -1:
+                    items = data[start:data.rfind(b'</sst>')]
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return None
+
+    fingerprint = {'sheets': sheets, 'styles': (date1904, styles),
+                   'strings': (len(items), hashlib.sha256(items).hexdigest())}
+    if previous:
+        old_length, old_hash = previous['strings']
+        fingerprint['strings_appended'] = (
+            len(items) >= old_length and items[old_length:old_length + 3] in (b'', b'<si')
+            and hashlib.sha256(items[:old_length]).hexdigest() == old_hash
+        )
+    return fingerprint
+
+
+def changed_sheets(previous, current):
+    """Sheets of current whose values may differ from previous, in workbook order.
+
+    Returns None when every sheet has to be re-parsed: no fingerprint for either version,
+    changed styles or date system, or shared strings that were rewritten rather than appended.
+    current must come from workbook_fingerprint(path, previous).
+    """
+    if not previous or not current or previous['styles'] != current['styles']:
+        return None
+    if current['strings'] != previous['strings'] and not current.get('strings_appended'):
+        return None
+    return [name for name, digest in current['sheets'].items()
+            if digest is None or previous['sheets'].get(name) != digest]
+
+
+# --- ItemMasterIndex: known item numbers for pre-validating item keys (no UI code) ---
+class ItemMasterIndex:
+    """Sorted array of normalized item numbers from an item-master export, cached on disk.
+
+    Sources: CSV, Parquet (needs pyarrow) or a SQLite database table (.db/.sqlite/.sqlite3).
+    Item numbers are stripped and upper-cased like the SQL Server collation, UTF-8 encoded
+    and stored as one fixed-width bytes array, so a multi-million-item master takes about
+    its raw text size. The array is saved as .npy in the cache directory and memory-mapped
+    on later loads until the source file changes. Lookups are vectorized binary searches.
+    """
+
+    DEFAULT_COLUMN = 'ITEMNMBR'
+    DEFAULT_TABLE = 'IV00101'
+    SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+    def __init__(self, keys, source_path="", column=DEFAULT_COLUMN, fingerprint=None):
+        self.keys = keys
+        self.source_path = source_path
+        self.column = column
+        # Source path, size and mtime as hashed for the cache key; None for an index built from values
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.keys)
+
+    @staticmethod
+    def default_cache_dir():
+        return os.path.join(os.path.expanduser('~'), '.excel_to_sql', 'item_index')
+
+    def signature(self):
+        """Identifies the item master's contents: the source fingerprint, or a hash of the keys"""
+        if self.fingerprint is None:
+            self.fingerprint = hashlib.sha256(np.ascontiguousarray(self.keys).tobytes()).hexdigest()
+        return self.fingerprint
+
+    @staticmethod
+    def normalize(values):
+        """Item numbers as stripped, upper-cased UTF-8 bytes (an object array)"""
+        normalized = pd.Series(values, dtype=object).dropna().astype(str).str.strip().str.upper()
+        return normalized[normalized != ''].str.encode('utf-8').to_numpy()
+
+    @classmethod
+    def build(cls, values, source_path="", column=DEFAULT_COLUMN):
+        encoded = cls.normalize(values)
+        width = max((len(value) for value in encoded), default=1)
+        keys = np.array(encoded, dtype=f'S{width}')
+        # In-place sort plus an adjacent-duplicate drop is several times faster than np.unique
+        keys.sort()
+        if len(keys) > 1:
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        return cls(keys, source_path, column)
+
+    @classmethod
+    def read_source(cls, path, column=None, table=None):
+        """Item numbers from a CSV, Parquet or SQLite item master"""
+        lower = path.lower()
+        if lower.endswith(cls.SQLITE_EXTENSIONS):
+            table = table or cls.DEFAULT_TABLE
+            column = column or cls.DEFAULT_COLUMN
+            connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                rows = connection.execute(f'SELECT "{column}" FROM "{table}"').fetchall()
+            finally:
+                connection.close()
+            return [row[0] for row in rows], column
+        if lower.endswith('.parquet'):
+            frame = pd.read_parquet(path, columns=[column] if column else None)
+        elif lower.endswith(('.csv', '.txt')):
+            frame = pd.read_csv(path, dtype=str, usecols=[column] if column else None, keep_default_na=False)
+        else:
+            raise ValueError(f"Unsupported item master format: {os.path.basename(path)} (use CSV, Parquet or SQLite)")
+        if column is None:
+            column = cls.DEFAULT_COLUMN if cls.DEFAULT_COLUMN in frame.columns else frame.columns[0]
+        if column not in frame.columns:
+            raise ValueError(f"Column '{column}' not found in {os.path.basename(path)}")
+        return frame[column].to_numpy(), column
+
+    @classmethod
+    def load(cls, path, column=None, table=None, cache_dir=None):
+        """Index for an item master, from the disk cache when the source has not changed"""
+        stat = os.stat(path)
+        cache_dir = cache_dir or cls.default_cache_dir()
+        fingerprint = json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns, column, table])
+        fingerprint = hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+        cache_path = os.path.join(cache_dir, fingerprint[:32] + '.npy')
+        if os.path.exists(cache_path):
+            try:
+                keys = np.lib.format.open_memmap(cache_path, mode='r')
+                logging.info(f"Loaded item master index for {path} from cache ({len(keys):,} items)")
+                return cls(keys, path, column or cls.DEFAULT_COLUMN, fingerprint)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Ignoring unreadable item master cache {cache_path}: {e}")
+
+        started = time.perf_counter()
+        values, column = cls.read_source(path, column, table)
+        index = cls.build(values, path, column)
+        index.fingerprint = fingerprint
+        logging.info(f"Indexed {len(index):,} items from {path} in {time.perf_counter() - started:.2f}s")
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            temporary_path = cache_path + '.tmp.npy'
+            np.save(temporary_path, index.keys)
+            os.replace(temporary_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not cache the item master index: {e}")
+        return index
+
+    def contains(self, values):
+        """Bool array: which values are known item numbers"""
+        encoded = pd.Series(values, dtype=object).astype(str).str.strip().str.upper().str.encode('utf-8')
+        encoded = np.array(encoded.to_numpy(), dtype=bytes)
+        width = self.keys.dtype.itemsize
+        # Longer values cannot be in the index, and casting would truncate them into false matches
+        fits = np.char.str_len(encoded) <= width if encoded.dtype.itemsize > width else np.ones(len(encoded), dtype=bool)
+        found = np.zeros(len(encoded), dtype=bool)
+        if not len(self.keys) or not fits.any():
+            return found
+        candidates = encoded[fits].astype(self.keys.dtype)
+        positions = np.minimum(np.searchsorted(self.keys, candidates), len(self.keys) - 1)
+        found[fits] = self.keys[positions] == candidates
+        return found
+
+
+# --- ValidationCache: Reusable validation results (no UI code) ---
+class ValidationCache:
+    """LRU cache of DataHandler.validate_dataframe results bounded by their estimated memory.
+
+    Keys cover everything validation depends on (sheet, column mappings, parameter rules and
+    the skip-Arabic/validate-quality flags) but not the output path or run-level template
+    flags, so those changes only re-render.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (result, estimated bytes)
+
+    @staticmethod
+    def make_key(sheet_name, df, column_mappings, parameter_specs, skip_arabic, validate_quality):
+        parameter_rules = tuple(sorted(
+            (param, spec.get('type', 'string'), bool(spec.get('non_negative')))
+            for param, spec in parameter_specs.items() if param in column_mappings
+        ))
+        return (sheet_name, id(df), len(df), tuple(sorted(column_mappings.items())), parameter_rules,
+                bool(skip_arabic), bool(validate_quality))
+
+    @staticmethod
+    def estimate_bytes(result):
+        size = result['row_numbers'].nbytes + result['skip_mask'].nbytes
+        for values in result['columns'].values():
+            if isinstance(values, np.ndarray):
+                size += values.nbytes
+            elif values:
+                sample = values[:1000]
+                size += sys.getsizeof(values) + sum(sys.getsizeof(v) for v in sample) * len(values) // len(sample)
+        # Skipped row entries are small dicts of short strings
+        size += 500 * len(result['skipped_rows'])
+        return size
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, result):
+        size = self.estimate_bytes(result)
+        if key in self._entries:
+            self.total_bytes -= self._entries.pop(key)[1]
+        if size > self.max_bytes:
+            logging.info(f"Validation result ({size / 1e6:.1f} MB) exceeds the cache limit, not cached")
+            return
+        self._entries[key] = (result, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
+
+    def discard_sheets(self, sheet_names):
+        """Drop the results for these sheets, e.g. after they were reloaded"""
+        for key in [key for key in self._entries if key[0] in sheet_names]:
+            self.total_bytes -= self._entries.pop(key)[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# --- RunHistory: conversion runs kept in a local SQLite database (no UI code) ---
+def file_sha256(file_path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class RunHistory:
+    """Every conversion run with its file hash, mapping, stats and stage timings, in SQLite.
+
+    Runs are indexed by time, file and template so the History tab can filter them and chart
+    throughput for a recurring file. Safe to share between threads.
+    """
+
+    FILE_NAME = "excel_to_sql_history.sqlite3"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            file_name TEXT,
+            file_path TEXT,
+            file_hash TEXT,
+            sheet TEXT,
+            template TEXT,
+            status TEXT NOT NULL,
+            error TEXT,
+            output_path TEXT,
+            total_rows INTEGER,
+            processed_rows INTEGER,
+            processing_time REAL,
+            rows_per_second REAL,
+            peak_rss_bytes INTEGER,
+            mapping TEXT,
+            flags TEXT,
+            stats TEXT,
+            stages TEXT
+        );
+        CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at);
+        CREATE INDEX IF NOT EXISTS runs_file ON runs (file_name, started_at);
+        CREATE INDEX IF NOT EXISTS runs_file_hash ON runs (file_hash, template);
+        CREATE INDEX IF NOT EXISTS runs_template ON runs (template, started_at);
+    """
+    JSON_COLUMNS = ('mapping', 'flags', 'stats', 'stages')
+
+    def __init__(self, path=None):
+        self.path = path or self.default_path()
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.executescript(self.SCHEMA)
+
+    @classmethod
+    def default_path(cls):
+        """EXCEL_TO_SQL_HISTORY, else ~/.excel_to_sql/excel_to_sql_history.sqlite3"""
+        return os.environ.get('EXCEL_TO_SQL_HISTORY') or os.path.join(os.path.expanduser('~'), '.excel_to_sql', cls.FILE_NAME)
+
+    def record(self, file_path, sheet, template, status, stats=None, mapping=None, flags=None, file_hash=None,
+               output_path=None, error=None, started_at=None):
+        """Store one run ('success' or 'failed'); returns its id"""
+        stats = dict(stats or {})
+        stages = stats.pop('stages', {})
+        row = {
+            'started_at': started_at or datetime.now().isoformat(timespec='seconds'),
+            'file_name': os.path.basename(file_path) if file_path else None,
+            'file_path': file_path or None,
+            'file_hash': file_hash,
+            'sheet': sheet,
+            'template': template,
+            'status': status,
+            'error': error,
+            'output_path': output_path,
+            'total_rows': stats.get('total_rows'),
+            'processed_rows': stats.get('processed_rows'),
+            'processing_time': stats.get('processing_time'),
+            'rows_per_second': stats.get('rows_per_second'),
+            'peak_rss_bytes': stats.get('peak_rss_bytes'),
+            'mapping': json.dumps(mapping or {}),
+            'flags': json.dumps(flags or {}),
+            'stats': json.dumps(stats, default=str),
+            'stages': json.dumps(stages, default=str),
+        }
+        columns = ', '.join(row)
+        placeholders = ', '.join('?' for _ in row)
+        with self._lock, self._connection:
+            cursor = self._connection.execute(f"INSERT INTO runs ({columns}) VALUES ({placeholders})", list(row.values()))
+        return cursor.lastrowid
+
+    def query(self, file_name=None, template=None, status=None, since=None, file_hash=None, limit=500):
+        """Runs matching every given filter, newest first; JSON columns are decoded"""
+        conditions = []
+        values = []
+        for column, value in (('file_name', file_name), ('template', template), ('status', status),
+                              ('file_hash', file_hash)):
+            if value:
+                conditions.append(f"{column} = ?")
+                values.append(value)
+        if since:
+            conditions.append("started_at >= ?")
+            values.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT * FROM runs {where} ORDER BY started_at DESC, id DESC LIMIT ?", values + [limit]
+            ).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            for column in self.JSON_COLUMNS:
+                run[column] = json.loads(run[column]) if run[column] else {}
+            runs.append(run)
+        return runs
+
+    def distinct(self, column):
+        """Sorted distinct values of file_name, template, sheet or status"""
+        if column not in ('file_name', 'template', 'sheet', 'status'):
+            raise ValueError(f"Cannot list distinct values of '{column}'")
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT DISTINCT {column} FROM runs WHERE {column} IS NOT NULL ORDER BY {column}").fetchall()
+        return [row[0] for row in rows]
+
+    def last_mapping(self, template, file_hash=None, file_name=None):
+        """Column mapping of the latest successful run of template on the same file (by hash, then name)"""
+        for column, value in (('file_hash', file_hash), ('file_name', file_name)):
+            if not value:
+                continue
+            with self._lock:
+                row = self._connection.execute(
+                    f"SELECT mapping FROM runs WHERE {column} = ? AND template = ? AND status = 'success' "
+                    f"ORDER BY started_at DESC, id DESC LIMIT 1", (value, template)
+                ).fetchone()
+            if row:
+                return json.loads(row[0])
+        return None
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# --- RunCheckpoint: progress of long runs saved next to the output so they can resume (no UI code) ---
+CHECKPOINT_MIN_ROWS = 200000
+
+
+class RunCheckpoint:
+    """Periodic checkpoints of one generation run in the directory <output>.checkpoint.
+
+    state.pkl holds the phase ('validation' or 'rendering'), the next sheet row to validate,
+    the skip counters and, for streamed output, the rendering progress (statements consumed,
+    byte offset of the .part file and the rows skipped while rendering). Validated rows go
+    to append-only chunk files so each save only writes the rows since the last one. The
+    signature covers the source file hash, sheet, template, mapping and options; a
+    checkpoint with another signature is discarded. Files are replaced atomically, so an
+    interrupted save leaves the previous checkpoint intact.
+    """
+
+    STATE_FILE = "state.pkl"
+
+    def __init__(self, path, signature, interval=30.0):
+        self.path = path
+        self.signature = signature
+        self.interval = interval
+        self.last_saved = time.monotonic()
+        self.chunks = 0
+        self.saved_rows = 0
+        self.saved_skipped = 0
+        self.state = None
+
+    @classmethod
+    def for_run(cls, output_path, source_hash, df, sheet_name, sp_details, column_mappings, skip_arabic=True,
+                validate_quality=True, dedup_policy='last', dedup_key='item', item_index=None, interval=30.0):
+        inputs = [
+            source_hash, sheet_name, len(df), [str(column) for column in df.columns],
+            sp_details.get('sql_template'), sp_details.get('parameters'), sp_details.get('parameter_specs'),
+            list(column_mappings.items()), bool(skip_arabic), bool(validate_quality), dedup_policy, dedup_key,
+            None if item_index is None else [item_index.source_path, item_index.column, len(item_index), item_index.signature()],
+        ]
+        signature = hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        return cls(output_path + '.checkpoint', signature, interval)
+
+    def _write(self, name, data):
+        os.makedirs(self.path, exist_ok=True)
+        final_path = os.path.join(self.path, name)
+        with open(final_path + '.tmp', 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(final_path + '.tmp', final_path)
+
+    def _read(self, name):
+        with open(os.path.join(self.path, name), 'rb') as f:
+            return pickle.load(f)
+
+    def peek(self):
+        """The saved state of this run without its rows (see describe), or None"""
+        try:
+            state = self._read(self.STATE_FILE)
+        except Exception:
+            return None
+        return state if state.get('signature') == self.signature else None
+
+    def load(self):
+        """The saved progress of this run, or None (a checkpoint of another run is removed).
+
+        Returns {'phase', 'next_row', 'validation', 'render'}: 'validation' is the resume seed
+        for DataHandler.validate_dataframe and 'render' the write_statements progress or None.
+        """
+        try:
+            state = self._read(self.STATE_FILE)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            self.clear()
+            return None
+        if state.get('signature') != self.signature:
+            logging.info(f"Discarding checkpoint {self.path} of a different run")
+            self.clear()
+            return None
+
+        row_numbers = []
+        columns = {}
+        skipped_rows = []
+        try:
+            for number in range(state['chunks']):
+                chunk = self._read(f"chunk_{number:05d}.pkl")
+                row_numbers.extend(chunk['row_numbers'].tolist() if isinstance(chunk['row_numbers'], np.ndarray)
+                                   else chunk['row_numbers'])
+                for param, values in chunk['columns'].items():
+                    columns.setdefault(param, []).extend(values.tolist() if isinstance(values, np.ndarray) else values)
+                skipped_rows.extend(chunk['skipped_rows'])
+        except Exception as e:
+            logging.warning(f"Ignoring incomplete checkpoint {self.path}: {e}")
+            self.clear()
+            return None
+
+        self.state = state
+        self.chunks = state['chunks']
+        self.saved_rows = len(row_numbers)
+        self.saved_skipped = len(skipped_rows)
+        return {
+            'phase': state['phase'],
+            'next_row': state['next_row'],
+            'validation': {
+                'next_row': state['next_row'],
+                'row_numbers': row_numbers,
+                'columns': columns,
+                'skipped_rows': skipped_rows,
+                'counters': dict(state['counters']),
+                'error_count': state['error_count'],
+            },
+            'render': state.get('render'),
+        }
+
+    def due(self):
+        return time.monotonic() - self.last_saved >= self.interval
+
+    def _save_rows(self, row_numbers, columns, skipped_rows):
+        """Append the validated rows and skipped entries added since the last save as a chunk"""
+        if len(row_numbers) == self.saved_rows and len(skipped_rows) == self.saved_skipped:
+            return
+        self._write(f"chunk_{self.chunks:05d}.pkl", {
+            'row_numbers': row_numbers[self.saved_rows:],
+            'columns': {param: values[self.saved_rows:] for param, values in columns.items()},
+            'skipped_rows': skipped_rows[self.saved_skipped:],
+        })
+        self.chunks += 1
+        self.saved_rows = len(row_numbers)
+        self.saved_skipped = len(skipped_rows)
+
+    def _save_state(self, phase, next_row, counters, error_count, render=None):
+        self.state = {
+            'signature': self.signature,
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'phase': phase,
+            'next_row': next_row,
+            'chunks': self.chunks,
+            'counters': dict(counters),
+            'error_count': error_count,
+            'render': render,
+        }
+        self._write(self.STATE_FILE, self.state)
+        self.last_saved = time.monotonic()
+
+    def save_validation(self, next_row, progress):
+        """validate_dataframe on_checkpoint callback; saves when a checkpoint is due"""
+        if not self.due():
+            return
+        try:
+            self._save_rows(progress['row_numbers'], progress['columns'], progress['skipped_rows'])
+            self._save_state('validation', next_row, progress['counters'], progress['error_count'])
+        except OSError as e:
+            logging.warning(f"Could not save checkpoint {self.path}: {e}")
+
+    def finish_validation(self, result):
+        """Save a complete validation result; the run then checkpoints its rendering"""
+        counters = {counter: result[counter] for counter in ('skipped_arabic', 'skipped_invalid_value', 'skipped_empty')}
+        try:
+            self._save_rows(result['row_numbers'], result['columns'], result['skipped_rows'])
+            self._save_state('rendering', len(result['skip_mask']) + 1, counters, result['error_count'])
+        except OSError as e:
+            logging.warning(f"Could not save checkpoint {self.path}: {e}")
+
+    def save_rendering(self, progress, skipped_rows):
+        """write_statements on_checkpoint callback; skipped_rows are the entries logged while rendering"""
+        if not self.due() or not self.state or self.state['phase'] != 'rendering':
+            return
+        try:
+            self._save_state('rendering', self.state['next_row'], self.state['counters'], self.state['error_count'],
+                             {**progress, 'skipped_rows': list(skipped_rows)})
+        except OSError as e:
+            logging.warning(f"Could not save checkpoint {self.path}: {e}")
+
+    @staticmethod
+    def describe(progress):
+        """Short text for a load() or peek() result, e.g. for asking whether to resume"""
+        if progress['render']:
+            return f"{progress['render']['written']:,} statements written"
+        if progress['phase'] == 'rendering':
+            return "all rows validated"
+        return f"{progress['next_row'] - 1:,} rows validated"
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.chunks = 0
+        self.saved_rows = 0
+        self.saved_skipped = 0
+        self.state = None
+
+
+# --- Script generation: validate, de-duplicate, render and write one sheet (no UI code) ---
+class GenerationError(Exception):
+    """Generation stopped; the message is meant for the user"""
+
+
+def write_statements(path, statements, resume=None, on_checkpoint=None, checkpoint_every=10000):
+    """Write GO-separated statements from an iter_statements generator; returns (written, error_count).
+
+    Every checkpoint_every statements the file is flushed and on_checkpoint(progress) receives
+    {'consumed', 'written', 'errors', 'offset'}. Given such a progress dict as resume, the
+    file is cut back to its offset and appended to; statements must then continue after the
+    'consumed' ones.
+    """
+    consumed = written = error_count = 0
+    if resume:
+        consumed, written, error_count = resume['consumed'], resume['written'], resume['errors']
+        os.truncate(path, resume['offset'])
+    with open(path, 'a' if resume else 'w', encoding='utf-8') as f:
+        for _, sql in statements:
+            consumed += 1
+            if sql is None:
+                error_count += 1
+            else:
+                f.write(sql + '\nGO\n')
+                written += 1
+            if on_checkpoint and consumed % checkpoint_every == 0:
+                f.flush()
+                on_checkpoint({'consumed': consumed, 'written': written, 'errors': error_count, 'offset': f.tell()})
+    return written, error_count
+
+
+def write_sql_script(output_path, sql_lines, sheet_name, sp_details, error_count,
+                     skipped_log_path="excel_to_sql_skipped.txt", statement_count=None, body_path=None):
+    """Write the script header and one GO-separated batch per statement; raises GenerationError.
+
+    With body_path, the statements were already written there by write_statements
+    (statement_count of them); the file is appended after the header and removed.
+    """
+    try:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(f"-- Generated on {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+            f.write(f"-- Source Excel Sheet: {sheet_name}\n")
+            f.write(f"-- Stored Procedure/SQL Type: {sp_details.get('friendly_name', 'Unknown')}\n")
+            f.write(f"-- Total statements: {len(sql_lines) if statement_count is None else statement_count}\n")
+            f.write(f"-- Processing errors: {error_count}\n")
+            f.write(f"-- See {os.path.basename(skipped_log_path)} for skipped rows details\n\n")
+
+            for line in sql_lines:
+                f.write(line + '\nGO\n')
+            if body_path:
+                with open(body_path, 'r', encoding='utf-8') as body:
+                    shutil.copyfileobj(body, f, 1024 * 1024)
+        if body_path:
+            os.remove(body_path)
+
+    except Exception as e:
+        error_msg = f"File write error: {str(e)}"
+        logging.error(error_msg)
+        raise GenerationError(error_msg)
+
+
+def generate_sql_script(df, sheet_name, sp_details, column_mappings, output_path, skip_arabic=True,
+                        validate_quality=True, dedup_policy='last', dedup_key='item', validation_result=None,
+                        skipped_log_path="excel_to_sql_skipped.txt", on_progress=None, on_status=None,
+                        on_validated=None, should_stop=None, stages=None, memory_budget=None, stream_output=None,
+                        item_index=None, checkpoint=None):
+    """Convert one sheet into a SQL script and a skipped-rows report.
+
+    sp_details is a TemplateRegistry entry with its flags already resolved. A
+    validation_result from DataHandler.validate_dataframe is reused as-is; otherwise the
+    sheet is validated here and the result passed to on_validated(result). on_progress
+    receives the same arguments as in validate_dataframe, plus a final call with
+    snapshot None once validation is done; on_status receives status messages.
+    stages holds StageTimer entries recorded before generation (file_parse,
+    sheet_selection); stats['stages'] adds the generation stages to them.
+    With stream_output, statements are written to disk as they are rendered instead of
+    being collected, and sql_lines is empty; by default this happens when the estimated
+    memory would exceed memory_budget (bytes). With an ItemMasterIndex as item_index, rows
+    whose dedup_key value is not a known item are skipped as UNKNOWN_ITEM before dedup.
+    With a RunCheckpoint, progress is saved periodically and a saved checkpoint of the same
+    run is resumed: validation continues at the next row and streamed output after the last
+    statement written, giving the same script as an uninterrupted run. The checkpoint is
+    removed once the script is written.
+    Returns (sql_lines, stats). Raises GenerationError for invalid input, cancellation
+    (should_stop() returned True) or write failures.
+    """
+    start_time = datetime.now()
+    total_rows = len(df)
+
+    # Initialize skipped row logger
+    logger = SkippedRowLogger(skipped_log_path)
+    timer = StageTimer(stages)
+
+    stats = {
+        'total_rows': total_rows,
+        'processed_rows': 0,
+        'skipped_arabic': 0,
+        'skipped_invalid_value': 0,
+        'skipped_empty': 0,
+        'skipped_duplicate': 0,
+        'skipped_unknown_item': 0,
+        'processing_time': 0
+    }
+
+    resume = checkpoint.load() if checkpoint else None
+    if resume:
+        logging.info(f"Resuming from checkpoint {checkpoint.path} ({RunCheckpoint.describe(resume)})")
+        if on_status:
+            on_status(f"Resuming from checkpoint ({RunCheckpoint.describe(resume)})...")
+
+    result = validation_result
+    if result is None:
+        validation_started = time.perf_counter()
+        try:
+            result = DataHandler.validate_dataframe(
+                df, column_mappings, sp_details.get('parameter_specs', {}), skip_arabic, validate_quality,
+                on_progress=on_progress, should_stop=should_stop,
+                resume=resume['validation'] if resume else None,
+                on_checkpoint=checkpoint.save_validation if checkpoint else None
+            )
+        except ValueError as e:
+            logging.error(str(e))
+            raise GenerationError(str(e))
+        except Exception as e:
+            error_msg = f"Critical error during row iteration: {str(e)}\n{traceback.format_exc()}"
+            logging.error(error_msg)
+            raise GenerationError(error_msg)
+        if result is None:
+            raise GenerationError("SQL generation was cancelled.")
+        timer.record('validation', time.perf_counter() - validation_started, total_rows,
+                     **({'resumed_at_row': resume['next_row']} if resume else {}))
+        if on_validated:
+            on_validated(result)
+    else:
+        logging.info("Reusing cached validation results")
+        timer.record('validation', 0.0, total_rows, cached=True)
+    if checkpoint:
+        checkpoint.finish_validation(result)
+
+    for counter in ('skipped_arabic', 'skipped_invalid_value', 'skipped_empty'):
+        stats[counter] = result[counter]
+    error_count = result['error_count']
+    # Copy so the (possibly cached) validation result is not modified
+    logger.skipped_rows = list(result['skipped_rows'])
+
+    if on_progress:
+        on_progress(total_rows, len(result['row_numbers']), error_count, None)
+    if on_status:
+        on_status(f"Validated {total_rows:,} rows at {result['rows_per_second']:,.0f} rows/s. Writing SQL script...")
+
+    if item_index is not None:
+        with timer.measure('item_lookup', len(result['row_numbers'])):
+            result = DataHandler.filter_unknown_items(result, item_index, dedup_key, logger)
+        stats['skipped_unknown_item'] = result['skipped_unknown_item']
+        if stats['skipped_unknown_item']:
+            logging.info(f"Skipped {stats['skipped_unknown_item']} rows with items not in the item master")
+
+    # Drop duplicate keys before rendering so the script is shorter and order-independent
+    with timer.measure('dedup', len(result['row_numbers'])):
+        positions, stats['skipped_duplicate'] = DataHandler.deduplicate_rows(
+            result['row_numbers'], result['columns'].get(dedup_key), dedup_policy, logger, dedup_key
+        )
+    if stats['skipped_duplicate']:
+        logging.info(f"Dropped {stats['skipped_duplicate']} duplicate '{dedup_key}' rows ({dedup_policy} wins)")
+
+    try:
+        render_sql = TemplateRegistry.get_renderer(sp_details)
+    except ValueError as e:
+        error_msg = f"Invalid SQL template: {str(e)}"
+        logging.error(error_msg)
+        raise GenerationError(error_msg)
+
+    if stream_output is None:
+        estimated_bytes = estimate_generation_bytes(len(positions), sp_details)
+        stream_output = exceeds_memory_budget(estimated_bytes, memory_budget)
+        if stream_output:
+            logging.warning(f"Rendering {len(positions):,} statements needs about {format_bytes(estimated_bytes)}, "
+                            f"over the {format_bytes(memory_budget)} memory budget; streaming them to disk")
+    body_path = None
+    with timer.measure('rendering', len(positions)):
+        if stream_output:
+            body_path = output_path + '.part'
+            render_log_start = len(logger.skipped_rows)
+            render_resume = resume and resume['render']
+            if render_resume and (not os.path.exists(body_path) or os.path.getsize(body_path) < render_resume['offset']):
+                logging.warning(f"{body_path} is shorter than its checkpoint; rendering from the start")
+                render_resume = None
+            if render_resume:
+                logger.skipped_rows.extend(render_resume['skipped_rows'])
+                logging.info(f"Continuing {body_path} after statement {render_resume['consumed']:,}")
+
+            def save_progress(progress):
+                checkpoint.save_rendering(progress, logger.skipped_rows[render_log_start:])
+
+            try:
+                stats['processed_rows'], render_errors = write_statements(body_path, DataHandler.iter_statements(
+                    result, positions[render_resume['consumed']:] if render_resume else positions,
+                    render_sql, sp_details['parameters'], logger
+                ), render_resume, save_progress if checkpoint else None)
+            except OSError as e:
+                raise GenerationError(f"File write error: {str(e)}")
+            sql_lines = []
+        else:
+            sql_lines, render_errors = DataHandler.render_statements(
+                result, positions, render_sql, sp_details['parameters'], logger
+            )
+            stats['processed_rows'] = len(sql_lines)
+    stats['streamed_output'] = stream_output
+    error_count += render_errors
+
+    # Write the skipped rows log
+    with timer.measure('skipped_log_write', len(logger.skipped_rows)) as stage:
+        try:
+            logger.write_log_file(sheet_name)
+            stage['bytes'] = os.path.getsize(skipped_log_path)
+            logging.info(f"Skipped rows log written with {len(logger.skipped_rows)} entries")
+        except Exception as e:
+            logging.error(f"Failed to write skipped rows log: {e}")
+
+    with timer.measure('sql_write', stats['processed_rows']) as stage:
+        write_sql_script(output_path, sql_lines, sheet_name, sp_details, error_count, skipped_log_path,
+                         stats['processed_rows'], body_path)
+        stage['bytes'] = os.path.getsize(output_path)
+    if checkpoint:
+        checkpoint.clear()
+    stats['resumed'] = bool(resume)
+
+    stats['processing_time'] = (datetime.now() - start_time).total_seconds()
+    stats['rows_per_second'] = total_rows / stats['processing_time'] if stats['processing_time'] > 0 else 0.0
+    stats['validation_rows_per_second'] = result['rows_per_second']
+    stats['total_errors'] = error_count
+    stats['skipped_rows_logged'] = len(logger.skipped_rows)
+    stats['stages'] = timer.as_dict()
+    stats['bytes_written'] = sum(stats['stages'][name]['bytes'] or 0 for name in ('skipped_log_write', 'sql_write'))
+    return sql_lines, stats
+
+
+def template_output_paths(output_path, friendly_name, skipped_log_path="excel_to_sql_skipped.txt"):
+    """Script and skipped rows report paths for one template of a multi-template run.
+
+    prices.sql + "Update Items Prices" -> prices_update_items_prices.sql and
+    excel_to_sql_skipped_update_items_prices.txt
+    """
+    slug = re.sub(r'[^0-9A-Za-z]+', '_', friendly_name).strip('_').lower()
+    output_stem, output_ext = os.path.splitext(output_path)
+    log_stem, log_ext = os.path.splitext(skipped_log_path)
+    return f"{output_stem}_{slug}{output_ext or '.sql'}", f"{log_stem}_{slug}{log_ext or '.txt'}"
+
+
+def generate_sql_scripts(df, sheet_name, runs, skip_arabic=True, validate_quality=True, dedup_policy='last',
+                         dedup_key='item', on_progress=None, on_status=None, on_validated=None, should_stop=None,
+                         stages=None, memory_budget=None, item_index=None):
+    """Convert one sheet with several templates, validating the sheet once for all of them.
+
+    runs is a list of dicts with 'sp_details' (flags resolved), 'column_mappings' and
+    'output_path', plus optional 'skipped_log_path' and 'validation_result' (reused as in
+    generate_sql_script). The runs without a validation result are validated together by
+    DataHandler.validate_dataframe_many, so a column mapped the same way in several
+    templates (the item number) is checked once per row; on_validated(run_index, result)
+    receives each new result. Every run then dedups, renders and writes its own script and
+    report with generate_sql_script. Returns a list of (sql_lines, stats), one per run; the
+    'validation' stage of a shared pass has 'shared_by' set to the number of templates.
+    Raises GenerationError like generate_sql_script.
+    """
+    timer = StageTimer(stages)
+    results = [run.get('validation_result') for run in runs]
+    pending = [position for position, result in enumerate(results) if result is None]
+    shared_validation = None
+    if pending:
+        total_rows = len(df)
+        validation_started = time.perf_counter()
+        try:
+            validated = DataHandler.validate_dataframe_many(
+                df, [(runs[position]['column_mappings'], runs[position]['sp_details'].get('parameter_specs', {}))
+                     for position in pending],
+                skip_arabic, validate_quality, on_progress=on_progress, should_stop=should_stop
+            )
+        except ValueError as e:
+            logging.error(str(e))
+            raise GenerationError(str(e))
+        except Exception as e:
+            error_msg = f"Critical error during row iteration: {str(e)}\n{traceback.format_exc()}"
+            logging.error(error_msg)
+            raise GenerationError(error_msg)
+        if validated is None:
+            raise GenerationError("SQL generation was cancelled.")
+        seconds = time.perf_counter() - validation_started
+        shared_validation = StageTimer()
+        shared_validation.record('validation', seconds, total_rows, shared_by=len(pending))
+        logging.info(f"Validated {total_rows:,} rows for {len(pending)} templates in one pass ({seconds:.2f}s)")
+        for position, result in zip(pending, validated):
+            results[position] = result
+            if on_validated:
+                on_validated(position, result)
+        if on_progress:
+            on_progress(total_rows, sum(len(result['row_numbers']) for result in validated),
+                        sum(result['error_count'] for result in validated), None)
+
+    outputs = []
+    for position, (run, result) in enumerate(zip(runs, results)):
+        if should_stop and should_stop():
+            raise GenerationError("SQL generation was cancelled.")
+        friendly_name = run['sp_details'].get('friendly_name', 'Unknown')
+        if on_status:
+            on_status(f"Writing '{friendly_name}' ({position + 1} of {len(runs)})...")
+        sql_lines, stats = generate_sql_script(
+            df, sheet_name, run['sp_details'], run['column_mappings'], run['output_path'], skip_arabic,
+            validate_quality, dedup_policy, dedup_key, result,
+            run.get('skipped_log_path', "excel_to_sql_skipped.txt"), stages=timer.as_dict(),
+            memory_budget=memory_budget, item_index=item_index
+        )
+        if shared_validation and position in pending:
+            stats['stages']['validation'] = shared_validation.as_dict()['validation']
+        outputs.append((sql_lines, stats))
+    return outputs
+
+
+# --- ScriptIndex: statement offsets of a generated script for paged viewing (no UI code) ---
+class ScriptIndex:
+    """A generated SQL script, memory-mapped, with the end offset of every statement.
+
+    Statements are the GO-separated batches written by write_sql_script. Building the index
+    scans the file once and keeps 8 bytes per statement; text is decoded only for the
+    statements asked for, so any part of a very large script reads in constant time.
+    Close the index before the script is rewritten (Windows cannot replace a mapped file).
+    Scripts written on Windows have CRLF line ends; text is returned with LF line ends.
+    """
+
+    SEPARATOR = re.compile(rb'\nGO\r?\n')
+    STATEMENT_END = re.compile(rb'\r?\nGO\r?\n\Z')
+    HEADER_END = re.compile(rb'\r?\n\r?\n')
+
+    def __init__(self, path, on_progress=None):
+        """on_progress(snapshot) gets ProgressReporter snapshots over the file's bytes"""
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+            self.body_start = self._find_body_start()
+            self.ends = self._scan(on_progress)
+        except Exception:
+            self.close()
+            raise
+
+    def _find_body_start(self):
+        """Offset after the '-- ' header lines and the blank line that ends them"""
+        if self._map[:3] != b'-- ':
+            return 0
+        end = self.HEADER_END.search(self._map, 0, 64 * 1024)
+        return end.end() if end else 0
+
+    def _scan(self, on_progress):
+        reporter = ProgressReporter(self.size)
+
+        def ends():
+            for count, match in enumerate(self.SEPARATOR.finditer(self._map, self.body_start)):
+                if on_progress and count % 65536 == 0:
+                    snapshot = reporter.update(match.end())
+                    if snapshot:
+                        on_progress(snapshot)
+                yield match.end()
+
+        offsets = np.fromiter(ends(), dtype=np.int64)
+        # A last statement without a GO line
+        last = int(offsets[-1]) if len(offsets) else self.body_start
+        if self._map[last:].strip():
+            offsets = np.append(offsets, self.size)
+        if on_progress:
+            on_progress(reporter.snapshot(self.size))
+        return offsets
+
+    def __len__(self):
+        return len(self.ends)
+
+    @property
+    def header(self):
+        return self._map[:self.body_start].decode('utf-8', 'replace').replace('\r\n', '\n')
+
+    def start_of(self, number):
+        """Byte offset of statement number (0-based); the file size past the last one"""
+        if number <= 0:
+            return self.body_start
+        return int(self.ends[min(number, len(self.ends)) - 1])
+
+    def statement_at(self, offset):
+        """Number of the statement containing a byte offset"""
+        return int(np.searchsorted(self.ends, offset, side='right'))
+
+    def statement(self, number):
+        raw = self._map[self.start_of(number):int(self.ends[number])]
+        separator = self.STATEMENT_END.search(raw, max(len(raw) - 7, 0))
+        if separator:
+            raw = raw[:separator.start()]
+        return raw.decode('utf-8', 'replace').replace('\r\n', '\n')
+
+    def statements(self, first, count):
+        """Up to count statements starting at number first"""
+        return [self.statement(number) for number in range(max(first, 0), min(first + count, len(self.ends)))]
+
+    def find_item(self, item, start=0, backward=False):
+        """Number of the next statement (from start, or before it when backward) with item as a quoted value.
+
+        Matching is case-insensitive like the SQL Server collation; returns None if there is none.
+        """
+        literal = "'" + str(item).strip().replace("'", "''") + "'"
+        pattern = re.compile(re.escape(literal.encode('utf-8')), re.IGNORECASE)
+        if backward:
+            match = None
+            for match in pattern.finditer(self._map, self.body_start, self.start_of(start)):
+                pass
+        else:
+            match = pattern.search(self._map, self.start_of(start))
+        return None if match is None else self.statement_at(match.start())
+
+    def close(self):
+        if getattr(self, '_map', None) is not None and not isinstance(self._map, bytes):
+            self._map.close()
+        self._map = None
+        self._file.close()
+
+
+# --- ConversionStream: library API that yields statements as they are rendered (no UI code) ---
+class ConversionStream:
+    """Convert a sheet lazily, one event at a time.
+
+    source is a DataFrame or a workbook path (sheet_name picks the sheet, default the first
+    non-empty one). template is a template name from the registry (templates_path, default
+    TemplateRegistry.default_path()) or an already loaded template dict; flags sets its
+    run-level options. Parameters missing from column_mappings are mapped automatically.
+    item_index (an ItemMasterIndex) skips rows whose dedup_key is not a known item.
+
+    Iterating yields ('statement', excel_row, sql) and ('skipped', excel_row, entry) in sheet
+    order, where entry is a SkippedRowLogger record. Validation runs on the first next();
+    statements are rendered in chunks as they are consumed. `stats` (the same counters as
+    generate_sql_script) is set once the iterator is exhausted. Raises GenerationError for
+    unknown templates, sheets or columns.
+
+        stream = ConversionStream("items.xlsx", "Update Items Prices", {"item": "ITEM"})
+        for sql in stream.statements():
+            cursor.execute(sql)
+        print(stream.stats)
+    """
+
+    def __init__(self, source, template, column_mappings=None, sheet_name=None, flags=None, skip_arabic=True,
+                 validate_quality=True, dedup_policy='last', dedup_key='item', templates_path=None, item_index=None):
+        if isinstance(template, str):
+            try:
+                registry = TemplateRegistry.load(templates_path)
+            except Exception as e:
+                raise GenerationError(f"Failed to load SQL templates: {e}")
+            sp_details = registry.get(template)
+            if sp_details is None:
+                raise GenerationError(f"Unknown template '{template}'. Available: {', '.join(registry.names())}")
+        else:
+            sp_details = template
+        self.sp_details = TemplateRegistry.resolve_flags(sp_details, flags or {})
+
+        if isinstance(source, (str, os.PathLike)):
+            try:
+                sheets = DataHandler.load_excel_sheets(os.fspath(source), [sheet_name] if sheet_name else None)
+            except Exception as e:
+                raise GenerationError(str(e))
+            sheet_name = sheet_name or next(iter(sheets))
+            if sheet_name not in sheets:
+                raise GenerationError(f"Sheet '{sheet_name}' not found or empty")
+            self.df = sheets[sheet_name]
+        else:
+            self.df = source
+        self.sheet_name = sheet_name or ""
+
+        self.column_mappings = dict(column_mappings or {})
+        unmapped = [param for param in self.sp_details['parameters'] if param not in self.column_mappings]
+        if unmapped:
+            columns = [str(col) for col in self.df.columns if str(col) not in self.column_mappings.values()]
+            self.column_mappings.update(DataHandler.suggest_column_mappings(
+                unmapped, self.sp_details['parameter_specs'], columns, DataHandler.profile_sheet(self.df)))
+        missing = [param for param in self.sp_details['parameters'] if param not in self.column_mappings]
+        if missing:
+            raise GenerationError(f"No column mapped for: {', '.join(missing)}")
+
+        self.skip_arabic = skip_arabic
+        self.validate_quality = validate_quality
+        self.dedup_policy = dedup_policy
+        self.dedup_key = dedup_key
+        self.item_index = item_index
+        self.skipped_rows = []
+        self.stats = None
+
+    def __iter__(self):
+        start_time = datetime.now()
+        logger = SkippedRowLogger()
+        self.skipped_rows = logger.skipped_rows
+        try:
+            result = DataHandler.validate_dataframe(
+                self.df, self.column_mappings, self.sp_details.get('parameter_specs', {}),
+                self.skip_arabic, self.validate_quality
+            )
+            render_sql = TemplateRegistry.get_renderer(self.sp_details)
+        except ValueError as e:
+            raise GenerationError(str(e))
+        logger.skipped_rows.extend(result['skipped_rows'])
+        result = DataHandler.filter_unknown_items(result, self.item_index, self.dedup_key, logger)
+        positions, skipped_duplicate = DataHandler.deduplicate_rows(
+            result['row_numbers'], result['columns'].get(self.dedup_key), self.dedup_policy, logger, self.dedup_key
+        )
+
+        # Validation and duplicate skips are interleaved with the statements by sheet row
+        pending = sorted(logger.skipped_rows, key=lambda entry: entry['row_number'])
+        next_skip = 0
+        processed = 0
+        render_errors = 0
+        for row_number, sql in DataHandler.iter_statements(
+                result, positions, render_sql, self.sp_details['parameters'], logger, chunk_rows=10000):
+            excel_row = row_number + 1
+            while next_skip < len(pending) and pending[next_skip]['row_number'] < excel_row:
+                yield 'skipped', pending[next_skip]['row_number'], pending[next_skip]
+                next_skip += 1
+            if sql is None:
+                render_errors += 1
+                yield 'skipped', excel_row, logger.skipped_rows[-1]
+                continue
+            processed += 1
+            yield 'statement', excel_row, sql
+        for entry in pending[next_skip:]:
+            yield 'skipped', entry['row_number'], entry
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        self.stats = {
+            'total_rows': len(self.df),
+            'processed_rows': processed,
+            'skipped_arabic': result['skipped_arabic'],
+            'skipped_invalid_value': result['skipped_invalid_value'],
+            'skipped_empty': result['skipped_empty'],
+            'skipped_duplicate': skipped_duplicate,
+            'skipped_unknown_item': result['skipped_unknown_item'],
+            'processing_time': processing_time,
+            'rows_per_second': len(self.df) / processing_time if processing_time > 0 else 0.0,
+            'validation_rows_per_second': result['rows_per_second'],
+            'total_errors': result['error_count'] + render_errors,
+            'skipped_rows_logged': len(logger.skipped_rows),
+        }
+
+    def statements(self):
+        """Only the SQL statements, in sheet order"""
+        for kind, _, payload in self:
+            if kind == 'statement':
+                yield payload
@@ -0,0 +1,413 @@
+"""Local HTTP service that queues Excel to SQL conversions on a process pool.
+
+    python excel_to_sql_service.py --port 8765 --workers 4
+
+Endpoints (JSON unless noted):
+    GET  /health                 queue and worker status
+    GET  /templates              template names, parameters and options
+    POST /workbooks?name=a.xlsx  body is the workbook; returns {"workbook_id"}; identical
+                                 uploads share one id and one parsed copy
+    POST /jobs                   JSON job spec: "workbook_id", "template", and optionally
+                                 "sheet", "mapping", "flags", "skip_arabic", "validate_quality",
+                                 "dedup". The workbook can instead be sent as the body with the
+                                 spec in an X-Job-Spec header. Returns 202 with the job id, or
+                                 503 when the queue is full.
+    GET  /jobs                   all jobs
+    GET  /jobs/<id>              state (queued, running, done, failed), progress, timings,
+                                 stats or error
+    GET  /jobs/<id>/result       the SQL script (text/plain)
+    GET  /jobs/<id>/skipped      the skipped rows report (text/plain)
+
+Parsed workbooks are cached in each pool process and pickled to the data directory's
+parsed/ folder, which uploads never write to, so repeated jobs on the same workbook skip
+openpyxl. Uploads must be .xlsx, .xlsm or .xls workbooks. The service binds to 127.0.0.1 by
+default; excel_to_sql_service_load.py measures throughput and latency against it.
+"""
+import sys, os, json, time, uuid, pickle, shutil, signal, hashlib, asyncio, argparse
+import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from urllib.parse import urlsplit, parse_qs
+from excel_to_sql_core import LOG_LEVELS, configure_logging, TemplateRegistry, DataHandler, GenerationError
+from excel_to_sql_cli import UsageError, read_job_settings, finish_job, resolve_template, run
+
+MAX_BODY_BYTES = 256 * 1024 * 1024
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+SPEC_KEYS = ('workbook_id',)
+SERVICE_OWNED_KEYS = ('file', 'output', 'skipped_report', 'metrics', 'templates', 'item_master', 'checkpoint')
+STATUS_TEXT = {200: 'OK', 201: 'Created', 202: 'Accepted', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error',
+               503: 'Service Unavailable'}
+
+
+# --- Pool processes: parsed workbooks are kept per process and pickled to data_dir/parsed ---
+_workbook_cache = OrderedDict()
+_workbook_cache_size = 4
+
+
+def init_worker(log_level, cache_size):
+    global _workbook_cache_size
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    configure_logging(log_level, None)
+    _workbook_cache_size = cache_size
+
+
+def load_workbook_cached(path, digest, cache_dir):
+    """Sheets of an uploaded workbook from memory, the pickle cache or the file; returns (sheets, source)"""
+    sheets = _workbook_cache.get(digest)
+    if sheets is not None:
+        _workbook_cache.move_to_end(digest)
+        return sheets, 'memory'
+    pickle_path = os.path.join(cache_dir, f"{digest}.pkl")
+    try:
+        with open(pickle_path, 'rb') as f:
+            sheets = pickle.load(f)
+        source = 'disk'
+    except (OSError, pickle.UnpicklingError, EOFError):
+        sheets = DataHandler.load_excel_sheets(path)
+        source = 'excel'
+        temp_path = f"{pickle_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            pickle.dump(sheets, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, pickle_path)
+    _workbook_cache[digest] = sheets
+    while len(_workbook_cache) > _workbook_cache_size:
+        _workbook_cache.popitem(last=False)
+    return sheets, source
+
+
+def write_upload(path, body):
+    """Runs in the default thread pool so a large upload does not block the event loop"""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(body)
+    os.replace(temp_path, path)
+
+
+def run_service_job(job_id, settings, digest, cache_dir, progress):
+    """Runs in a pool process; progress is a shared dict updated with the job's percent"""
+    started = time.perf_counter()
+    try:
+        sheets, source = load_workbook_cached(settings['file'], digest, cache_dir)
+    except Exception as e:
+        return {'ok': False, 'error': f"Failed to load workbook: {e}"}
+    loaded = time.perf_counter()
+
+    def on_progress(row_number, processed_count, error_count, snapshot):
+        progress[job_id] = 100 if snapshot is None else snapshot['percent']
+
+    outcome = {'workbook_source': source, 'load_seconds': round(loaded - started, 4)}
+    try:
+        outcome.update(ok=True, stats=run(finish_job(settings), sheets, on_progress))
+    except (UsageError, GenerationError) as e:
+        outcome.update(ok=False, error=str(e))
+    except Exception as e:
+        logging.exception(f"Unexpected error in job {job_id}")
+        outcome.update(ok=False, error=f"Unexpected error in SQL generation: {e}")
+    outcome['convert_seconds'] = round(time.perf_counter() - loaded, 4)
+    return outcome
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConversionService:
+    """Accepts jobs over HTTP, queues them and runs them on a process pool"""
+
+    def __init__(self, data_dir, workers=2, max_queue=100, cache_size=4, keep_jobs=1000, log_level='INFO'):
+        self.data_dir = os.path.abspath(data_dir)
+        self.workbook_dir = os.path.join(self.data_dir, 'workbooks')
+        # Only pool processes write here; uploads go to workbook_dir, so a client cannot plant a pickle
+        self.parsed_dir = os.path.join(self.data_dir, 'parsed')
+        self.jobs_dir = os.path.join(self.data_dir, 'jobs')
+        self.workers = workers
+        self.max_queue = max_queue
+        self.cache_size = cache_size
+        self.keep_jobs = keep_jobs
+        self.log_level = log_level
+        self.jobs = OrderedDict()  # job id -> job record
+        self.workbooks = {}  # workbook id -> path
+        self.queue = None
+        self.pool = None
+        self.progress = None
+        self.running = 0
+
+    # --- Lifecycle ---
+    async def serve(self, host, port):
+        for folder in (self.workbook_dir, self.parsed_dir, self.jobs_dir):
+            os.makedirs(folder, exist_ok=True)
+        for name in os.listdir(self.workbook_dir):
+            digest, ext = os.path.splitext(name)
+            if ext.lower() in WORKBOOK_EXTENSIONS:
+                self.workbooks[digest] = os.path.join(self.workbook_dir, name)
+        self.queue = asyncio.Queue(self.max_queue)
+        manager = Manager()
+        self.progress = manager.dict()
+        self.pool = ProcessPoolExecutor(self.workers, initializer=init_worker,
+                                        initargs=(self.log_level, self.cache_size))
+        dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        logging.info(f"Serving on http://{host}:{port} with {self.workers} workers (queue limit {self.max_queue})")
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # Windows: Ctrl+C raises KeyboardInterrupt in asyncio.run instead
+                pass
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for task in dispatchers:
+                task.cancel()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            manager.shutdown()
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            job['state'] = 'running'
+            job['started'] = time.time()
+            self.running += 1
+            try:
+                outcome = await loop.run_in_executor(self.pool, run_service_job, job['id'], job['settings'],
+                                                     job['workbook_id'], self.parsed_dir, self.progress)
+            except Exception as e:
+                # The pool process died (e.g. out of memory)
+                outcome = {'ok': False, 'error': f"Worker failed: {e}"}
+            finally:
+                self.running -= 1
+            job['finished'] = time.time()
+            job['outcome'] = outcome
+            job['state'] = 'done' if outcome['ok'] else 'failed'
+            self.progress.pop(job['id'], None)
+            logging.info(f"Job {job['id']} {job['state']} in {job['finished'] - job['submitted']:.2f}s")
+            self.forget_old_jobs()
+
+    def forget_old_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['state'] in ('done', 'failed')]
+        for job_id in finished[:max(len(finished) - self.keep_jobs, 0)]:
+            job = self.jobs.pop(job_id)
+            shutil.rmtree(job['dir'], ignore_errors=True)
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        extra_headers = {}
+        try:
+            try:
+                method, target, headers, body = await self.read_request(reader)
+                status, content_type, payload = await self.route(method, urlsplit(target), headers, body)
+            except HttpError as e:
+                status, content_type, payload = e.status, 'application/json', {'error': str(e)}
+                if e.status == 503:
+                    extra_headers['Retry-After'] = '1'
+            except Exception as e:
+                logging.exception("Request failed")
+                status, content_type, payload = 500, 'application/json', {'error': str(e)}
+            if content_type == 'application/json':
+                payload = json.dumps(payload, default=str).encode('utf-8')
+            head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}",
+                    f"Content-Length: {len(payload)}", "Connection: close"]
+            head += [f"{name}: {value}" for name, value in extra_headers.items()]
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + payload)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) != 3:
+            raise HttpError(400, "Malformed request line")
+        method, target = request_line[0].upper(), request_line[1]
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, f"Request body larger than {MAX_BODY_BYTES // (1024 * 1024)} MB")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def route(self, method, url, headers, body):
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if parts == ['health'] and method == 'GET':
+            return 200, 'application/json', {'ok': True, 'queued': self.queue.qsize(), 'running': self.running,
+                                             'workers': self.workers, 'jobs': len(self.jobs)}
+        if parts == ['templates'] and method == 'GET':
+            return 200, 'application/json', self.describe_templates()
+        if parts == ['workbooks'] and method == 'POST':
+            return 201, 'application/json', await self.store_workbook(body, query.get('name', 'workbook.xlsx'))
+        if parts == ['jobs'] and method == 'POST':
+            return 202, 'application/json', await self.submit_job(headers, body, query)
+        if parts == ['jobs'] and method == 'GET':
+            return 200, 'application/json', [self.describe_job(job) for job in self.jobs.values()]
+        if len(parts) in (2, 3) and parts[0] == 'jobs' and method == 'GET':
+            job = self.jobs.get(parts[1])
+            if job is None:
+                raise HttpError(404, f"Unknown job '{parts[1]}'")
+            if len(parts) == 2:
+                return 200, 'application/json', self.describe_job(job)
+            if parts[2] in ('result', 'skipped'):
+                return 200, 'text/plain; charset=utf-8', self.read_job_file(job, parts[2])
+        if parts and parts[0] in ('health', 'templates', 'workbooks', 'jobs'):
+            raise HttpError(405, f"{method} is not supported for {url.path}")
+        raise HttpError(404, f"No endpoint at {url.path}")
+
+    def describe_templates(self):
+        registry = TemplateRegistry.load()
+        return [{'name': name, 'parameters': details['parameter_specs'],
+                 'flags': [{'name': flag['name'], 'choices': flag['choices']} for flag in details.get('flags', [])]}
+                for name, details in registry.templates.items()]
+
+    def check_upload(self, body, name):
+        """Validate an uploaded workbook without storing it; returns (workbook id, path)"""
+        if not body:
+            raise HttpError(400, "The request body must be the workbook")
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in WORKBOOK_EXTENSIONS:
+            raise HttpError(400, f"Unsupported workbook type '{ext or name}'; upload {', '.join(WORKBOOK_EXTENSIONS)}")
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        return digest, self.workbooks.get(digest) or os.path.join(self.workbook_dir, f"{digest}{ext}")
+
+    async def store_workbook(self, body, name, upload=None):
+        digest, path = upload or self.check_upload(body, name)
+        if digest not in self.workbooks:
+            await asyncio.get_running_loop().run_in_executor(None, write_upload, path, body)
+            self.workbooks[digest] = path
+        return {'workbook_id': digest, 'size': len(body)}
+
+    async def submit_job(self, headers, body, query):
+        upload = None
+        if headers.get('content-type', '').startswith('application/json'):
+            spec = self.parse_json(body, "job spec")
+        else:
+            # The workbook is stored only once the spec is valid and the queue has room
+            spec = self.parse_json(headers.get('x-job-spec', '').encode('utf-8'), "X-Job-Spec header")
+            upload = self.check_upload(body, query.get('name', 'workbook.xlsx'))
+            spec['workbook_id'] = upload[0]
+        try:
+            settings = read_job_settings(spec, self.data_dir, "job spec", extra_keys=SPEC_KEYS)
+            owned = [key for key in SERVICE_OWNED_KEYS if key in settings]
+            if owned:
+                raise UsageError(f"Job spec must not set {', '.join(owned)}")
+            workbook_id = settings.pop('workbook_id', None)
+            if upload is None and workbook_id not in self.workbooks:
+                raise UsageError(f"Unknown workbook_id '{workbook_id}'; upload it to /workbooks first")
+            job_id = uuid.uuid4().hex[:12]
+            job_dir = os.path.join(self.jobs_dir, job_id)
+            settings.update({
+                'file': upload[1] if upload else self.workbooks[workbook_id],
+                'output': os.path.join(job_dir, 'output.sql'),
+                'skipped_report': os.path.join(job_dir, 'skipped.txt'),
+                # Every job writes to a new directory, so there is never a checkpoint to resume
+                'checkpoint': False,
+            })
+            # Reject unknown templates and options now rather than after queueing
+            resolve_template(finish_job(settings))
+        except UsageError as e:
+            raise HttpError(400, str(e))
+
+        if self.queue.full():
+            raise HttpError(503, f"Queue is full ({self.max_queue} jobs); retry later")
+        if upload:
+            await self.store_workbook(body, None, upload)
+        job = {'id': job_id, 'workbook_id': workbook_id, 'settings': settings, 'dir': job_dir,
+               'state': 'queued', 'submitted': time.time(), 'started': None, 'finished': None, 'outcome': None}
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            # Filled up by other requests while the upload was written; the stored workbook can be reused
+            raise HttpError(503, f"Queue is full ({self.max_queue} jobs); retry later")
+        os.makedirs(job_dir, exist_ok=True)
+        self.jobs[job_id] = job
+        return {'job_id': job_id, 'state': 'queued', 'status_url': f"/jobs/{job_id}"}
+
+    @staticmethod
+    def parse_json(raw, what):
+        try:
+            spec = json.loads(raw or b'{}')
+        except ValueError as e:
+            raise HttpError(400, f"Invalid JSON in {what}: {e}")
+        if not isinstance(spec, dict):
+            raise HttpError(400, f"{what} must be a JSON object")
+        return spec
+
+    def describe_job(self, job):
+        now = time.time()
+        started, finished = job['started'], job['finished']
+        view = {
+            'job_id': job['id'],
+            'state': job['state'],
+            'template': job['settings']['template'],
+            'workbook_id': job['workbook_id'],
+            'queued_seconds': round((started or now) - job['submitted'], 4),
+            'run_seconds': round((finished or now) - started, 4) if started else None,
+        }
+        if job['state'] == 'running':
+            view['progress'] = self.progress.get(job['id'], 0)
+        elif job['state'] in ('done', 'failed'):
+            view['progress'] = 100
+            outcome = job['outcome']
+            view.update({key: value for key, value in outcome.items() if key != 'ok'})
+            if outcome['ok']:
+                view['result_url'] = f"/jobs/{job['id']}/result"
+                view['skipped_url'] = f"/jobs/{job['id']}/skipped"
+        else:
+            view['progress'] = 0
+            view['queue_position'] = sum(1 for other in self.jobs.values() if other['state'] == 'queued'
+                                         and other['submitted'] < job['submitted']) + 1
+        return view
+
+    def read_job_file(self, job, kind):
+        if job['state'] != 'done':
+            raise HttpError(409, f"Job is {job['state']}")
+        path = job['settings']['output' if kind == 'result' else 'skipped_report']
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError as e:
+            raise HttpError(404, f"Result no longer available: {e}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve Excel to SQL conversions over local HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    parser.add_argument('--max-queue', type=int, default=100, help="Queued jobs before new ones get 503")
+    parser.add_argument('--cache-size', type=int, default=4, help="Parsed workbooks kept per worker process")
+    parser.add_argument('--keep-jobs', type=int, default=1000, help="Finished jobs kept with their results")
+    parser.add_argument('--data-dir', default='excel_to_sql_service', help="Uploads, parsed workbooks and results")
+    parser.add_argument('--log-level', default='INFO', choices=LOG_LEVELS)
+    parser.add_argument('--log-file', help="Also write log messages to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_file)
+    service = ConversionService(args.data_dir, args.workers, args.max_queue, args.cache_size, args.keep_jobs,
+                                args.log_level)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""Load test for excel_to_sql_service.py: concurrent jobs, throughput and latency.
+
+    python excel_to_sql_service_load.py Default_Excel_template_File.xlsx \\
+        --template "Update Items Dropship Quantities" --jobs 200 --concurrency 16
+
+Each client submits a job, polls it until it finishes and records the latency. With
+--upload-each every job uploads its own copy of the workbook (with a unique trailing byte
+so the parse cache cannot help); otherwise the workbook is uploaded once. Prints JSON with
+throughput, latency percentiles and the service-side queue/run/load times.
+"""
+import sys, json, time, argparse
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+
+
+def request(base_url, method, path, body=None, headers=None):
+    req = urllib.request.Request(base_url + path, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    return {'p50': round(percentile(values, 0.5), 4), 'p95': round(percentile(values, 0.95), 4), 'max': round(max(values), 4)}
+
+
+def run_job(base_url, spec, workbook, poll_interval):
+    """Submit one job and wait for it; returns (latency seconds, final job status or error)"""
+    def submit():
+        if workbook is not None:
+            return request(base_url, 'POST', '/jobs?name=upload.xlsx', workbook,
+                           {'Content-Type': 'application/octet-stream', 'X-Job-Spec': json.dumps(spec)})
+        return request(base_url, 'POST', '/jobs', json.dumps(spec).encode('utf-8'),
+                       {'Content-Type': 'application/json'})
+
+    started = time.perf_counter()
+    status, body = submit()
+    while status == 503:
+        # Queue full: back off like a well-behaved client
+        time.sleep(poll_interval * 4)
+        status, body = submit()
+    if status != 202:
+        return time.perf_counter() - started, {'state': 'rejected', 'error': body.decode('utf-8', 'replace')}
+    job_id = json.loads(body)['job_id']
+    while True:
+        status, body = request(base_url, 'GET', f'/jobs/{job_id}')
+        job = json.loads(body)
+        if job.get('state') in ('done', 'failed'):
+            return time.perf_counter() - started, job
+        time.sleep(poll_interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure excel_to_sql_service throughput and latency.")
+    parser.add_argument('workbook')
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--template', required=True)
+    parser.add_argument('--sheet')
+    parser.add_argument('--map', action='append', metavar='PARAM=COLUMN', default=[])
+    parser.add_argument('--jobs', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--upload-each', action='store_true', help="Upload a distinct workbook copy per job")
+    args = parser.parse_args(argv)
+
+    with open(args.workbook, 'rb') as f:
+        workbook = f.read()
+    spec = {'template': args.template, 'mapping': dict(pair.split('=', 1) for pair in args.map)}
+    if args.sheet:
+        spec['sheet'] = args.sheet
+    if not args.upload_each:
+        status, body = request(args.url, 'POST', '/workbooks?name=upload.xlsx', workbook)
+        if status != 201:
+            print(json.dumps({'error': f"Upload failed ({status}): {body.decode('utf-8', 'replace')}"}))
+            return 1
+        spec['workbook_id'] = json.loads(body)['workbook_id']
+
+    def one(number):
+        # A trailing byte changes the hash but zip readers ignore it, so each job parses its own copy
+        payload = workbook + number.to_bytes(4, 'little') if args.upload_each else None
+        return run_job(args.url, spec, payload, args.poll_interval)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as clients:
+        results = list(clients.map(one, range(args.jobs)))
+    wall = time.perf_counter() - started
+
+    done = [job for _, job in results if job.get('state') == 'done']
+    report = {
+        'jobs': args.jobs,
+        'concurrency': args.concurrency,
+        'done': len(done),
+        'failed': sum(1 for _, job in results if job.get('state') == 'failed'),
+        'rejected': sum(1 for _, job in results if job.get('state') == 'rejected'),
+        'wall_seconds': round(wall, 3),
+        'jobs_per_second': round(args.jobs / wall, 2) if wall else None,
+        'latency_seconds': summarize([latency for latency, _ in results]),
+        'queued_seconds': summarize([job['queued_seconds'] for job in done]),
+        'run_seconds': summarize([job['run_seconds'] for job in done]),
+        'load_seconds': summarize([job['load_seconds'] for job in done]),
+        'workbook_sources': {source: sum(1 for job in done if job.get('workbook_source') == source)
+                             for source in ('memory', 'disk', 'excel')},
+    }
+    errors = {job.get('error') for _, job in results if job.get('state') != 'done'}
+    if errors:
+        report['errors'] = sorted(str(error) for error in errors)[:5]
+    print(json.dumps(report, indent=2))
+    return 0 if len(done) == args.jobs else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Watch an inbox folder and convert every workbook dropped into it.
+
+    python excel_to_sql_watch.py --inbox \\\\share\\excel_inbox --profiles watch_profiles.json
+
+The profiles file lists job profiles tried in order; the first whose "pattern" (a
+case-insensitive file name glob) matches a new workbook is used:
+
+    {"profiles": [
+        {"name": "dropship", "pattern": "*dropship*.xlsx",
+         "template": "Update Items Dropship Quantities", "mapping": {"item": "ITEM", "qty": "QTY"}},
+        {"name": "prices", "pattern": "prices_*.xlsx", "template": "Update Items Prices"}
+    ]}
+
+Each profile takes the same settings as a CLI job file except "file", "output",
+"skipped_report" and "metrics", which the watcher sets. A workbook is converted once its
+size and modification time have not changed for --stable-seconds; one that is still empty
+by then goes to failed/. Conversions run on a pool of --workers processes; at most
+--max-pending workbooks are queued, the rest wait in the inbox until a slot frees up. Afterwards the workbook, its SQL script, skipped rows report,
+Prometheus metrics and a JSON result file are moved to processed/<timestamp>_<name>/ or
+failed/<timestamp>_<name>/ next to the inbox (or under --processed-dir/--failed-dir).
+"""
+import sys, os, json, time, shutil, signal, argparse, fnmatch
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from excel_to_sql_core import LOG_LEVELS, configure_logging, GenerationError
+from excel_to_sql_cli import UsageError, read_job_settings, finish_job, run
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+PROFILE_KEYS = ('name', 'pattern')
+WATCHER_OWNED_KEYS = ('file', 'output', 'skipped_report', 'metrics')
+
+
+def load_profiles(path):
+    """Read and validate the job profiles; raises UsageError"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise UsageError(f"Cannot read profiles file '{path}': {e}")
+    profiles = data.get('profiles') if isinstance(data, dict) else data
+    if not isinstance(profiles, list) or not profiles:
+        raise UsageError(f"Profiles file '{path}' must contain a non-empty 'profiles' list")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    loaded = []
+    for number, profile in enumerate(profiles, 1):
+        source = f"profile {number} of '{path}'"
+        profile = read_job_settings(profile, base_dir, source, extra_keys=PROFILE_KEYS)
+        if not profile.get('pattern'):
+            raise UsageError(f"{source} needs a 'pattern'")
+        if not profile.get('template'):
+            raise UsageError(f"{source} needs a 'template'")
+        owned = [key for key in WATCHER_OWNED_KEYS if key in profile]
+        if owned:
+            raise UsageError(f"{source} must not set {', '.join(owned)}; the watcher chooses them")
+        profile.setdefault('name', profile['pattern'])
+        loaded.append(profile)
+    return loaded
+
+
+def match_profile(file_name, profiles):
+    for profile in profiles:
+        if fnmatch.fnmatch(file_name.lower(), profile['pattern'].lower()):
+            return profile
+    return None
+
+
+def ignore_interrupts():
+    """Pool processes leave Ctrl+C to the watcher, which lets running conversions finish"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def convert_workbook(path, profile, work_dir, log_level):
+    """Runs in a pool process: convert one workbook into work_dir and describe the outcome"""
+    configure_logging(log_level, None)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    settings = {key: value for key, value in profile.items() if key not in PROFILE_KEYS}
+    settings.update({
+        'file': path,
+        'output': os.path.join(work_dir, f"{stem}.sql"),
+        'skipped_report': os.path.join(work_dir, f"{stem}_skipped.txt"),
+        'metrics': os.path.join(work_dir, f"{stem}_metrics.prom"),
+    })
+    outcome = {'profile': profile['name'], 'started': datetime.now().isoformat(timespec='seconds')}
+    try:
+        outcome['stats'] = run(finish_job(settings))
+        outcome['ok'] = True
+    except (UsageError, GenerationError) as e:
+        outcome.update(ok=False, error=str(e))
+    except Exception as e:
+        logging.exception(f"Unexpected error converting {path}")
+        outcome.update(ok=False, error=f"Unexpected error in SQL generation: {e}")
+    return outcome
+
+
+class FolderWatcher:
+    """Polls the inbox, waits for workbooks to stop changing and feeds them to a process pool"""
+
+    def __init__(self, inbox, profiles, processed_dir=None, failed_dir=None, workers=2, max_pending=None,
+                 stable_seconds=2.0, poll_interval=1.0, log_level='INFO'):
+        self.inbox = os.path.abspath(inbox)
+        parent = os.path.dirname(self.inbox)
+        self.processed_dir = processed_dir or os.path.join(parent, 'processed')
+        self.failed_dir = failed_dir or os.path.join(parent, 'failed')
+        self.work_root = os.path.join(parent, '.excel_to_sql_work')
+        self.profiles = profiles
+        self.workers = workers
+        self.max_pending = max_pending or workers * 2
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.log_level = log_level
+        self.candidates = {}  # path -> (size, mtime, time first seen with that size/mtime, time first seen)
+        self.in_flight = {}  # future -> (path, work_dir, time first seen)
+        self.stopping = False
+        self.waiting = 0
+        self.stats = {'converted': 0, 'failed': 0}
+
+    def scan(self):
+        """Workbooks whose size and modification time have been stable long enough, oldest first"""
+        now = time.monotonic()
+        busy = {path for path, _, _ in self.in_flight.values()}
+        seen = set()
+        ready = []
+        try:
+            entries = list(os.scandir(self.inbox))
+        except OSError as e:
+            logging.error(f"Cannot read inbox {self.inbox}: {e}")
+            return ready
+        for entry in entries:
+            name = entry.name
+            # Skip Excel lock files and partial copies
+            if not entry.is_file() or name.startswith(('~$', '.')) or not name.lower().endswith(WORKBOOK_EXTENSIONS):
+                continue
+            if entry.path in busy:
+                continue
+            seen.add(entry.path)
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            size_mtime = (stat.st_size, stat.st_mtime)
+            previous = self.candidates.get(entry.path)
+            if previous is None or previous[:2] != size_mtime:
+                first_seen = previous[3] if previous else now
+                self.candidates[entry.path] = (*size_mtime, now, first_seen)
+            elif now - previous[2] >= self.stable_seconds:
+                # Empty files are ready too; submit() sends them to failed/ so they do not wait forever
+                ready.append((previous[3], entry.path))
+        for path in set(self.candidates) - seen:
+            del self.candidates[path]
+        return [path for _, path in sorted(ready)]
+
+    def submit(self, pool, path):
+        size, _, _, first_seen = self.candidates.pop(path)
+        name = os.path.basename(path)
+        profile = match_profile(name, self.profiles)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        work_dir = os.path.join(self.work_root, f"{stamp}_{os.path.splitext(name)[0]}")
+        # The same name can arrive again within a second
+        suffix = 1
+        while os.path.exists(work_dir) or os.path.exists(os.path.join(self.processed_dir, os.path.basename(work_dir))):
+            suffix += 1
+            work_dir = os.path.join(self.work_root, f"{stamp}_{os.path.splitext(name)[0]}_{suffix}")
+        os.makedirs(work_dir)
+        if size == 0:
+            self.finish(path, work_dir, first_seen, {'ok': False, 'error': "Empty file (0 bytes)"})
+            return
+        if profile is None:
+            self.finish(path, work_dir, first_seen, {'ok': False, 'error': "No job profile matches this file name"})
+            return
+        logging.info(f"Converting {name} with profile '{profile['name']}'")
+        future = pool.submit(convert_workbook, path, profile, work_dir, self.log_level)
+        self.in_flight[future] = (path, work_dir, first_seen)
+
+    def finish(self, path, work_dir, first_seen, outcome):
+        """Move the workbook and everything written for it to the processed or failed folder"""
+        outcome['latency_seconds'] = round(time.monotonic() - first_seen, 3)
+        target_root = self.processed_dir if outcome['ok'] else self.failed_dir
+        target = os.path.join(target_root, os.path.basename(work_dir))
+        try:
+            with open(os.path.join(work_dir, 'result.json'), 'w', encoding='utf-8') as f:
+                json.dump(outcome, f, indent=2, default=str)
+            shutil.move(path, os.path.join(work_dir, os.path.basename(path)))
+            os.makedirs(target_root, exist_ok=True)
+            shutil.move(work_dir, target)
+        except OSError as e:
+            logging.error(f"Could not move {path} and its outputs to {target_root}: {e}")
+        if outcome['ok']:
+            self.stats['converted'] += 1
+            stats = outcome['stats']
+            logging.info(f"Converted {os.path.basename(path)}: {stats['processed_rows']:,} statements, "
+                         f"{stats['skipped_rows_logged']:,} skipped rows, {outcome['latency_seconds']:.1f}s after arrival")
+        else:
+            self.stats['failed'] += 1
+            logging.error(f"Failed to convert {os.path.basename(path)}: {outcome['error']}")
+
+    def collect(self):
+        for future in [f for f in self.in_flight if f.done()]:
+            path, work_dir, first_seen = self.in_flight.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                # The pool process died (e.g. out of memory)
+                outcome = {'ok': False, 'error': f"Worker failed: {e}"}
+            self.finish(path, work_dir, first_seen, outcome)
+
+    def request_stop(self, *args):
+        logging.info("Stopping after the conversions in progress")
+        self.stopping = True
+
+    def run(self, once=False):
+        """Watch until stopped; with once=True, convert what is in the inbox and return"""
+        for folder in (self.inbox, self.processed_dir, self.failed_dir, self.work_root):
+            os.makedirs(folder, exist_ok=True)
+        logging.info(f"Watching {self.inbox} with {self.workers} workers (at most {self.max_pending} queued)")
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts) as pool:
+            while True:
+                self.collect()
+                if not self.stopping:
+                    ready = self.scan()
+                    accepted = ready[:max(self.max_pending - len(self.in_flight), 0)]
+                    # Back-pressure: the rest stay in the inbox until a slot frees up
+                    waiting = len(ready) - len(accepted)
+                    if waiting != self.waiting:
+                        if waiting:
+                            logging.warning(f"{waiting} workbooks waiting for a free worker")
+                        self.waiting = waiting
+                    for path in accepted:
+                        self.submit(pool, path)
+                    if once and not self.candidates:
+                        self.stopping = True
+                if self.stopping and not self.in_flight:
+                    break
+                time.sleep(self.poll_interval)
+        return self.stats
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert Excel workbooks dropped into an inbox folder.")
+    parser.add_argument('--inbox', required=True, help="Folder to watch")
+    parser.add_argument('--profiles', required=True, help="JSON file with the job profiles")
+    parser.add_argument('--processed-dir', help="Where converted workbooks go (default: processed next to the inbox)")
+    parser.add_argument('--failed-dir', help="Where failed workbooks go (default: failed next to the inbox)")
+    parser.add_argument('--workers', type=int, default=max(1, min(4, (os.cpu_count() or 2) - 1)))
+    parser.add_argument('--max-pending', type=int, help="Workbooks queued at once (default: twice the workers)")
+    parser.add_argument('--stable-seconds', type=float, default=2.0, help="How long a file must stop changing")
+    parser.add_argument('--poll-interval', type=float, default=1.0)
+    parser.add_argument('--once', action='store_true', help="Convert the current inbox contents and exit")
+    parser.add_argument('--log-level', default='INFO', choices=LOG_LEVELS)
+    parser.add_argument('--log-file', help="Also write log messages to this file")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_logging(args.log_level, args.log_file)
+    try:
+        profiles = load_profiles(args.profiles)
+    except UsageError as e:
+        logging.error(str(e))
+        return 2
+    watcher = FolderWatcher(args.inbox, profiles, args.processed_dir, args.failed_dir, args.workers,
+                            args.max_pending, args.stable_seconds, args.poll_interval, args.log_level)
+    signal.signal(signal.SIGINT, watcher.request_stop)
+    signal.signal(signal.SIGTERM, watcher.request_stop)
+    stats = watcher.run(once=args.once)
+    print(json.dumps(stats))
+    return 1 if args.once and stats['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())